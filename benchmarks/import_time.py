@@ -0,0 +1,49 @@
+"""
+Measures the time it takes to import mona_openai in a fresh interpreter,
+compared to the bare interpreter startup time.
+
+Heavy dependencies (the Mona SDK, profanity_check and sklearn, phonenumbers
+and tiktoken) are only imported when first used, so they shouldn't be part
+of this time. tests/test_import_time.py guards against that regressing.
+
+Usage:
+    $ python benchmarks/import_time.py [--repeats 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _get_run_seconds(code, repeats):
+    """
+    Returns the median wall time of running the given code in a fresh
+    interpreter.
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = _get_run_seconds("pass", args.repeats)
+    for code in (
+        "import mona_openai",
+        "import mona_openai, mona_sdk, profanity_check, phonenumbers, "
+        "tiktoken",
+    ):
+        seconds = _get_run_seconds(code, args.repeats) - baseline
+        print(f"{code}: {seconds * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures the per-text profanity scoring latency of each profanity engine,
+for single texts (as in a typical call with one prompt and one answer) and
+for batches.
+
+Usage:
+    $ python benchmarks/profanity_latency.py [--repeats 1000]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from mona_openai.analysis.profanity import (
+    MMAP_ENGINE,
+    NUMPY_ENGINE,
+    PROFANITY_CHECK_ENGINE,
+    get_profanity_model,
+)
+
+_TEXTS = (
+    "I want to generate some text about a day at the beach",
+    "Once upon a time, there was a little girl who lived in a village near "
+    "the forest. Whenever she went out, the little girl wore a red riding "
+    "cloak, so everyone in the village called her Little Red Riding Hood.",
+    "what the hell is this",
+)
+
+_BATCH_SIZE = 32
+
+
+def _get_per_text_microseconds(model, texts, repeats):
+    """
+    Returns the median per-text latency in microseconds of scoring the given
+    texts in a single predict_prob call.
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_prob(texts)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "profanity_model.bin")
+        for engine in (PROFANITY_CHECK_ENGINE, MMAP_ENGINE, NUMPY_ENGINE):
+            model = get_profanity_model(engine, model_path)
+            single = statistics.mean(
+                _get_per_text_microseconds(model, (text,), args.repeats)
+                for text in _TEXTS
+            )
+            batch = _get_per_text_microseconds(
+                model,
+                (_TEXTS * _BATCH_SIZE)[:_BATCH_SIZE],
+                max(args.repeats // 10, 1),
+            )
+            print(
+                f"{engine:>16}: {single:8.1f}µs per single text, "
+                f"{batch:8.1f}µs per text in batches of {_BATCH_SIZE}"
+            )
+
+
+if __name__ == "__main__":
+    main()
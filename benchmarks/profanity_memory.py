@@ -0,0 +1,107 @@
+"""
+Measures the resident memory used by the profanity model in multiple worker
+processes, for each profanity engine.
+
+Each worker is forked from a parent that didn't load the model yet (as
+pre-forked web server workers usually do), loads the model, scores a few
+texts and reports its memory usage before and after. PSS (proportional set
+size) divides shared pages between the processes sharing them, so the sum of
+the workers' PSS is the actual memory used by all of them together.
+
+Linux only (reads /proc/self/smaps_rollup).
+
+Usage:
+    $ python benchmarks/profanity_memory.py [--workers 8]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+from mona_openai.analysis.profanity import (
+    MMAP_ENGINE,
+    PROFANITY_CHECK_ENGINE,
+    get_profanity_prob,
+    get_profanity_model,
+)
+from mona_openai.analysis.profanity_model import build_model_file
+
+_TEXTS = (
+    "I want to go to the beach with my friends",
+    "what the hell is this",
+) * 50
+
+
+def _get_memory_kb():
+    """
+    Returns a dict with the RSS and PSS (in KB) of the current process.
+    """
+    ret = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                ret[name] = int(value.split()[0])
+    return ret
+
+
+def _run_worker(engine, model_path, start_barrier, results_queue):
+    before = _get_memory_kb()
+    model = get_profanity_model(engine, model_path)
+    get_profanity_prob(_TEXTS, model)
+    after = _get_memory_kb()
+    # Measure while all workers are still alive, so that shared pages are
+    # divided between all of them.
+    start_barrier.wait()
+    results_queue.put((before, after, _get_memory_kb()))
+    start_barrier.wait()
+
+
+def _measure(engine, model_path, workers_num):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers_num)
+    results_queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_run_worker,
+            args=(engine, model_path, barrier, results_queue),
+        )
+        for _ in range(workers_num)
+    ]
+    for process in processes:
+        process.start()
+    results = [results_queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    rss_deltas = [after["Rss"] - before["Rss"] for before, after, _ in results]
+    total_pss = sum(shared["Pss"] for _, _, shared in results)
+    print(
+        f"{engine:>16}: {workers_num} workers, "
+        f"mean RSS growth per worker {sum(rss_deltas) / len(results):,.0f}KB, "
+        f"total PSS {total_pss:,}KB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "profanity_model.bin")
+        # Build the model file beforehand (in a separate process, to keep
+        # sklearn out of the parent's memory), so that workers only map it.
+        builder = multiprocessing.get_context("spawn").Process(
+            target=build_model_file, args=(model_path,)
+        )
+        builder.start()
+        builder.join()
+
+        for engine in (PROFANITY_CHECK_ENGINE, MMAP_ENGINE):
+            _measure(engine, model_path, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures how many messages per second SQLiteLogger writes to its database,
+including the time to queue them and for the writer thread to insert them.
+
+Usage:
+    $ python benchmarks/sqlite_logger_throughput.py [--messages 50000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from mona_openai.loggers import SQLiteLogger
+
+_MESSAGE = {
+    "input": {
+        "model": "text-davinci-003",
+        "prompt": "I want to generate some text about a day at the beach",
+        "max_tokens": 100,
+    },
+    "latency": 1.2,
+    "stream_start_latency": None,
+    "is_exception": False,
+    "api_name": "Completion",
+    "is_async": False,
+    "response": {
+        "model": "text-davinci-003",
+        "choices": [{"text": "The sun was shining", "index": 0}],
+        "usage": {
+            "prompt_tokens": 12,
+            "completion_tokens": 5,
+            "total_tokens": 17,
+        },
+    },
+    "analysis": {"textual": {"answer_length": (19,)}},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        logger = SQLiteLogger(
+            os.path.join(directory, "mona.db"),
+            max_queue_size=args.messages,
+        )
+        start = time.perf_counter()
+        for i in range(args.messages):
+            logger.log(_MESSAGE, str(i))
+        queued = time.perf_counter() - start
+        logger.flush()
+        written = time.perf_counter() - start
+        logger.close()
+        print(
+            f"{queued / args.messages * 1e6:6.1f}µs per log call, "
+            f"{args.messages / written:8.0f} messages written per second"
+        )
+
+
+if __name__ == "__main__":
+    main()
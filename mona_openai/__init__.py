@@ -5,6 +5,17 @@ from .mona_openai import (
     get_rest_monitor_with_logger,
     monitor_langchain_llm,
     monitor_langchain_llm_with_logger,
+    monitor_drain,
 )
+from .analysis.registry import (
+    register_analyzer,
+    unregister_analyzer,
+    PROMPT_ROLE,
+    ANSWER_ROLE,
+    LAST_USER_MESSAGE_ROLE,
+    CHEAP_COST,
+    EXPENSIVE_COST,
+)
+from .warm_up import warm_up
 from .exceptions import *
 from .loggers import *
@@ -0,0 +1,172 @@
+"""
+In-process distributions of calls' latency and token metrics, per model and
+endpoint.
+
+Averages hide the tail, so each metric is kept in a fixed-size quantile
+sketch (see util/quantiles_util.py), allowing p50/p95/p99 queries without
+storing or exporting per-call data. Sketches are mergeable, so trackers
+from different processes can be combined (see CallMetricsTracker.to_dict
+and CallMetricsTracker.merge).
+"""
+import threading
+
+from ..util.quantiles_util import DEFAULT_K, QuantileSketch
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+LATENCY_METRIC = "latency"
+STREAM_START_LATENCY_METRIC = "stream_start_latency"
+PROMPT_TOKENS_METRIC = "prompt_tokens"
+COMPLETION_TOKENS_METRIC = "completion_tokens"
+PER_TOKEN_LATENCY_METRIC = "per_token_latency"
+METRICS = (
+    LATENCY_METRIC,
+    STREAM_START_LATENCY_METRIC,
+    PROMPT_TOKENS_METRIC,
+    COMPLETION_TOKENS_METRIC,
+    PER_TOKEN_LATENCY_METRIC,
+)
+
+
+def get_call_metrics(latency, stream_start_latency, usage):
+    """
+    Returns a dict of the metrics of a call with the given latency, stream
+    start latency (None for non-stream calls) and response usage dict. The
+    per-token latency is the latency divided by the number of completion
+    tokens. Unknown metrics are None.
+    """
+    completion_tokens = usage.get("completion_tokens")
+    return {
+        LATENCY_METRIC: latency,
+        STREAM_START_LATENCY_METRIC: stream_start_latency,
+        PROMPT_TOKENS_METRIC: usage.get("prompt_tokens"),
+        COMPLETION_TOKENS_METRIC: completion_tokens,
+        PER_TOKEN_LATENCY_METRIC: latency / completion_tokens
+        if completion_tokens
+        else None,
+    }
+
+
+class CallMetricsTracker:
+    """
+    A thread-safe collection of quantile sketches of each of the calls'
+    metrics (see METRICS), one for each model and endpoint pair.
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self._k = k
+        # Maps (model, endpoint) pairs to dicts of sketches by metric.
+        self._sketches = {}
+        self._lock = threading.Lock()
+
+    def add(self, model, endpoint, metrics):
+        """
+        Adds the given dict of a call's metrics (see get_call_metrics) to the
+        sketches of the given model and endpoint. None values are ignored.
+        """
+        with self._lock:
+            sketches = self._sketches.setdefault((model, endpoint), {})
+            for metric, value in metrics.items():
+                if value is None:
+                    continue
+                if metric not in sketches:
+                    sketches[metric] = QuantileSketch(self._k)
+                sketches[metric].add(value)
+
+    def _get_merged_sketch(self, metric, model, endpoint):
+        merged_sketch = QuantileSketch(self._k)
+        for key, sketches in self._sketches.items():
+            if (
+                metric in sketches
+                and model in (None, key[0])
+                and endpoint in (None, key[1])
+            ):
+                merged_sketch.merge(sketches[metric])
+        return merged_sketch
+
+    def get_quantiles(
+        self, metric, quantiles=DEFAULT_QUANTILES, model=None, endpoint=None
+    ):
+        """
+        Returns a dict mapping each of the given quantiles (numbers between
+        0 and 1) to its estimated value for the given metric, over the calls
+        with the given model and/or endpoint (or all calls if None), or None
+        if there are no such calls.
+        """
+        with self._lock:
+            sketch = self._get_merged_sketch(metric, model, endpoint)
+        if not sketch.count:
+            return None
+        return dict(zip(quantiles, sketch.get_quantiles(quantiles)))
+
+    def get_stats(self, quantiles=DEFAULT_QUANTILES):
+        """
+        Returns a dict mapping each (model, endpoint) pair to a dict with the
+        count, min, max and given quantiles of each of its metrics.
+        """
+        with self._lock:
+            return {
+                key: {
+                    metric: {
+                        "count": sketch.count,
+                        "min": sketch.min,
+                        "max": sketch.max,
+                        "quantiles": dict(
+                            zip(quantiles, sketch.get_quantiles(quantiles))
+                        ),
+                    }
+                    for metric, sketch in sketches.items()
+                }
+                for key, sketches in self._sketches.items()
+            }
+
+    def to_dict(self):
+        """
+        Returns a JSON serializable dict representation of all the
+        sketches, to be merged (e.g., in another process) using merge_dict.
+        """
+        with self._lock:
+            return {
+                "k": self._k,
+                "sketches": [
+                    {
+                        "model": model,
+                        "endpoint": endpoint,
+                        "metric": metric,
+                        "sketch": sketch.to_dict(),
+                    }
+                    for (model, endpoint), sketches in self._sketches.items()
+                    for metric, sketch in sketches.items()
+                ],
+            }
+
+    def merge_dict(self, tracker_dict):
+        """
+        Adds all the calls' metrics in the given dict (created by to_dict)
+        to this tracker's sketches.
+        """
+        with self._lock:
+            for x in tracker_dict["sketches"]:
+                sketches = self._sketches.setdefault(
+                    (x["model"], x["endpoint"]), {}
+                )
+                if x["metric"] not in sketches:
+                    sketches[x["metric"]] = QuantileSketch(self._k)
+                sketches[x["metric"]].merge(
+                    QuantileSketch.from_dict(x["sketch"])
+                )
+
+    def merge(self, other):
+        """
+        Adds all the calls' metrics in the given tracker to this tracker.
+        """
+        self.merge_dict(other.to_dict())
+
+    @classmethod
+    def from_dict(cls, tracker_dict):
+        """
+        Returns a tracker from a dict created by to_dict.
+        """
+        tracker = cls(tracker_dict["k"])
+        tracker.merge_dict(tracker_dict)
+        return tracker
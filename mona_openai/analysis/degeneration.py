@@ -0,0 +1,198 @@
+"""
+Cheap signals for degenerate (looping or repetitive) generations.
+
+All metrics are calculated in a single pass over the text and can be updated
+incrementally as more text arrives (e.g., from a stream), using
+DegenerationTracker:
+    - The length of the longest repeated substring, using an online suffix
+      automaton (linear time and memory).
+    - The ratio of word n-grams that already appeared earlier in the text.
+    - The zlib compression ratio of the text (original size divided by
+      compressed size), which grows as the text gets more repetitive.
+"""
+import zlib
+
+REPEATED_NGRAM_SIZE = 3
+
+_COMPRESSION_LEVEL = 6
+
+
+class _SuffixAutomaton:
+    """
+    An online suffix automaton that keeps track of the longest substring
+    that appears at least twice in all the characters added so far.
+
+    When a character is added, the suffix link of the new state points to
+    the state of the longest suffix of the text that also appeared earlier,
+    so the longest repeated substring is the maximum of that length over all
+    additions.
+    """
+
+    def __init__(self):
+        self._lengths = [0]
+        self._links = [-1]
+        self._transitions = [{}]
+        self._last = 0
+        self.longest_repeated_length = 0
+
+    def add_text(self, text):
+        """
+        Adds the characters of the given text to the automaton.
+        """
+        # Local names are used since this is the hot loop of the module.
+        lengths = self._lengths
+        links = self._links
+        transitions = self._transitions
+        last = self._last
+        longest_repeated_length = self.longest_repeated_length
+
+        for char in text:
+            current = len(lengths)
+            lengths.append(lengths[last] + 1)
+            links.append(0)
+            transitions.append({})
+
+            state = last
+            while state != -1 and char not in transitions[state]:
+                transitions[state][char] = current
+                state = links[state]
+
+            if state != -1:
+                next_state = transitions[state][char]
+                if lengths[state] + 1 == lengths[next_state]:
+                    links[current] = next_state
+                else:
+                    clone = len(lengths)
+                    lengths.append(lengths[state] + 1)
+                    links.append(links[next_state])
+                    transitions.append(transitions[next_state].copy())
+                    while (
+                        state != -1
+                        and transitions[state].get(char) == next_state
+                    ):
+                        transitions[state][char] = clone
+                        state = links[state]
+                    links[next_state] = clone
+                    links[current] = clone
+
+            last = current
+            if lengths[links[current]] > longest_repeated_length:
+                longest_repeated_length = lengths[links[current]]
+
+        self._last = last
+        self.longest_repeated_length = longest_repeated_length
+
+
+class DegenerationTracker:
+    """
+    Calculates degeneration metrics on a text given in one or more chunks.
+    """
+
+    def __init__(self, ngram_size=REPEATED_NGRAM_SIZE):
+        self._ngram_size = ngram_size
+        self._automaton = _SuffixAutomaton()
+        self._compressor = zlib.compressobj(_COMPRESSION_LEVEL)
+        self._compressed_size = 0
+        self._size = 0
+        # The last (possibly still incomplete) word and the complete words
+        # before it that are part of the current n-gram.
+        self._partial_word = ""
+        self._ngram_words = ()
+        self._seen_ngrams = set()
+        self._ngrams_count = 0
+        self._repeated_ngrams_count = 0
+
+    def _get_next_ngram_words(self, word):
+        words = (*self._ngram_words, word)
+        return words[1:] if len(words) > self._ngram_size else words
+
+    def _add_word(self, word):
+        self._ngram_words = self._get_next_ngram_words(word)
+        if len(self._ngram_words) == self._ngram_size:
+            self._ngrams_count += 1
+            if self._ngram_words in self._seen_ngrams:
+                self._repeated_ngrams_count += 1
+            else:
+                self._seen_ngrams.add(self._ngram_words)
+
+    def update(self, text):
+        """
+        Adds the given text chunk to the tracked text.
+        """
+        if not text:
+            return self
+
+        data = text.encode()
+        self._size += len(data)
+        self._compressed_size += len(self._compressor.compress(data))
+
+        self._automaton.add_text(text)
+
+        # The last word of the previous chunk may continue in this one, and
+        # the last word of this chunk may continue in the next one.
+        words = (self._partial_word + text).split()
+        if words and not text[-1].isspace():
+            self._partial_word = words.pop()
+        else:
+            self._partial_word = ""
+        for word in words:
+            self._add_word(word)
+
+        return self
+
+    def get_longest_repeated_substring_length(self):
+        """
+        Returns the length of the longest substring that appears at least
+        twice in the text (occurrences may overlap).
+        """
+        return self._automaton.longest_repeated_length
+
+    def get_repeated_ngram_ratio(self):
+        """
+        Returns the ratio of word n-grams in the text that already appeared
+        earlier in it. Returns 0 if there are no n-grams in the text.
+        """
+        ngrams_count = self._ngrams_count
+        repeated_ngrams_count = self._repeated_ngrams_count
+        # Account for the last word without changing the tracked state, as
+        # more characters could still be added to it.
+        if self._partial_word:
+            ngram = self._get_next_ngram_words(self._partial_word)
+            if len(ngram) == self._ngram_size:
+                ngrams_count += 1
+                repeated_ngrams_count += ngram in self._seen_ngrams
+
+        return repeated_ngrams_count / ngrams_count if ngrams_count else 0.0
+
+    def get_compression_ratio(self):
+        """
+        Returns the size of the (UTF-8 encoded) text divided by its zlib
+        compressed size. Returns 0 for an empty text.
+        """
+        if not self._size:
+            return 0.0
+        # Flush a copy so that the tracker can still be updated.
+        compressed_size = (
+            self._compressed_size + len(self._compressor.copy().flush())
+        )
+        return self._size / compressed_size
+
+
+def get_degeneration_features(texts):
+    """
+    A batch function (see analysis/registry.py) returning the degeneration
+    metrics of each of the given texts.
+    """
+    ret = []
+    for text in texts:
+        tracker = DegenerationTracker().update(text)
+        ret.append(
+            {
+                "longest_repeated_substring_length": (
+                    tracker.get_longest_repeated_substring_length()
+                ),
+                "repeated_ngram_ratio": tracker.get_repeated_ngram_ratio(),
+                "compression_ratio": tracker.get_compression_ratio(),
+            }
+        )
+    return ret
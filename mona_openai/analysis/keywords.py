@@ -0,0 +1,183 @@
+"""
+Functionality for finding user-supplied keywords (e.g., banned product
+names, competitor names or internal codewords) in texts.
+
+All terms (of all categories) are compiled once into a single Aho-Corasick
+automaton, so each text is scanned in a single linear pass regardless of
+the number of terms. Matching is case-insensitive, and a term only matches
+as a whole word (i.e., "ant" doesn't match inside "want").
+"""
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Iterable
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class KeywordMatcher:
+    """
+    An Aho-Corasick automaton built from a mapping of category names to
+    lists of terms.
+    """
+
+    def __init__(self, terms_by_category):
+        self.categories = tuple(terms_by_category)
+        self._terms = []
+        self._term_categories = []
+        term_ids = {}
+        for category, terms in terms_by_category.items():
+            for term in terms:
+                term = term.lower()
+                if not term:
+                    continue
+                if term not in term_ids:
+                    term_ids[term] = len(self._terms)
+                    self._terms.append(term)
+                    self._term_categories.append([])
+                self._term_categories[term_ids[term]].append(category)
+
+        # The trie: each state's transitions, failure link and the ids of the
+        # terms ending at it (including through failure links).
+        self._transitions = [{}]
+        self._outputs = [[]]
+        for term_id, term in enumerate(self._terms):
+            state = 0
+            for char in term:
+                if char not in self._transitions[state]:
+                    self._transitions[state][char] = len(self._transitions)
+                    self._transitions.append({})
+                    self._outputs.append([])
+                state = self._transitions[state][char]
+            self._outputs[state].append(term_id)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        self._failures = [0] * len(self._transitions)
+        queue = deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                failure = self._failures[state]
+                while failure and char not in self._transitions[failure]:
+                    failure = self._failures[failure]
+                failure = self._transitions[failure].get(char, 0)
+                # The root's children fail back to the root.
+                self._failures[next_state] = (
+                    failure if failure != next_state else 0
+                )
+                self._outputs[next_state] = (
+                    self._outputs[next_state]
+                    + self._outputs[self._failures[next_state]]
+                )
+                queue.append(next_state)
+
+    @staticmethod
+    def _is_whole_word(text, start, end):
+        # Boundaries are only required on the term's edges that are word
+        # characters (e.g., "c++" matches in "c++17").
+        return (
+            start == 0
+            or not _is_word_char(text[start])
+            or not _is_word_char(text[start - 1])
+        ) and (
+            end == len(text)
+            or not _is_word_char(text[end - 1])
+            or not _is_word_char(text[end])
+        )
+
+    def find_all(self, text):
+        """
+        Returns a dict mapping each category to a Counter of the
+        occurrences of its terms found in the given text.
+        """
+        # Local names are used since this is the hot loop of the module.
+        transitions = self._transitions
+        failures = self._failures
+        outputs = self._outputs
+        terms = self._terms
+
+        text = text.lower()
+        ret = {category: Counter() for category in self.categories}
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in transitions[state]:
+                state = failures[state]
+            state = transitions[state].get(char, 0)
+            for term_id in outputs[state]:
+                end = index + 1
+                if self._is_whole_word(text, end - len(terms[term_id]), end):
+                    for category in self._term_categories[term_id]:
+                        ret[category][terms[term_id]] += 1
+        return ret
+
+
+def _get_hashable_terms(terms_by_category):
+    return tuple(
+        (category, tuple(terms))
+        for category, terms in terms_by_category.items()
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_keyword_matcher(hashable_terms):
+    return KeywordMatcher(
+        {category: terms for category, terms in hashable_terms}
+    )
+
+
+def get_keyword_matcher(terms_by_category):
+    """
+    Returns a KeywordMatcher for the given mapping of category names to
+    lists of terms. Matchers are cached, so the automaton for a given terms
+    mapping is only built once per process.
+    """
+    return _get_keyword_matcher(_get_hashable_terms(terms_by_category))
+
+
+class KeywordAnalyzer:
+    """
+    An analyzer class that takes a text and provides functionality to
+    extract keyword-related metrics from that text.
+
+    The text is only scanned when first needed.
+    """
+
+    def __init__(self, text, matcher: KeywordMatcher) -> None:
+        self._text = text
+        self._matcher = matcher
+        self._matches = None
+
+    def _get_matches(self, category):
+        if self._matches is None:
+            self._matches = self._matcher.find_all(self._text)
+        return self._matches[category]
+
+    def get_keywords_count(self, category):
+        """
+        Returns the number of occurrences of the given category's terms in
+        the initially given text.
+        """
+        return sum(self._get_matches(category).values())
+
+    def get_previously_unseen_keywords_count(
+        self, category, others: Iterable["KeywordAnalyzer"]
+    ):
+        """
+        Returns the number of distinct terms of the given category in the
+        initially given text, that don't also appear in any of the given
+        other analyzers.
+        """
+        return len(
+            self._get_matches(category).keys()
+            - set().union(*(other._get_matches(category) for other in others))
+        )
+
+
+def get_keyword_analyzers(texts, matcher: KeywordMatcher):
+    """
+    Returns a tuple of KeywordAnalyzer objects, one for each text in the
+    given iterable.
+    """
+    return tuple(KeywordAnalyzer(text, matcher) for text in texts)
@@ -0,0 +1,194 @@
+"""
+Detection of near-duplicate answers to different prompts, which could
+indicate cache-like or degenerate model behavior.
+
+Each answer is fingerprinted using a 64-bit SimHash of its words and word
+bigrams. Recent fingerprints are kept in a bounded in-memory LSH index: the
+fingerprint is split into bands, and any two fingerprints that are within
+the maximal hamming distance are guaranteed to share at least one band
+(since there is one more band than the allowed number of differing bits),
+so lookups only compare against a few candidates from the matching band
+buckets.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+FINGERPRINT_BITS = 64
+_FINGERPRINT_MASK = 2**FINGERPRINT_BITS - 1
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_MAX_AGE_SECONDS = 60 * 60
+DEFAULT_MAX_HAMMING_DISTANCE = 3
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def get_simhash(text):
+    """
+    Returns a 64-bit SimHash fingerprint of the given text's words and word
+    bigrams, or None if the text has no words.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+
+    features = words + [f"{x} {y}" for x, y in zip(words, words[1:])]
+    # Count, for each bit, in how many feature hashes it is set. A bit is set
+    # in the fingerprint if it's set in more than half of the features.
+    # The counts are kept bit-sliced: bit i of count_planes[k] is bit k of
+    # bit i's count, so each hash is added to all 64 counts at once, with a
+    # few integer operations.
+    count_planes = []
+    for feature in features:
+        carry = hash(feature) & _FINGERPRINT_MASK
+        for k, plane in enumerate(count_planes):
+            if not carry:
+                break
+            count_planes[k] = plane ^ carry
+            carry &= plane
+        else:
+            if carry:
+                count_planes.append(carry)
+
+    fingerprint = 0
+    for i in range(FINGERPRINT_BITS):
+        count = 0
+        for k, plane in enumerate(count_planes):
+            count |= (plane >> i & 1) << k
+        if 2 * count > len(features):
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+def _get_hamming_distance(fingerprint_1, fingerprint_2):
+    return bin(fingerprint_1 ^ fingerprint_2).count("1")
+
+
+def get_similarity(fingerprint_1, fingerprint_2):
+    """
+    Returns a similarity score between 0 and 1 for the given fingerprints,
+    based on their hamming distance.
+    """
+    return (
+        1
+        - _get_hamming_distance(fingerprint_1, fingerprint_2)
+        / FINGERPRINT_BITS
+    )
+
+
+class NearDuplicateIndex:
+    """
+    A thread-safe, bounded index of recent answer fingerprints. Entries are
+    evicted when they are older than max_age_seconds, or when the index
+    holds more than max_size entries (oldest first).
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_MAX_SIZE,
+        max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+        max_hamming_distance=DEFAULT_MAX_HAMMING_DISTANCE,
+    ):
+        self._max_size = max_size
+        self._max_age_seconds = max_age_seconds
+        self._max_hamming_distance = max_hamming_distance
+        self._bands_num = max_hamming_distance + 1
+        self._band_bits = FINGERPRINT_BITS // self._bands_num
+        self._band_mask = 2**self._band_bits - 1
+        # Maps entry id to a (fingerprint, prompt key, insertion time) tuple,
+        # in insertion order.
+        self._entries = OrderedDict()
+        self._buckets = tuple({} for _ in range(self._bands_num))
+        self._next_entry_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_bands(self, fingerprint):
+        # The last band also gets the leftover bits, if any.
+        return tuple(
+            (fingerprint >> (i * self._band_bits))
+            & (
+                self._band_mask
+                if i < self._bands_num - 1
+                else _FINGERPRINT_MASK
+            )
+            for i in range(self._bands_num)
+        )
+
+    def _evict(self, now):
+        while self._entries:
+            entry_id, (fingerprint, _, insertion_time) = next(
+                iter(self._entries.items())
+            )
+            if (
+                len(self._entries) <= self._max_size
+                and now - insertion_time <= self._max_age_seconds
+            ):
+                return
+            del self._entries[entry_id]
+            for bucket, band in zip(
+                self._buckets, self._get_bands(fingerprint)
+            ):
+                bucket[band].discard(entry_id)
+                if not bucket[band]:
+                    del bucket[band]
+
+    def _find(self, fingerprint, prompt_key):
+        candidates = set().union(
+            *(
+                bucket.get(band, ())
+                for bucket, band in zip(
+                    self._buckets, self._get_bands(fingerprint)
+                )
+            )
+        )
+        count = 0
+        max_similarity = 0.0
+        for entry_id in candidates:
+            other_fingerprint, other_prompt_key, _ = self._entries[entry_id]
+            # Similar answers to the same prompt are expected.
+            if other_prompt_key == prompt_key:
+                continue
+            distance = _get_hamming_distance(fingerprint, other_fingerprint)
+            if distance <= self._max_hamming_distance:
+                count += 1
+            max_similarity = max(
+                max_similarity, get_similarity(fingerprint, other_fingerprint)
+            )
+        return count, max_similarity
+
+    def _add(self, fingerprint, prompt_key, now):
+        entry_id = self._next_entry_id
+        self._next_entry_id += 1
+        self._entries[entry_id] = (fingerprint, prompt_key, now)
+        for bucket, band in zip(self._buckets, self._get_bands(fingerprint)):
+            bucket.setdefault(band, set()).add(entry_id)
+
+    def find_and_add(self, fingerprints, prompt_key):
+        """
+        Returns a tuple with a (near duplicates count, max similarity) pair
+        for each of the given fingerprints, comparing only to entries of
+        other prompts, and then adds the fingerprints to the index.
+
+        All fingerprints are looked up before any is added, so that answers
+        from the same call are never compared to each other. None
+        fingerprints (empty answers) are ignored.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            ret = tuple(
+                self._find(fingerprint, prompt_key)
+                if fingerprint is not None
+                else (0, 0.0)
+                for fingerprint in fingerprints
+            )
+            for fingerprint in fingerprints:
+                if fingerprint is not None:
+                    self._add(fingerprint, prompt_key, now)
+            self._evict(now)
+        return ret
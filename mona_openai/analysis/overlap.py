@@ -0,0 +1,110 @@
+"""
+Fixed-memory analysis of the n-gram overlap between prompts and answers.
+
+Unlike the exact "answer_words_not_in_prompt_*" textual metrics, which keep
+a set of all prompt words, prompt n-grams here are hashed into a fixed-size
+bloom filter. This keeps memory constant even for very long prompts (e.g.,
+RAG prompts holding lots of retrieved context), at the cost of a small
+probability of counting a novel answer n-gram as seen in the prompt.
+
+Answers are usually short, so their n-grams are iterated exactly.
+"""
+import re
+from collections import deque
+from typing import Iterable
+
+NGRAM_SIZES = (1, 2, 3)
+NGRAM_NAMES = {1: "unigram", 2: "bigram", 3: "trigram"}
+
+# A single filter holds the n-grams of all sizes, so ~100K prompt words make
+# ~300K distinct n-grams. With 3 hash functions, 2^22 bits (512KB) keep the
+# false positive rate under 1% for up to that many n-grams.
+DEFAULT_SKETCH_BITS = 2**22
+_HASH_FUNCTIONS_NUM = 3
+_HALF_HASH_MASK = 2**32 - 1
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def _iterate_ngram_hashes(text, ngram_sizes):
+    """
+    Yields a hash for each word n-gram (of each of the given sizes) in the
+    given text in a single pass, without holding more than the largest
+    n-gram in memory.
+    """
+    window = deque(maxlen=max(ngram_sizes))
+    for match in _WORD_RE.finditer(text):
+        window.append(match.group())
+        for n in ngram_sizes:
+            if len(window) >= n:
+                yield hash((n, *tuple(window)[-n:]))
+
+
+class NgramSketch:
+    """
+    A bloom filter holding hashed word n-grams (of all sizes in NGRAM_SIZES)
+    of the given texts in a fixed amount of memory.
+    """
+
+    def __init__(self, texts, bits=DEFAULT_SKETCH_BITS):
+        self._bits = bits
+        self._filter = bytearray((bits + 7) // 8)
+        for text in texts:
+            for ngram_hash in _iterate_ngram_hashes(text, NGRAM_SIZES):
+                self._add(ngram_hash)
+
+    def _get_bit_indices(self, ngram_hash):
+        # Double hashing (Kirsch-Mitzenmacher) using both halves of the hash.
+        low = ngram_hash & _HALF_HASH_MASK
+        high = ((ngram_hash >> 32) & _HALF_HASH_MASK) | 1
+        return (
+            (low + i * high) % self._bits for i in range(_HASH_FUNCTIONS_NUM)
+        )
+
+    def _add(self, ngram_hash):
+        for index in self._get_bit_indices(ngram_hash):
+            self._filter[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, ngram_hash):
+        return all(
+            self._filter[index >> 3] & (1 << (index & 7))
+            for index in self._get_bit_indices(ngram_hash)
+        )
+
+
+class OverlapAnalyzer:
+    """
+    An analyzer class that takes an answer text and provides methods to
+    compare its n-grams to the n-grams held in prompt sketches.
+    """
+
+    def __init__(self, text):
+        self._text = text
+
+    def get_novelty_ratio(self, prompt_sketch: NgramSketch, n):
+        """
+        Returns the ratio of the text's word n-grams of size n that don't
+        appear in the given sketch. Returns 0 if the text has less than n
+        words.
+        """
+        total = 0
+        novel = 0
+        for ngram_hash in _iterate_ngram_hashes(self._text, (n,)):
+            total += 1
+            if ngram_hash not in prompt_sketch:
+                novel += 1
+        return novel / total if total else 0.0
+
+
+def get_prompt_sketch(texts: Iterable[str]):
+    """
+    Returns a single NgramSketch for all the given prompt texts.
+    """
+    return NgramSketch(texts)
+
+
+def get_overlap_analyzers(texts):
+    """
+    Returns a tuple of OverlapAnalyzers for all the given texts.
+    """
+    return tuple(OverlapAnalyzer(text) for text in texts)
@@ -0,0 +1,126 @@
+"""
+Analysis of how much of each prompt's prefix is shared with recent prompts
+(of the same model), which is what OpenAI's prompt caching can reuse.
+
+Prompts whose variable parts come early (e.g., a user name at the start of
+a long template) share short prefixes with recent traffic and don't benefit
+from caching, which shows up as a low shared prefix ratio.
+
+Prompts are split into fixed-size blocks of tokens, and a chained hash of
+each block-aligned prefix is kept in a bounded in-memory index of recent
+prompts. Since a prefix is shared only if all its shorter prefixes are
+shared too, the longest shared prefix is found with a binary search over
+the prompt's prefix hashes. Shared prefix lengths are therefore rounded down
+to whole blocks.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 1000
+# OpenAI keeps cached prefixes for 5-10 minutes of inactivity.
+DEFAULT_MAX_AGE_SECONDS = 10 * 60
+DEFAULT_BLOCK_SIZE = 16
+
+
+def get_prefix_hashes(tokens, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Returns a tuple with a hash for each block-aligned prefix of the given
+    tokens (i.e., the hash of the first block, of the first two blocks,
+    etc...). A last partial block is ignored.
+    """
+    ret = []
+    prefix_hash = 0
+    for end in range(block_size, len(tokens) + 1, block_size):
+        prefix_hash = hash((prefix_hash, *tokens[end - block_size:end]))
+        ret.append(prefix_hash)
+    return tuple(ret)
+
+
+class PrefixIndex:
+    """
+    A thread-safe, bounded index of the prefix hashes of recent prompts.
+    Prompts are evicted when they are older than max_age_seconds, or when
+    the index holds more than max_size prompts (oldest first).
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_MAX_SIZE,
+        max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+        block_size=DEFAULT_BLOCK_SIZE,
+    ):
+        self._max_size = max_size
+        self._max_age_seconds = max_age_seconds
+        self.block_size = block_size
+        # Maps entry id to a (prefix hashes, insertion time) pair, in
+        # insertion order.
+        self._entries = OrderedDict()
+        # The number of indexed prompts holding each prefix hash.
+        self._prefix_counts = {}
+        self._next_entry_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        while self._entries:
+            entry_id, (prefix_hashes, insertion_time) = next(
+                iter(self._entries.items())
+            )
+            if (
+                len(self._entries) <= self._max_size
+                and now - insertion_time <= self._max_age_seconds
+            ):
+                return
+            del self._entries[entry_id]
+            for prefix_hash in prefix_hashes:
+                self._prefix_counts[prefix_hash] -= 1
+                if not self._prefix_counts[prefix_hash]:
+                    del self._prefix_counts[prefix_hash]
+
+    def _find_shared_blocks_count(self, prefix_hashes):
+        # Binary search for the number of leading prefixes in the index.
+        low, high = 0, len(prefix_hashes)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if prefix_hashes[middle - 1] in self._prefix_counts:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _add(self, prefix_hashes, now):
+        self._entries[self._next_entry_id] = (prefix_hashes, now)
+        self._next_entry_id += 1
+        for prefix_hash in prefix_hashes:
+            self._prefix_counts[prefix_hash] = (
+                self._prefix_counts.get(prefix_hash, 0) + 1
+            )
+
+    def find_and_add(self, prompts_tokens):
+        """
+        Returns a tuple with the length (in tokens, rounded down to whole
+        blocks) of the longest prefix each of the given token sequences
+        shares with recent prompts, and then adds them to the index.
+
+        All prompts are looked up before any is added, so that prompts from
+        the same call are never compared to each other.
+        """
+        now = time.monotonic()
+        all_prefix_hashes = tuple(
+            get_prefix_hashes(tokens, self.block_size)
+            for tokens in prompts_tokens
+        )
+        with self._lock:
+            self._evict(now)
+            ret = tuple(
+                self._find_shared_blocks_count(prefix_hashes)
+                * self.block_size
+                for prefix_hashes in all_prefix_hashes
+            )
+            for prefix_hashes in all_prefix_hashes:
+                self._add(prefix_hashes, now)
+            self._evict(now)
+        return ret
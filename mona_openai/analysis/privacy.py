@@ -9,8 +9,6 @@ TODO(itai): Add many more functions to extract information such as:
 """
 import re
 
-from phonenumbers import PhoneNumberMatcher
-
 # TODO(itai): Add module-level tests for this module, specifically for email
 #   extraction, since this is our own logic and not using an external library.
 
@@ -25,6 +23,9 @@ def _extract_phone_numbers(text):
     """
     Extract phone numbers from a prompt string and return as a set.
     """
+    # Imported here so that phonenumbers is only loaded when actually used.
+    from phonenumbers import PhoneNumberMatcher
+
     phone_numbers = set()
     # We use "US" just as a default region in case there are no country codes
     # since we don't care about the formatting of the found number, but just
@@ -48,32 +49,45 @@ class PrivacyAnalyzer:
     """
     An analyzer class that takes a text and provides functionality to extract
     privacy-related metrics from that text.
+
+    Phone numbers and emails are only extracted when first needed, so that
+    unused metrics don't cost anything.
     """
 
     def __init__(self, text) -> None:
         self._text = text
-        self._phone_numbers = _extract_phone_numbers(text)
-        self._emails = _extract_all_emails(text)
+        self._phone_numbers = None
+        self._emails = None
+
+    def _get_phone_numbers(self):
+        if self._phone_numbers is None:
+            self._phone_numbers = _extract_phone_numbers(self._text)
+        return self._phone_numbers
+
+    def _get_emails(self):
+        if self._emails is None:
+            self._emails = _extract_all_emails(self._text)
+        return self._emails
 
     def get_phone_numbers_count(self):
         """
         Returns the number of phone numbers in the initially given text.
         """
-        return len(self._phone_numbers)
+        return len(self._get_phone_numbers())
 
     def get_emails_count(self):
         """
         Returns the number of email addresses in the initially given text.
         """
-        return len(self._emails)
+        return len(self._get_emails())
 
     @classmethod
     def _get_phone_numbers_from_instance(cls, instance):
-        return instance._phone_numbers
+        return instance._get_phone_numbers()
 
     @classmethod
     def _get_emails_from_instance(cls, instance):
-        return instance._emails
+        return instance._get_emails()
 
     def _get_previously_unseen_x_count(
         self, others: Iterable["PrivacyAnalyzer"], extraction_function
@@ -1,15 +1,71 @@
 """
 Logic to create profanity analysis.
+
+Three profanity engines are supported (set with the "profanity_engine" spec):
+    - "profanity_check" (default): Uses alt-profanity-check's sklearn model.
+    - "mmap": Uses the same model exported to a memory-mapped file (see
+      profanity_model.py), shared between all processes on the machine. The
+      file path can be set with the "profanity_model_path" spec.
+    - "numpy": Uses the same model file loaded into the process' memory,
+      with dict token lookups and premultiplied weights, for the lowest
+      scoring latency (an order of magnitude faster than sklearn for short
+      texts).
 """
+from functools import lru_cache
+
+from ..exceptions import InvalidProfanityEngineException
 
-from profanity_check import predict_prob, predict
+PROFANITY_CHECK_ENGINE = "profanity_check"
+MMAP_ENGINE = "mmap"
+NUMPY_ENGINE = "numpy"
 
 _DECIMAL_PLACES = 2
 
 
-def get_profanity_prob(texts):
-    return tuple(round(x, _DECIMAL_PLACES) for x in predict_prob(texts))
+@lru_cache(maxsize=None)
+def get_profanity_model(engine=PROFANITY_CHECK_ENGINE, model_path=None):
+    """
+    Returns an object with "predict_prob" and "predict" functions for the
+    given engine. Models are loaded lazily on first use and cached for the
+    lifetime of the process.
+    """
+    if engine == PROFANITY_CHECK_ENGINE:
+        import profanity_check
+
+        return profanity_check
+
+    if engine == MMAP_ENGINE:
+        from .profanity_model import DEFAULT_MODEL_PATH, MappedProfanityModel
+
+        return MappedProfanityModel(model_path or DEFAULT_MODEL_PATH)
+
+    if engine == NUMPY_ENGINE:
+        from .profanity_model import DEFAULT_MODEL_PATH, NumpyProfanityModel
+
+        return NumpyProfanityModel(model_path or DEFAULT_MODEL_PATH)
+
+    raise InvalidProfanityEngineException(
+        f"Unknown profanity engine '{engine}', must be one of "
+        f"{(PROFANITY_CHECK_ENGINE, MMAP_ENGINE, NUMPY_ENGINE)}"
+    )
+
+
+def get_specs_profanity_model(specs):
+    """
+    Returns the profanity model set by the "profanity_engine" and
+    "profanity_model_path" specs.
+    """
+    return get_profanity_model(
+        specs.get("profanity_engine", PROFANITY_CHECK_ENGINE),
+        specs.get("profanity_model_path"),
+    )
+
+
+def get_profanity_prob(texts, model=None):
+    model = model or get_profanity_model()
+    return tuple(round(x, _DECIMAL_PLACES) for x in model.predict_prob(texts))
 
 
-def get_has_profanity(texts):
-    return tuple(bool(x) for x in predict(texts))
+def get_has_profanity(texts, model=None):
+    model = model or get_profanity_model()
+    return tuple(bool(x) for x in model.predict(texts))
@@ -0,0 +1,351 @@
+"""
+A profanity model that reproduces alt-profanity-check's predictions using
+plain arrays stored in a single memory-mapped file.
+
+profanity_check's sklearn vectorizer and model are unpickled into each
+process' private memory. By exporting the model's vocabulary and weights to
+a file that is memory-mapped read-only, all processes on the same machine
+(e.g., pre-forked web server workers) share a single copy of the model
+through the OS page cache, and sklearn doesn't need to be imported at all.
+
+The file is built from profanity_check's model (the only time sklearn is
+needed) either explicitly:
+    $ python -m mona_openai.analysis.profanity_model [PATH]
+or automatically on first use if it doesn't exist yet.
+
+File layout: an 8 byte magic string, an 8 byte little-endian header size, a
+JSON header describing the arrays (dtype, shape and offset) and then the
+arrays' data, each aligned to 64 bytes.
+"""
+
+import abc
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "mona_openai"
+    / "profanity_model.bin"
+)
+
+_MAGIC = b"MONAPRF1"
+_HEADER_SIZE_FORMAT = "<Q"
+_ALIGNMENT = 64
+
+# Same as profanity_check's vectorizer token pattern.
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _get_profanity_check_arrays():
+    """
+    Returns a dict of all arrays needed for scoring, extracted from
+    profanity_check's TF-IDF vectorizer and calibrated linear SVC model.
+    """
+    from profanity_check import profanity_check
+
+    vectorizer = profanity_check.vectorizer
+    model = profanity_check.model
+
+    # Sort the vocabulary (as UTF-8 bytes) to allow binary search.
+    vocabulary = sorted(
+        (token.encode(), index)
+        for token, index in vectorizer.vocabulary_.items()
+    )
+    indices = np.array([index for _, index in vocabulary])
+    classifiers = model.calibrated_classifiers_
+
+    return {
+        "vocabulary": np.array([token for token, _ in vocabulary]),
+        "idf": vectorizer.idf_[indices],
+        # One column per calibrated classifier (cross validation fold).
+        "coefficients": np.stack(
+            [x.estimator.coef_[0][indices] for x in classifiers], axis=1
+        ),
+        "intercepts": np.array(
+            [x.estimator.intercept_[0] for x in classifiers]
+        ),
+        "calibration_a": np.array([x.calibrators[0].a_ for x in classifiers]),
+        "calibration_b": np.array([x.calibrators[0].b_ for x in classifiers]),
+    }
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_model_file(arrays, path):
+    """
+    Writes the given arrays to a model file in the given path. The file is
+    written to a temporary file first and then renamed, so that processes
+    never see a partially written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    arrays = {name: np.ascontiguousarray(x) for name, x in arrays.items()}
+    # The header size depends on the offsets, so offsets are calculated
+    # relative to the data section start, which is the aligned end of the
+    # header.
+    relative_offsets = {}
+    offset = 0
+    for name, array in arrays.items():
+        relative_offsets[name] = offset
+        offset = _align(offset + array.nbytes)
+
+    def get_header(data_start):
+        return json.dumps(
+            {
+                name: {
+                    "dtype": array.dtype.str,
+                    "shape": array.shape,
+                    "offset": data_start + relative_offsets[name],
+                }
+                for name, array in arrays.items()
+            }
+        ).encode()
+
+    prefix_size = len(_MAGIC) + struct.calcsize(_HEADER_SIZE_FORMAT)
+    # Offsets only get longer as data_start grows, so iterate until stable.
+    data_start = _align(prefix_size + len(get_header(0)))
+    while _align(prefix_size + len(get_header(data_start))) > data_start:
+        data_start = _align(prefix_size + len(get_header(data_start)))
+    header = get_header(data_start)
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack(_HEADER_SIZE_FORMAT, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + relative_offsets[name])
+                f.write(array.tobytes())
+        # mkstemp creates files only readable by their owner.
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def build_model_file(path=DEFAULT_MODEL_PATH):
+    """
+    Exports profanity_check's model to a model file in the given path.
+    """
+    write_model_file(_get_profanity_check_arrays(), path)
+
+
+def _read_model_file(path):
+    """
+    Memory-maps the given model file and returns a dict of read-only numpy
+    arrays backed by the mapped memory.
+    """
+    with open(path, "rb") as f:
+        mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    prefix_size = len(_MAGIC) + struct.calcsize(_HEADER_SIZE_FORMAT)
+    if mapped_file[: len(_MAGIC)] != _MAGIC:
+        raise ValueError(f"{path} is not a profanity model file")
+    (header_size,) = struct.unpack_from(
+        _HEADER_SIZE_FORMAT, mapped_file, len(_MAGIC)
+    )
+    header_end = prefix_size + header_size
+    header = json.loads(mapped_file[prefix_size:header_end])
+
+    return {
+        name: np.frombuffer(
+            mapped_file,
+            dtype=np.dtype(spec["dtype"]),
+            count=int(np.prod(spec["shape"], dtype=np.int64)),
+            offset=spec["offset"],
+        ).reshape(spec["shape"])
+        for name, spec in header.items()
+    }
+
+
+def _load_model_arrays(path):
+    if not os.path.exists(path):
+        build_model_file(path)
+    return _read_model_file(path)
+
+
+class _LinearProfanityModel(metaclass=abc.ABCMeta):
+    """
+    A base class for models scoring texts with profanity_check's calibrated
+    linear SVC, given the arrays of a model file.
+    """
+
+    def __init__(self, arrays):
+        self._intercepts = arrays["intercepts"]
+        self._calibration_a = arrays["calibration_a"]
+        self._calibration_b = arrays["calibration_b"]
+
+    @abc.abstractmethod
+    def _get_decisions(self, texts):
+        """
+        Returns an array of shape (len(texts), folds) with the decision
+        function value (without the intercept) of each calibrated
+        classifier for each text.
+        """
+        pass
+
+    def _get_positive_probabilities(self, texts):
+        """
+        Returns an array of shape (len(texts), folds) with the positive
+        class probability of each calibrated classifier for each text.
+        """
+        decisions = self._get_decisions(texts) + self._intercepts
+        return 1 / (
+            1 + np.exp(self._calibration_a * decisions + self._calibration_b)
+        )
+
+    def predict_prob(self, texts):
+        """
+        Returns an array with the probability of profanity in each of the
+        given texts, same as profanity_check.predict_prob.
+        """
+        probabilities = self._get_positive_probabilities(texts)
+        return probabilities.mean(axis=1) if len(texts) else np.zeros(0)
+
+    def predict(self, texts):
+        """
+        Returns an array with 1 for each of the given texts that is
+        predicted to have profanity and 0 otherwise, same as
+        profanity_check.predict.
+        """
+        probabilities = self._get_positive_probabilities(texts)
+        return (
+            probabilities.mean(axis=1) > (1 - probabilities).mean(axis=1)
+        ).astype(int)
+
+
+class MappedProfanityModel(_LinearProfanityModel):
+    """
+    A profanity model scoring texts using arrays from a memory-mapped model
+    file. Tokens are looked up in the vocabulary using binary search, so no
+    per-process lookup structures are needed.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH):
+        arrays = _load_model_arrays(path)
+        super().__init__(arrays)
+        self._vocabulary = arrays["vocabulary"]
+        self._idf = arrays["idf"]
+        self._coefficients = arrays["coefficients"]
+
+    def _get_token_indices(self, tokens):
+        """
+        Returns the vocabulary index of each of the given tokens, or -1 for
+        tokens that aren't in the vocabulary.
+        """
+        max_token_size = self._vocabulary.dtype.itemsize
+        encoded_tokens = [x.encode() for x in tokens]
+        # Longer tokens would be truncated when converted to the
+        # vocabulary's dtype, and can't be in the vocabulary anyway.
+        queries = np.array(
+            [x if len(x) <= max_token_size else b"" for x in encoded_tokens],
+            dtype=self._vocabulary.dtype,
+        )
+        positions = np.searchsorted(self._vocabulary, queries)
+        positions[positions == len(self._vocabulary)] = 0
+        found = (self._vocabulary[positions] == queries) & (queries != b"")
+        return np.where(found, positions, -1)
+
+    def _get_decisions(self, texts):
+        texts_tokens = [_TOKEN_RE.findall(text.lower()) for text in texts]
+        text_ids = np.repeat(
+            np.arange(len(texts)), [len(x) for x in texts_tokens]
+        )
+        token_indices = self._get_token_indices(
+            [token for tokens in texts_tokens for token in tokens]
+        )
+        in_vocabulary = token_indices != -1
+
+        # Term frequencies of each (text, token) pair.
+        pairs, term_frequencies = np.unique(
+            np.stack(
+                [text_ids[in_vocabulary], token_indices[in_vocabulary]],
+                axis=1,
+            ),
+            axis=0,
+            return_counts=True,
+        )
+        pair_text_ids = pairs[:, 0] if len(pairs) else np.zeros(0, int)
+        pair_token_indices = pairs[:, 1] if len(pairs) else np.zeros(0, int)
+
+        # L2 normalized TF-IDF values.
+        tf_idf = term_frequencies * self._idf[pair_token_indices]
+        norms = np.sqrt(
+            np.bincount(pair_text_ids, tf_idf**2, minlength=len(texts))
+        )
+        tf_idf = tf_idf / norms[pair_text_ids]
+
+        decisions = np.zeros((len(texts), len(self._intercepts)))
+        np.add.at(
+            decisions,
+            pair_text_ids,
+            tf_idf[:, np.newaxis] * self._coefficients[pair_token_indices],
+        )
+        return decisions
+
+
+class NumpyProfanityModel(_LinearProfanityModel):
+    """
+    A profanity model optimized for scoring latency, holding the model file's
+    arrays in the process' own memory.
+
+    Tokens are looked up in a dict, and the IDF weights are premultiplied
+    into the coefficients, so scoring a text only takes a tokenization, a
+    few dict lookups and a small dot product.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH):
+        arrays = _load_model_arrays(path)
+        super().__init__({name: np.array(x) for name, x in arrays.items()})
+        self._token_indices = {
+            token.decode(): index
+            for index, token in enumerate(arrays["vocabulary"].tolist())
+        }
+        self._idf = np.array(arrays["idf"])
+        self._weights = self._idf[:, np.newaxis] * arrays["coefficients"]
+
+    def _get_decisions(self, texts):
+        # Local names are used since this runs for every scored text.
+        token_indices = self._token_indices
+        idf = self._idf
+        weights = self._weights
+
+        decisions = np.zeros((len(texts), len(self._intercepts)))
+        for i, text in enumerate(texts):
+            term_frequencies = {}
+            for token in _TOKEN_RE.findall(text.lower()):
+                index = token_indices.get(token)
+                if index is not None:
+                    term_frequencies[index] = (
+                        term_frequencies.get(index, 0) + 1
+                    )
+            if not term_frequencies:
+                continue
+
+            indices = np.fromiter(
+                term_frequencies, np.intp, len(term_frequencies)
+            )
+            counts = np.fromiter(
+                term_frequencies.values(), np.float64, len(term_frequencies)
+            )
+            tf_idf = counts * idf[indices]
+            decisions[i] = counts @ weights[indices] / np.sqrt(tf_idf @ tf_idf)
+
+        return decisions
+
+
+if __name__ == "__main__":
+    build_model_file(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL_PATH)
@@ -0,0 +1,218 @@
+"""
+A registry for custom analyzers that run alongside the built-in privacy,
+textual and profanity analyses.
+
+Each registered analyzer declares a batch function that gets a list of texts
+and returns a list of per-text feature dicts (one dict per text, in the same
+order), the text roles it applies to (prompt, answer, last user message) and
+a relative cost class.
+
+When a call is analyzed, every analyzer gets all of its relevant texts (from
+all of its roles) in a single batch call. Cheap analyzers run inline, while
+expensive ones are submitted to a thread pool as soon as the analysis
+starts, so they run concurrently with everything else. The call still waits
+for them before it's logged, and because of the GIL, only analyzers that
+release it (e.g., I/O, or native code such as numpy) actually overlap with
+the rest of the analysis.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from typing import Callable, NamedTuple, Sequence
+
+from ..exceptions import InvalidAnalyzerException
+
+PROMPT_ROLE = "prompt"
+ANSWER_ROLE = "answer"
+LAST_USER_MESSAGE_ROLE = "last_user_message"
+ALL_ROLES = (PROMPT_ROLE, ANSWER_ROLE, LAST_USER_MESSAGE_ROLE)
+
+CHEAP_COST = "cheap"
+EXPENSIVE_COST = "expensive"
+COST_CLASSES = (CHEAP_COST, EXPENSIVE_COST)
+
+# These names are used by the built-in analysis categories and can't be used
+# for registered analyzers.
+RESERVED_ANALYZER_NAMES = (
+    "privacy",
+    "textual",
+    "profanity",
+    "overlap",
+    "near_duplicate",
+    "prefix_cache",
+    "request_efficiency",
+    "keywords",
+    "tokens",
+)
+
+_BACKGROUND_MAX_WORKERS = 4
+
+
+class AnalyzerRegistration(NamedTuple):
+    """
+    Holds everything the analysis engine needs to know about a registered
+    analyzer.
+    """
+
+    name: str
+    batch_function: Callable[[Sequence[str]], Sequence[dict]]
+    roles: tuple
+    cost: str
+    enabled_by_default: bool = True
+
+
+_REGISTERED_ANALYZERS = {}
+
+_background_executor = None
+_background_executor_pid = None
+_background_executor_lock = threading.Lock()
+
+
+def register_analyzer(
+    name,
+    batch_function,
+    roles=ALL_ROLES,
+    cost=CHEAP_COST,
+    enabled_by_default=True,
+):
+    """
+    Registers a new analyzer to be used in all monitored classes.
+
+    Args:
+        name: The analysis category name under which the analyzer's fields
+            will be logged. Can be used in the "analysis" spec to turn the
+            analyzer on or off, just like the built-in categories.
+        batch_function: A function getting a list of texts and returning a
+            list of the same length with a dict of features for each text.
+        roles: The text roles the analyzer should run on. Any of
+            PROMPT_ROLE, ANSWER_ROLE and LAST_USER_MESSAGE_ROLE.
+        cost: Either CHEAP_COST (run inline) or EXPENSIVE_COST (run on a
+            background thread).
+        enabled_by_default: Whether to run the analyzer when the "analysis"
+            spec doesn't mention it.
+    """
+    if name in RESERVED_ANALYZER_NAMES:
+        raise InvalidAnalyzerException(
+            f"'{name}' is a built-in analysis name and can't be registered"
+        )
+
+    roles = tuple(roles)
+    unknown_roles = set(roles) - set(ALL_ROLES)
+    if not roles or unknown_roles:
+        raise InvalidAnalyzerException(
+            f"Analyzer roles must be a non-empty subset of {ALL_ROLES}, got"
+            f" {roles}"
+        )
+
+    if cost not in COST_CLASSES:
+        raise InvalidAnalyzerException(
+            f"Analyzer cost must be one of {COST_CLASSES}, got {cost}"
+        )
+
+    _REGISTERED_ANALYZERS[name] = AnalyzerRegistration(
+        name, batch_function, roles, cost, enabled_by_default
+    )
+
+
+def unregister_analyzer(name):
+    """
+    Removes a previously registered analyzer. Does nothing if no analyzer is
+    registered under the given name.
+    """
+    _REGISTERED_ANALYZERS.pop(name, None)
+
+
+def get_registered_analyzers():
+    """
+    Returns a tuple of all currently registered analyzers.
+    """
+    return tuple(_REGISTERED_ANALYZERS.values())
+
+
+def _get_background_executor():
+    global _background_executor, _background_executor_pid
+    # Threads don't survive forking (e.g., in pre-forking web servers), so a
+    # forked process gets its own executor instead of one whose workers
+    # only exist in the parent.
+    if _background_executor_pid != os.getpid():
+        with _background_executor_lock:
+            if _background_executor_pid != os.getpid():
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=_BACKGROUND_MAX_WORKERS,
+                    thread_name_prefix="mona-analysis",
+                )
+                _background_executor_pid = os.getpid()
+    return _background_executor
+
+
+def _run_analyzer(registration, texts_by_role):
+    """
+    Runs the given analyzer's batch function once on the texts of all of its
+    roles and splits the results back to per-role analysis fields.
+
+    Prompt and answer fields hold a tuple with a value for each text, while
+    last user message fields hold a single value, similarly to the built-in
+    analyses.
+    """
+    roles = tuple(
+        role for role in registration.roles if texts_by_role.get(role)
+    )
+    texts = [text for role in roles for text in texts_by_role[role]]
+    if not texts:
+        return {}
+
+    features = registration.batch_function(texts)
+    if len(features) != len(texts):
+        raise InvalidAnalyzerException(
+            f"Analyzer '{registration.name}' returned {len(features)} results"
+            f" for {len(texts)} texts"
+        )
+
+    ret = {}
+    offset = 0
+    for role in roles:
+        next_offset = offset + len(texts_by_role[role])
+        role_features = features[offset:next_offset]
+        offset = next_offset
+        # Keep the order in which features were first returned.
+        feature_names = dict.fromkeys(
+            name for text_features in role_features for name in text_features
+        )
+        for feature_name in feature_names:
+            values = tuple(
+                text_features.get(feature_name)
+                for text_features in role_features
+            )
+            ret[f"{role}_{feature_name}"] = (
+                values[0] if role == LAST_USER_MESSAGE_ROLE else values
+            )
+
+    return ret
+
+
+def start_analyzers(registrations, texts_by_role):
+    """
+    Starts running the given analyzers on the given texts.
+
+    Expensive analyzers are immediately submitted to a thread pool.
+    Returns a function that runs the cheap analyzers inline, waits for the
+    expensive ones and returns a dict mapping each analyzer name to its
+    analysis fields.
+    """
+    futures = {
+        registration.name: _get_background_executor().submit(
+            _run_analyzer, registration, texts_by_role
+        )
+        for registration in registrations
+        if registration.cost == EXPENSIVE_COST
+    }
+
+    def collect():
+        return {
+            registration.name: futures[registration.name].result()
+            if registration.name in futures
+            else _run_analyzer(registration, texts_by_role)
+            for registration in registrations
+        }
+
+    return collect
@@ -0,0 +1,162 @@
+"""
+Analysis of how well the requested "max_tokens" and "n" params fit the
+answers actually received, per model and prompt template.
+
+Over-large "max_tokens" and "n" values count against tokens-per-minute
+rate limits and slow down request queues without any benefit. For each
+model and template pair, running stats of the answers' token counts, their
+truncation rate (answers with a "length" finish reason) and the number of
+distinct answers per call are kept, and caps are suggested from them.
+Distributions are kept in fixed-size quantile sketches, so no per-call data
+is stored.
+"""
+import math
+import threading
+
+from ..util.quantiles_util import QuantileSketch
+
+DEFAULT_SUGGESTION_QUANTILE = 0.99
+DEFAULT_MIN_SAMPLES = 100
+STATS_QUANTILES = (0.5, 0.9, 0.99)
+
+TRUNCATED_FINISH_REASON = "length"
+
+
+class RequestParamsStats:
+    """
+    Running stats of the answers received for calls with the same model and
+    prompt template.
+    """
+
+    def __init__(
+        self,
+        suggestion_quantile=DEFAULT_SUGGESTION_QUANTILE,
+        min_samples=DEFAULT_MIN_SAMPLES,
+    ):
+        self._suggestion_quantile = suggestion_quantile
+        self._min_samples = min_samples
+        self.calls_count = 0
+        self.truncated_answers_count = 0
+        self.answer_token_counts = QuantileSketch()
+        self.max_tokens = QuantileSketch()
+        self.distinct_answer_counts = QuantileSketch()
+        self.n = QuantileSketch()
+
+    def add(self, max_tokens, n, answer_token_counts, finish_reasons, texts):
+        """
+        Adds a call's requested params and answers to the stats.
+        """
+        self.calls_count += 1
+        if max_tokens is not None:
+            self.max_tokens.add(max_tokens)
+        self.n.add(n)
+        for token_count in answer_token_counts:
+            self.answer_token_counts.add(token_count)
+        self.truncated_answers_count += sum(
+            1 for x in finish_reasons if x == TRUNCATED_FINISH_REASON
+        )
+        self.distinct_answer_counts.add(len(set(texts)))
+
+    def get_truncated_answers_ratio(self):
+        return (
+            self.truncated_answers_count / self.answer_token_counts.count
+            if self.answer_token_counts.count
+            else 0.0
+        )
+
+    def get_suggested_max_tokens(self):
+        """
+        Returns a "max_tokens" value that the suggestion quantile of answers
+        fit in, or None if there aren't enough samples yet, or if more
+        answers than that are truncated (in which case the answers' actual
+        lengths are unknown).
+        """
+        if (
+            self.answer_token_counts.count < self._min_samples
+            or self.get_truncated_answers_ratio()
+            > 1 - self._suggestion_quantile
+        ):
+            return None
+        return math.ceil(
+            self.answer_token_counts.get_quantile(self._suggestion_quantile)
+        )
+
+    def get_suggested_n(self):
+        """
+        Returns an "n" value that covers the number of distinct answers per
+        call in the suggestion quantile of calls, or None if there aren't
+        enough samples yet.
+        """
+        if self.calls_count < self._min_samples:
+            return None
+        return math.ceil(
+            self.distinct_answer_counts.get_quantile(
+                self._suggestion_quantile
+            )
+        )
+
+    def to_dict(self):
+        """
+        Returns a dict summarizing the stats and the suggested caps.
+        """
+
+        def get_quantiles(sketch):
+            return dict(
+                zip(STATS_QUANTILES, sketch.get_quantiles(STATS_QUANTILES))
+            )
+
+        return {
+            "calls_count": self.calls_count,
+            "answers_count": self.answer_token_counts.count,
+            "truncated_answers_ratio": self.get_truncated_answers_ratio(),
+            "answer_token_count_quantiles": get_quantiles(
+                self.answer_token_counts
+            ),
+            "max_tokens_quantiles": get_quantiles(self.max_tokens),
+            "distinct_answer_count_quantiles": get_quantiles(
+                self.distinct_answer_counts
+            ),
+            "n_quantiles": get_quantiles(self.n),
+            "suggested_max_tokens": self.get_suggested_max_tokens(),
+            "suggested_n": self.get_suggested_n(),
+        }
+
+
+class RequestEfficiencyTracker:
+    """
+    A thread-safe collection of RequestParamsStats, one for each model and
+    prompt template pair.
+    """
+
+    def __init__(
+        self,
+        suggestion_quantile=DEFAULT_SUGGESTION_QUANTILE,
+        min_samples=DEFAULT_MIN_SAMPLES,
+    ):
+        self._suggestion_quantile = suggestion_quantile
+        self._min_samples = min_samples
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, *args):
+        """
+        Adds a call to the stats of the given (model, template id) key (see
+        RequestParamsStats.add for the rest of the arguments), and returns
+        the suggested "max_tokens" and "n" caps for the key.
+        """
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = RequestParamsStats(
+                    self._suggestion_quantile, self._min_samples
+                )
+            stats = self._stats[key]
+            stats.add(*args)
+            return stats.get_suggested_max_tokens(), stats.get_suggested_n()
+
+    def get_stats(self):
+        """
+        Returns a dict mapping each (model, template id) pair to a dict
+        summarizing its stats (see RequestParamsStats.to_dict).
+        """
+        with self._lock:
+            return {key: x.to_dict() for key, x in self._stats.items()}
@@ -0,0 +1,134 @@
+"""
+Support for analyzing prompts made of registered prompt templates, so that
+the static parts of each template are analyzed only once.
+
+Templates are given as texts with str.format-style placeholders (e.g.,
+"Summarize this for {audience}: {text}"). When a prompt matches its call's
+template, it is marked as a filled template, and analyses that are
+decomposable use the template's precomputed stats along with the stats of
+the filled-in values alone. Results are identical to analyzing the full
+text.
+
+Currently only the textual analysis is decomposable. Privacy matches (e.g.,
+phone numbers) and profanity predictions may span both static and filled-in
+parts of the text, so these analyses still run on the full text.
+
+Prompts are matched by finding the template's static parts in order (the
+first and last anchored to the text's start and end, and each one in
+between at its first occurrence), in linear time, so that long prompts
+that don't match are rejected quickly. Prompts that only match with a
+different split (which is only possible when a placeholder's value
+contains the static text that follows it) are analyzed as full texts.
+"""
+
+from string import Formatter
+
+from .textual import SegmentedTextualAnalyzer, TextSegmentStats
+
+DEFAULT_TEMPLATE_ID_KEY = "template_id"
+
+
+class PromptTemplate:
+    """
+    A registered prompt template, holding the precomputed stats of its
+    static parts.
+    """
+
+    def __init__(self, template_text):
+        static_parts = [""]
+        field_names = []
+        for literal_text, field_name, _, _ in Formatter().parse(template_text):
+            static_parts[-1] += literal_text
+            if field_name is not None:
+                field_names.append(field_name)
+                static_parts.append("")
+
+        self._field_names = tuple(field_names)
+        self._static_parts = tuple(static_parts)
+        self._static_parts_stats = tuple(
+            TextSegmentStats(x) for x in static_parts
+        )
+        self._static_inner_words = frozenset().union(
+            *(x.inner_words for x in self._static_parts_stats)
+        )
+
+    def match(self, text):
+        """
+        Returns a FilledTemplateText for the given text if it matches the
+        template, or None otherwise.
+        """
+        prefix, suffix = self._static_parts[0], self._static_parts[-1]
+        if not self._field_names:
+            if text != prefix:
+                return None
+            return FilledTemplateText(text, self, ())
+        end = len(text) - len(suffix)
+        if (
+            end < len(prefix)
+            or not text.startswith(prefix)
+            or not text.endswith(suffix)
+        ):
+            return None
+
+        values = []
+        position = len(prefix)
+        for separator in self._static_parts[1:-1]:
+            index = text.find(separator, position, end)
+            if index == -1:
+                return None
+            values.append(text[position:index])
+            position = index + len(separator)
+        values.append(text[position:end])
+
+        # A placeholder that appears more than once must hold the same
+        # value in all places.
+        values_by_name = {}
+        for field_name, value in zip(self._field_names, values):
+            if values_by_name.setdefault(field_name, value) != value:
+                return None
+        return FilledTemplateText(text, self, tuple(values))
+
+    def get_textual_analyzer(self, text, values):
+        """
+        Returns a TextualAnalyzer for the given full text, which is this
+        template filled with the given values, analyzing only the values.
+        """
+        values_stats = tuple(TextSegmentStats(x) for x in values)
+        segments_stats = [self._static_parts_stats[0]]
+        for value_stats, static_stats in zip(
+            values_stats, self._static_parts_stats[1:]
+        ):
+            segments_stats += [value_stats, static_stats]
+
+        return SegmentedTextualAnalyzer(
+            text,
+            segments_stats,
+            (self._static_inner_words, *(x.inner_words for x in values_stats)),
+        )
+
+
+class FilledTemplateText(str):
+    """
+    A prompt text that was matched to a prompt template. Behaves just like
+    the original str for all other purposes.
+    """
+
+    def __new__(cls, text, template, values):
+        instance = super().__new__(cls, text)
+        instance._template = template
+        instance._values = values
+        return instance
+
+    def get_textual_analyzer(self):
+        return self._template.get_textual_analyzer(self, self._values)
+
+
+def get_prompt_templates(templates_by_id):
+    """
+    Returns a dict mapping each of the given template ids to a
+    PromptTemplate for the matching template text.
+    """
+    return {
+        template_id: PromptTemplate(template_text)
+        for template_id, template_text in templates_by_id.items()
+    }
@@ -120,20 +120,140 @@ class TextualAnalyzer:
         Returns the number of the words in the text that do not appear in the
         given other texts.
         """
+        others = tuple(others)
         others_words_set = set().union(
-            *tuple(other._splitted_text for other in others)
+            *tuple(
+                other._splitted_text
+                for other in others
+                if not isinstance(other, SegmentedTextualAnalyzer)
+            )
+        )
+        # Texts of prompt templates are checked using their segments' words,
+        # without splitting the full text.
+        segmented_others = tuple(
+            other
+            for other in others
+            if isinstance(other, SegmentedTextualAnalyzer)
         )
         return len(
             [
                 word
                 for word in self._splitted_text
                 if word not in others_words_set
+                and not any(
+                    other._contains_word(word) for other in segmented_others
+                )
             ]
         )
 
 
+class TextSegmentStats:
+    """
+    Textual stats of a text segment that allow calculating the exact stats
+    of a concatenation of segments (e.g., a prompt template's static parts
+    and the values filled into it) without analyzing the full text again.
+
+    Words that touch the edges of the segment (with no whitespace between
+    them and the edge) are kept aside as "fragments", since they may be
+    joined with the fragments of neighbouring segments into a single word.
+    """
+
+    def __init__(self, text):
+        self.length = len(text)
+        words = text.split()
+        self.is_single_fragment = bool(text) and words == [text]
+        self.leading_fragment = (
+            words[0] if text and not text[0].isspace() else None
+        )
+        self.trailing_fragment = (
+            words[-1] if text and not text[-1].isspace() else None
+        )
+        inner_start = 1 if self.leading_fragment is not None else 0
+        inner_end = len(words) - (self.trailing_fragment is not None)
+        inner_words = words[inner_start:inner_end]
+        self.inner_word_count = len(inner_words)
+        self.inner_preposition_count = sum(
+            1 for x in inner_words if x in PREPOSITIONS
+        )
+        self.inner_words = frozenset(inner_words)
+
+
+class SegmentedTextualAnalyzer(TextualAnalyzer):
+    """
+    A TextualAnalyzer for a text given as a sequence of TextSegmentStats.
+    The results are identical to those of a TextualAnalyzer of the full
+    text.
+
+    inner_words_sets should hold the inner words of all segments (this
+    allows passing precomputed unions of the inner words of several
+    segments).
+    """
+
+    def __init__(self, text, segments_stats, inner_words_sets):
+        self._text = text
+        self._length = sum(x.length for x in segments_stats)
+        self._word_count = sum(x.inner_word_count for x in segments_stats)
+        self._preposition_count = sum(
+            x.inner_preposition_count for x in segments_stats
+        )
+        self._inner_words_sets = tuple(inner_words_sets)
+        # Words made of segments' fragments.
+        self._fragment_words = set()
+        self._splitted_text_cache = None
+
+        def add_word(word):
+            self._word_count += 1
+            self._preposition_count += word in PREPOSITIONS
+            self._fragment_words.add(word)
+
+        open_word = None
+        for stats in segments_stats:
+            if not stats.length:
+                continue
+            if stats.is_single_fragment:
+                open_word = (open_word or "") + stats.leading_fragment
+                continue
+            if stats.leading_fragment is not None:
+                add_word((open_word or "") + stats.leading_fragment)
+            elif open_word is not None:
+                add_word(open_word)
+            open_word = stats.trailing_fragment
+
+        if open_word is not None:
+            add_word(open_word)
+
+    @property
+    def _splitted_text(self):
+        # Only needed when comparing this text's words to other texts.
+        if self._splitted_text_cache is None:
+            self._splitted_text_cache = self._text.split()
+        return self._splitted_text_cache
+
+    def get_length(self):
+        return self._length
+
+    def get_word_count(self):
+        return self._word_count
+
+    def get_preposition_count(self):
+        return self._preposition_count
+
+    def _contains_word(self, word):
+        return word in self._fragment_words or any(
+            word in x for x in self._inner_words_sets
+        )
+
+
 def get_textual_analyzers(texts):
     """
     Returns a tuple of TextualAnalyzers for all the given texts.
+
+    Texts that are filled prompt templates (see analysis/templates.py) are
+    analyzed using the template's precomputed stats.
     """
-    return tuple(TextualAnalyzer(text) for text in texts)
+    return tuple(
+        text.get_textual_analyzer()
+        if hasattr(text, "get_textual_analyzer")
+        else TextualAnalyzer(text)
+        for text in texts
+    )
@@ -5,8 +5,14 @@ from copy import deepcopy
 from functools import wraps
 
 from ..util.oop_util import create_combined_object
+from ..analysis.keywords import get_keyword_analyzers
 from ..analysis.privacy import get_privacy_analyzers
 from ..analysis.profanity import get_profanity_prob, get_has_profanity
+from ..analysis.registry import (
+    ANSWER_ROLE,
+    LAST_USER_MESSAGE_ROLE,
+    PROMPT_ROLE,
+)
 from ..analysis.textual import get_textual_analyzers
 from .endpoint_wrapping import OpenAIEndpointWrappingLogic
 
@@ -23,13 +29,16 @@ def _get_prompt_texts(request):
     return tuple(message["content"] for message in request["messages"])
 
 
+def _get_last_user_message(request):
+    last_message = request["messages"][-1]
+    return last_message["content"] if last_message["role"] == "user" else None
+
+
 def _get_texts(func):
     def wrapper(self, input, response):
         return func(
             self,
-            input["messages"][-1]["content"]
-            if input["messages"][-1]["role"] == "user"
-            else None,
+            _get_last_user_message(input),
             _get_prompt_texts(input),
             _get_choices_texts(response),
         )
@@ -89,18 +98,18 @@ class ChatCompletionWrapping(OpenAIEndpointWrappingLogic):
         combined_messages = create_combined_object(messages_privacy_analyzers)
         combined_answers = create_combined_object(answers_privacy_analyzers)
         ret = {
-            "total_prompt_phone_number_count": sum(
+            "total_prompt_phone_number_count": lambda: sum(
                 combined_messages.get_phone_numbers_count()
             ),
-            "answer_unknown_phone_number_count": (
+            "answer_unknown_phone_number_count": lambda: (
                 combined_answers.get_previously_unseen_phone_numbers_count(
                     messages_privacy_analyzers
                 )
             ),
-            "total_prompt_email_count": sum(
+            "total_prompt_email_count": lambda: sum(
                 combined_messages.get_emails_count()
             ),
-            "answer_unknown_email_count": (
+            "answer_unknown_email_count": lambda: (
                 combined_answers.get_previously_unseen_emails_count(
                     messages_privacy_analyzers
                 )
@@ -109,16 +118,61 @@ class ChatCompletionWrapping(OpenAIEndpointWrappingLogic):
         if last_user_message_analyzer is not None:
             ret.update(
                 {
-                    "last_user_message_phone_number_count": (
+                    "last_user_message_phone_number_count": lambda: (
                         last_user_message_analyzer.get_phone_numbers_count()
                     ),
-                    "last_user_message_emails_count": (
+                    "last_user_message_emails_count": lambda: (
                         last_user_message_analyzer.get_emails_count()
                     ),
                 }
             )
         return ret
 
+    @_get_texts
+    def _get_full_keywords_analysis(
+        self, last_user_message, messages, answers
+    ):
+        messages_keyword_analyzers = get_keyword_analyzers(
+            messages, self._keyword_matcher
+        )
+        answers_keyword_analyzers = get_keyword_analyzers(
+            answers, self._keyword_matcher
+        )
+        last_user_message_analyzer = (
+            get_keyword_analyzers(
+                (last_user_message,), self._keyword_matcher
+            )[0]
+            if last_user_message is not None
+            else None
+        )
+        combined_messages = create_combined_object(messages_keyword_analyzers)
+        combined_answers = create_combined_object(answers_keyword_analyzers)
+
+        def get_category_fields(category):
+            ret = {
+                f"total_prompt_{category}_keyword_count": lambda: sum(
+                    combined_messages.get_keywords_count(category)
+                ),
+                f"answer_{category}_keyword_count": lambda: (
+                    combined_answers.get_keywords_count(category)
+                ),
+                f"answer_unknown_{category}_keyword_count": lambda: (
+                    combined_answers.get_previously_unseen_keywords_count(
+                        category, messages_keyword_analyzers
+                    )
+                ),
+            }
+            if last_user_message_analyzer is not None:
+                ret[f"last_user_message_{category}_keyword_count"] = lambda: (
+                    last_user_message_analyzer.get_keywords_count(category)
+                )
+            return ret
+
+        ret = {}
+        for category in self._keyword_matcher.categories:
+            ret.update(get_category_fields(category))
+        return ret
+
     @_get_texts
     @_get_analyzers(get_textual_analyzers)
     def _get_full_textual_analysis(
@@ -191,21 +245,33 @@ class ChatCompletionWrapping(OpenAIEndpointWrappingLogic):
         self, last_user_message, messages, answers
     ):
         ret = {
-            "prompt_profanity_prob": get_profanity_prob(messages),
-            "prompt_has_profanity": get_has_profanity(messages),
-            "answer_profanity_prob": get_profanity_prob(answers),
-            "answer_has_profanity": get_has_profanity(answers),
+            "prompt_profanity_prob": lambda: get_profanity_prob(
+                messages, self._get_profanity_model()
+            ),
+            "prompt_has_profanity": lambda: get_has_profanity(
+                messages, self._get_profanity_model()
+            ),
+            "answer_profanity_prob": lambda: get_profanity_prob(
+                answers, self._get_profanity_model()
+            ),
+            "answer_has_profanity": lambda: get_has_profanity(
+                answers, self._get_profanity_model()
+            ),
         }
 
         if last_user_message is not None:
             ret.update(
                 {
-                    "last_user_message_profanity_prob": get_profanity_prob(
-                        (last_user_message,)
-                    )[0],
-                    "last_user_message_has_profanity": get_has_profanity(
-                        (last_user_message,)
-                    )[0],
+                    "last_user_message_profanity_prob": lambda: (
+                        get_profanity_prob(
+                            (last_user_message,), self._get_profanity_model()
+                        )[0]
+                    ),
+                    "last_user_message_has_profanity": lambda: (
+                        get_has_profanity(
+                            (last_user_message,), self._get_profanity_model()
+                        )[0]
+                    ),
                 }
             )
 
@@ -222,3 +288,31 @@ class ChatCompletionWrapping(OpenAIEndpointWrappingLogic):
 
     def get_all_response_texts(self, response):
         return _get_choices_texts(response)
+
+    def replace_prompt_texts(self, request, replace_function):
+        return {
+            **request,
+            "messages": [
+                {**message, "content": replace_function(message["content"])}
+                for message in request["messages"]
+            ],
+        }
+
+    def get_cacheable_prompts(self, request):
+        # The whole conversation is a single prompt, cached by its prefix.
+        return (
+            "".join(
+                f"{message['role']}\n{message['content'] or ''}\n"
+                for message in request["messages"]
+            ),
+        )
+
+    def get_texts_by_role(self, input, response):
+        last_user_message = _get_last_user_message(input)
+        return {
+            PROMPT_ROLE: _get_prompt_texts(input),
+            ANSWER_ROLE: _get_choices_texts(response),
+            LAST_USER_MESSAGE_ROLE: (last_user_message,)
+            if last_user_message is not None
+            else (),
+        }
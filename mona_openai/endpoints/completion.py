@@ -4,8 +4,10 @@ The Mona wrapping code for OpenAI's Completion API.
 from copy import deepcopy
 from functools import wraps
 
+from ..analysis.keywords import get_keyword_analyzers
 from ..analysis.privacy import get_privacy_analyzers
 from ..analysis.profanity import get_has_profanity, get_profanity_prob
+from ..analysis.registry import ANSWER_ROLE, PROMPT_ROLE
 from ..analysis.textual import get_textual_analyzers
 from ..util.oop_util import create_combined_object
 from .endpoint_wrapping import OpenAIEndpointWrappingLogic
@@ -13,9 +15,24 @@ from .endpoint_wrapping import OpenAIEndpointWrappingLogic
 COMPLETION_CLASS_NAME = "Completion"
 
 
+def _is_token_prompt(prompt):
+    return not isinstance(prompt, str)
+
+
+def _is_single_prompt(prompts):
+    # A single prompt is either a string or a list of token ids.
+    return isinstance(prompts, str) or (
+        len(prompts) > 0 and isinstance(prompts[0], int)
+    )
+
+
 def _get_prompts(request):
+    """
+    Returns a tuple of all prompts in the given request. Each prompt is
+    either a string or a list of token ids.
+    """
     prompts = request.get("prompt", ())
-    return (prompts,) if isinstance(prompts, str) else prompts
+    return (prompts,) if _is_single_prompt(prompts) else tuple(prompts)
 
 
 def _get_choices_texts(response):
@@ -72,22 +89,53 @@ class CompletionWrapping(OpenAIEndpointWrappingLogic):
         combined_prompts = create_combined_object(prompts_privacy_analyzers)
         combined_answers = create_combined_object(answers_privacy_analyzers)
         return {
-            "prompt_phone_number_count": (
+            "prompt_phone_number_count": lambda: (
                 combined_prompts.get_phone_numbers_count()
             ),
-            "answer_unknown_phone_number_count": (
+            "answer_unknown_phone_number_count": lambda: (
                 combined_answers.get_previously_unseen_phone_numbers_count(
                     prompts_privacy_analyzers
                 )
             ),
-            "prompt_email_count": combined_prompts.get_emails_count(),
-            "answer_unknown_email_count": (
+            "prompt_email_count": lambda: combined_prompts.get_emails_count(),
+            "answer_unknown_email_count": lambda: (
                 combined_answers.get_previously_unseen_emails_count(
                     prompts_privacy_analyzers
                 )
             ),
         }
 
+    @_get_texts
+    def _get_full_keywords_analysis(self, prompts, answers):
+        prompts_keyword_analyzers = get_keyword_analyzers(
+            prompts, self._keyword_matcher
+        )
+        answers_keyword_analyzers = get_keyword_analyzers(
+            answers, self._keyword_matcher
+        )
+        combined_prompts = create_combined_object(prompts_keyword_analyzers)
+        combined_answers = create_combined_object(answers_keyword_analyzers)
+
+        def get_category_fields(category):
+            return {
+                f"prompt_{category}_keyword_count": lambda: (
+                    combined_prompts.get_keywords_count(category)
+                ),
+                f"answer_{category}_keyword_count": lambda: (
+                    combined_answers.get_keywords_count(category)
+                ),
+                f"answer_unknown_{category}_keyword_count": lambda: (
+                    combined_answers.get_previously_unseen_keywords_count(
+                        category, prompts_keyword_analyzers
+                    )
+                ),
+            }
+
+        ret = {}
+        for category in self._keyword_matcher.categories:
+            ret.update(get_category_fields(category))
+        return ret
+
     @_get_texts
     @_get_analyzers(get_textual_analyzers)
     def _get_full_textual_analysis(
@@ -131,10 +179,18 @@ class CompletionWrapping(OpenAIEndpointWrappingLogic):
     @_get_texts
     def _get_full_profainty_analysis(self, prompts, answers):
         return {
-            "prompt_profanity_prob": get_profanity_prob(prompts),
-            "prompt_has_profanity": get_has_profanity(prompts),
-            "answer_profanity_prob": get_profanity_prob(answers),
-            "answer_has_profanity": get_has_profanity(answers),
+            "prompt_profanity_prob": lambda: get_profanity_prob(
+                prompts, self._get_profanity_model()
+            ),
+            "prompt_has_profanity": lambda: get_has_profanity(
+                prompts, self._get_profanity_model()
+            ),
+            "answer_profanity_prob": lambda: get_profanity_prob(
+                answers, self._get_profanity_model()
+            ),
+            "answer_has_profanity": lambda: get_has_profanity(
+                answers, self._get_profanity_model()
+            ),
         }
 
     def get_stream_delta_text_from_choice(self, choice):
@@ -148,3 +204,26 @@ class CompletionWrapping(OpenAIEndpointWrappingLogic):
 
     def get_all_response_texts(self, response):
         return _get_choices_texts(response)
+
+    def replace_prompt_texts(self, request, replace_function):
+        prompts = request.get("prompt")
+        if prompts is None:
+            return request
+        return {
+            **request,
+            "prompt": replace_function(prompts)
+            if _is_single_prompt(prompts)
+            else [replace_function(x) for x in prompts],
+        }
+
+    def get_prompt_token_arrays(self, request):
+        return tuple(x for x in _get_prompts(request) if _is_token_prompt(x))
+
+    def get_cacheable_prompts(self, request):
+        return _get_prompts(request)
+
+    def get_texts_by_role(self, input, response):
+        return {
+            PROMPT_ROLE: tuple(_get_prompts(input)),
+            ANSWER_ROLE: _get_choices_texts(response),
+        }
@@ -2,8 +2,75 @@
 A module for general logic for wrapping OpenAI endpoints.
 """
 import abc
+from types import MappingProxyType
+
+from ..analysis.call_metrics import CallMetricsTracker, get_call_metrics
+from ..analysis.degeneration import get_degeneration_features
+from ..analysis.keywords import get_keyword_matcher
+from ..analysis.near_duplicate import (
+    DEFAULT_MAX_AGE_SECONDS,
+    DEFAULT_MAX_SIZE,
+    NearDuplicateIndex,
+    get_simhash,
+)
+from ..analysis import prefix_cache
+from ..analysis.overlap import (
+    NGRAM_NAMES,
+    NGRAM_SIZES,
+    get_overlap_analyzers,
+    get_prompt_sketch,
+)
+from ..analysis.profanity import get_specs_profanity_model
+from ..analysis.request_efficiency import (
+    DEFAULT_MIN_SAMPLES,
+    DEFAULT_SUGGESTION_QUANTILE,
+    RequestEfficiencyTracker,
+)
+from ..analysis.templates import (
+    DEFAULT_TEMPLATE_ID_KEY,
+    get_prompt_templates,
+)
+from ..analysis.registry import (
+    ANSWER_ROLE,
+    PROMPT_ROLE,
+    get_registered_analyzers,
+    register_analyzer,
+    start_analyzers,
+)
+from ..util.openai_util import get_model_param
+from ..util.tokens_util import detokenize, tokenize
 from ..util.validation_util import validate_openai_class
 
+EMPTY_DICT = MappingProxyType({})
+
+# Analyses that only run when explicitly turned on in the "analysis" spec.
+OPT_IN_ANALYSES = (
+    "overlap",
+    "near_duplicate",
+    "prefix_cache",
+    "request_efficiency",
+)
+
+# Built-in per-text analyses are registered like any custom analyzer.
+register_analyzer(
+    "degeneration",
+    get_degeneration_features,
+    roles=(ANSWER_ROLE,),
+    enabled_by_default=False,
+)
+
+
+def is_analysis_enabled(specs, analysis_name, default=None):
+    """
+    Returns whether the given analysis is enabled by the given specs. By
+    default, all analyses are enabled except for the ones in
+    OPT_IN_ANALYSES.
+    """
+    if default is None:
+        default = analysis_name not in OPT_IN_ANALYSES
+    # The spec value is either a boolean or a list of field names.
+    return bool(specs.get("analysis", {}).get(analysis_name, default))
+
 
 class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
     """
@@ -21,7 +88,32 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
             "privacy": self._get_full_privacy_analysis,
             "textual": self._get_full_textual_analysis,
             "profanity": self._get_full_profainty_analysis,
+            "overlap": self._get_full_overlap_analysis,
+            "near_duplicate": self._get_full_near_duplicate_analysis,
         }
+        # The keywords analysis runs whenever keywords are given.
+        self._keyword_matcher = None
+        if specs.get("keywords"):
+            self._keyword_matcher = get_keyword_matcher(specs["keywords"])
+            self._analysis_functions[
+                "keywords"
+            ] = self._get_full_keywords_analysis
+        self._prompt_templates = get_prompt_templates(
+            specs.get("prompt_templates", {})
+        )
+        # Recent answers' fingerprints, kept separately for each model.
+        self._near_duplicate_indices = {}
+        # Recent prompts' prefix hashes, kept separately for each model.
+        self._prefix_indices = {}
+        self._request_efficiency_tracker = RequestEfficiencyTracker(
+            suggestion_quantile=specs.get(
+                "request_efficiency_quantile", DEFAULT_SUGGESTION_QUANTILE
+            ),
+            min_samples=specs.get(
+                "request_efficiency_min_samples", DEFAULT_MIN_SAMPLES
+            ),
+        )
+        self._call_metrics_tracker = CallMetricsTracker()
 
     def wrap_class(self, openai_class):
         """
@@ -34,8 +126,12 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
             # TODO(itai): Have a smarter way to "import" all the methods to
             #   this class instead of just copying them.
             @classmethod
-            def _get_full_analysis(cls, input, response):
-                return self.get_full_analysis(input, response)
+            def _get_full_analysis(
+                cls, input, response, additional_data, precomputed_analysis
+            ):
+                return self.get_full_analysis(
+                    input, response, additional_data, precomputed_analysis
+                )
 
             @classmethod
             def _get_clean_message(cls, message):
@@ -57,6 +153,22 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
             def _get_all_response_texts(cls, response):
                 return self.get_all_response_texts(response)
 
+            @classmethod
+            def get_request_efficiency_stats(cls):
+                return self.get_request_efficiency_stats()
+
+            @classmethod
+            def _add_call_metrics(
+                cls, input, response, latency, stream_start_latency
+            ):
+                return self.add_call_metrics(
+                    input, response, latency, stream_start_latency
+                )
+
+            @classmethod
+            def get_call_metrics_tracker(cls):
+                return self.get_call_metrics_tracker()
+
         return type(
             f"Monitored{self._get_endpoint_name()}", (WrapperClass,), {}
         )
@@ -77,27 +189,195 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
         """
         pass
 
-    def get_full_analysis(self, input, response):
+    def _is_analysis_enabled(self, analysis_name, default=None):
+        return is_analysis_enabled(self._specs, analysis_name, default)
+
+    def _get_selected_fields(
+        self, analysis_name, fields, precomputed_fields=EMPTY_DICT
+    ):
+        """
+        Returns the given analysis fields that are selected in the
+        "analysis" spec (all fields, unless a list of field names is given
+        for the analysis), calling the values given as functions. Fields
+        given in precomputed_fields are skipped.
+        """
+        selection = self._specs.get("analysis", {}).get(analysis_name, True)
+        return {
+            name: value() if callable(value) else value
+            for name, value in fields.items()
+            if (isinstance(selection, bool) or name in selection)
+            and name not in precomputed_fields
+        }
+
+    def _get_input_with_filled_templates(self, input, additional_data):
+        """
+        Returns the given input with its prompt texts that match the call's
+        prompt template (according to the template id in the given
+        additional data) marked as filled templates.
+        """
+        if not self._prompt_templates or not additional_data:
+            return input
+
+        template = self._prompt_templates.get(
+            additional_data.get(
+                self._specs.get("template_id_key", DEFAULT_TEMPLATE_ID_KEY)
+            )
+        )
+        if template is None:
+            return input
+
+        return self.replace_prompt_texts(
+            input,
+            lambda text: (isinstance(text, str) and template.match(text))
+            or text,
+        )
+
+    def _get_input_with_detokenized_prompts(self, input):
+        """
+        Returns the given input with its token-id prompts replaced by their
+        (cached) decoded texts.
+        """
+        model = get_model_param(input)
+        return self.replace_prompt_texts(
+            input,
+            lambda prompt: prompt
+            if isinstance(prompt, str)
+            else detokenize(model, prompt),
+        )
+
+    def _get_tokens_analysis(self, token_prompts):
+        """
+        Returns a dict holding the "tokens" analysis for the given
+        token-id prompts (if enabled), calculated from the arrays alone.
+        """
+        if not self._is_analysis_enabled("tokens"):
+            return {}
+        return {
+            "tokens": self._get_selected_fields(
+                "tokens",
+                {"prompt_token_count": tuple(len(x) for x in token_prompts)},
+            )
+        }
+
+    def get_full_analysis(
+        self,
+        input,
+        response,
+        additional_data=None,
+        precomputed_analysis=None,
+    ):
         """
         Returns a dict mapping each analysis type to all related analysis
         fields for the given prompt and answers according to the given
         specs (if no "analysis" spec is given - return result for all
         analysis types).
 
-        TODO(itai): Consider propogating the specs to allow the user to
-            choose specific anlyses to be made from within each analysis
-            category.
+        Prompts made of a registered prompt template (see
+        analysis/templates.py) are analyzed using the template's
+        precomputed stats where possible.
+
+        Registered analyzers (see analysis/registry.py) are run as well,
+        with all their texts batched together. Expensive ones are started
+        first so they run in the background while the rest of the analysis
+        is calculated.
+
+        The "analysis" spec may also hold a list of field names for an
+        analysis type, in which case only these fields are calculated and
+        returned.
+
+        Prompts given as token ids are only counted ("tokens" analysis).
+        Text analyses run on such calls only when the
+        "analyze_token_prompts" spec is set, on the decoded prompts. The
+        "prefix_cache" analysis works on tokens, so it always runs on the
+        original prompts, and so does the "request_efficiency" analysis,
+        which doesn't use the prompts at all.
+
+        Analysis fields that are already known (e.g., from OpenAI's
+        moderation endpoint or an external PII service) can be given in
+        precomputed_analysis, a dict mapping analysis types to dicts of
+        fields. These fields are used as is and aren't calculated locally
+        (expensive fields are calculated lazily, so e.g. giving all
+        profanity fields means the profanity model isn't used at all), and
+        registered analyzers whose analysis type is given aren't run.
+        Analysis types that aren't calculated locally are added as well.
         """
-        return {
-            x: self._analysis_functions[x](input, response)
+        precomputed_analysis = precomputed_analysis or EMPTY_DICT
+        ret = self._get_local_analysis(
+            input, response, additional_data, precomputed_analysis
+        )
+        for analysis_name, fields in precomputed_analysis.items():
+            ret[analysis_name] = {**ret.get(analysis_name, {}), **fields}
+        return ret
+
+    def _get_local_analysis(
+        self, input, response, additional_data, precomputed_analysis
+    ):
+        """
+        Returns the analysis calculated locally (see get_full_analysis),
+        without the fields in the given precomputed analysis.
+        """
+        # These analyses don't use the prompt texts, so they run on
+        # token-id prompts as well.
+        call_analyses = {}
+        if self._is_analysis_enabled("prefix_cache"):
+            call_analyses["prefix_cache"] = self._get_selected_fields(
+                "prefix_cache",
+                self._get_full_prefix_cache_analysis(input, response),
+            )
+        if self._is_analysis_enabled("request_efficiency"):
+            call_analyses["request_efficiency"] = self._get_selected_fields(
+                "request_efficiency",
+                self._get_full_request_efficiency_analysis(
+                    input, response, additional_data
+                ),
+            )
+        token_prompts = self.get_prompt_token_arrays(input)
+        if token_prompts:
+            call_analyses.update(self._get_tokens_analysis(token_prompts))
+            if not self._specs.get("analyze_token_prompts", False):
+                return call_analyses
+            input = self._get_input_with_detokenized_prompts(input)
+
+        input = self._get_input_with_filled_templates(input, additional_data)
+        registered_analyzers = tuple(
+            x
+            for x in get_registered_analyzers()
+            if self._is_analysis_enabled(x.name, x.enabled_by_default)
+            and x.name not in precomputed_analysis
+        )
+        collect_registered_analysis = start_analyzers(
+            registered_analyzers,
+            self.get_texts_by_role(input, response)
+            if registered_analyzers
+            else {},
+        )
+
+        ret = {
+            x: self._get_selected_fields(
+                x,
+                self._analysis_functions[x](input, response),
+                precomputed_analysis.get(x, EMPTY_DICT),
+            )
             for x in self._analysis_functions
-            if self._specs.get("analysis", {}).get(x, True)
+            if self._is_analysis_enabled(x)
         }
+        ret.update(
+            {
+                x: self._get_selected_fields(x, fields)
+                for x, fields in collect_registered_analysis().items()
+            }
+        )
+        ret.update(call_analyses)
+        return ret
 
     @abc.abstractmethod
     def _get_full_privacy_analysis(self, input, response):
         """
         Returns a dictionary with all calculated privacy analysis params.
+
+        Values of fields that are expensive to calculate may be given as
+        functions (with no arguments), which are only called if the field
+        is selected (see get_full_analysis).
         """
         pass
 
@@ -108,10 +388,226 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def _get_full_keywords_analysis(self, input, response):
+        """
+        Returns a dictionary with all calculated keywords analysis params,
+        for each of the categories in the "keywords" spec, possibly given as
+        functions (see _get_full_privacy_analysis).
+        """
+        pass
+
+    def _get_profanity_model(self):
+        return get_specs_profanity_model(self._specs)
+
     @abc.abstractmethod
     def _get_full_profainty_analysis(self, input, response):
         """
-        Returns a dictionary with all calculated profanity analysis params.
+        Returns a dictionary with all calculated profanity analysis params,
+        possibly given as functions (see _get_full_privacy_analysis).
+        """
+        pass
+
+    def _get_full_overlap_analysis(self, input, response):
+        """
+        Returns a dictionary with the ratio of novel n-grams in each answer
+        compared to all prompts, using a fixed-memory sketch of the prompts'
+        n-grams.
+        """
+        texts = self.get_texts_by_role(input, response)
+        prompt_sketch = get_prompt_sketch(texts[PROMPT_ROLE])
+        answers_overlap_analyzers = get_overlap_analyzers(texts[ANSWER_ROLE])
+        return {
+            f"answer_{NGRAM_NAMES[n]}_novelty_ratio": tuple(
+                analyzer.get_novelty_ratio(prompt_sketch, n)
+                for analyzer in answers_overlap_analyzers
+            )
+            for n in NGRAM_SIZES
+        }
+
+    def _get_near_duplicate_index(self, model):
+        if model not in self._near_duplicate_indices:
+            # Analyzers may run concurrently (see analysis/registry.py), so
+            # setdefault keeps the index of whichever first call wins,
+            # rather than replacing it along with its entries.
+            self._near_duplicate_indices.setdefault(
+                model,
+                NearDuplicateIndex(
+                    max_size=self._specs.get(
+                        "near_duplicate_index_size", DEFAULT_MAX_SIZE
+                    ),
+                    max_age_seconds=self._specs.get(
+                        "near_duplicate_max_age_seconds",
+                        DEFAULT_MAX_AGE_SECONDS,
+                    ),
+                ),
+            )
+        return self._near_duplicate_indices[model]
+
+    def _get_full_near_duplicate_analysis(self, input, response):
+        """
+        Returns a dictionary with the number of recent near-duplicate answers
+        to other prompts (of the same model) for each answer, along with the
+        similarity of the most similar one.
+        """
+        texts = self.get_texts_by_role(input, response)
+        results = self._get_near_duplicate_index(
+            get_model_param(input)
+        ).find_and_add(
+            tuple(get_simhash(answer) for answer in texts[ANSWER_ROLE]),
+            hash(texts[PROMPT_ROLE]),
+        )
+        return {
+            "answer_near_duplicate_count": tuple(x[0] for x in results),
+            "answer_near_duplicate_max_similarity": tuple(
+                x[1] for x in results
+            ),
+        }
+
+    def _get_prefix_index(self, model):
+        if model not in self._prefix_indices:
+            # Analyzers may run concurrently (see analysis/registry.py), so
+            # setdefault keeps the index of whichever first call wins,
+            # rather than replacing it along with its entries.
+            self._prefix_indices.setdefault(
+                model,
+                prefix_cache.PrefixIndex(
+                    max_size=self._specs.get(
+                        "prefix_cache_index_size",
+                        prefix_cache.DEFAULT_MAX_SIZE,
+                    ),
+                    max_age_seconds=self._specs.get(
+                        "prefix_cache_max_age_seconds",
+                        prefix_cache.DEFAULT_MAX_AGE_SECONDS,
+                    ),
+                    block_size=self._specs.get(
+                        "prefix_cache_block_size",
+                        prefix_cache.DEFAULT_BLOCK_SIZE,
+                    ),
+                ),
+            )
+        return self._prefix_indices[model]
+
+    def _get_full_prefix_cache_analysis(self, input, response):
+        """
+        Returns a dictionary with the length (in tokens) of the longest
+        prefix each prompt shares with recent prompts (of the same model),
+        its ratio of the whole prompt, and the number of cached prompt
+        tokens OpenAI reported for the call (when given).
+        """
+        model = get_model_param(input)
+        prompts_tokens = tuple(
+            tokenize(model, prompt) if isinstance(prompt, str) else prompt
+            for prompt in self.get_cacheable_prompts(input)
+        )
+        shared_token_counts = self._get_prefix_index(model).find_and_add(
+            prompts_tokens
+        )
+        ret = {
+            "prompt_shared_prefix_token_count": shared_token_counts,
+            "prompt_shared_prefix_ratio": tuple(
+                shared_count / len(tokens) if tokens else 0.0
+                for shared_count, tokens in zip(
+                    shared_token_counts, prompts_tokens
+                )
+            ),
+        }
+        cached_tokens = (
+            response.get("usage", {})
+            .get("prompt_tokens_details", {})
+            .get("cached_tokens")
+        )
+        if cached_tokens is not None:
+            ret["prompt_cached_token_count"] = cached_tokens
+        return ret
+
+    def _get_answer_token_counts(self, input, response):
+        answer_texts = self.get_all_response_texts(response)
+        completion_tokens = response.get("usage", {}).get("completion_tokens")
+        # The usage holds the total for all answers.
+        if len(answer_texts) == 1 and completion_tokens is not None:
+            return (completion_tokens,)
+        model = get_model_param(input)
+        return tuple(len(tokenize(model, x or "")) for x in answer_texts)
+
+    def _get_full_request_efficiency_analysis(
+        self, input, response, additional_data
+    ):
+        """
+        Returns a dictionary with the number of tokens in each answer and
+        its ratio of the requested "max_tokens", the number of distinct
+        answers, and the currently suggested "max_tokens" and "n" caps for
+        the call's model and prompt template (see
+        analysis/request_efficiency.py).
+        """
+        answer_token_counts = self._get_answer_token_counts(input, response)
+        answer_texts = self.get_all_response_texts(response)
+        max_tokens = input.get("max_tokens")
+        suggested_max_tokens, suggested_n = (
+            self._request_efficiency_tracker.add(
+                (
+                    get_model_param(input),
+                    (additional_data or {}).get(
+                        self._specs.get(
+                            "template_id_key", DEFAULT_TEMPLATE_ID_KEY
+                        )
+                    ),
+                ),
+                max_tokens,
+                input.get("n", 1),
+                answer_token_counts,
+                tuple(x.get("finish_reason") for x in response["choices"]),
+                answer_texts,
+            )
+        )
+        ret = {
+            "answer_token_count": answer_token_counts,
+            "distinct_answer_count": len(set(answer_texts)),
+        }
+        if max_tokens:
+            ret["answer_max_tokens_ratio"] = tuple(
+                x / max_tokens for x in answer_token_counts
+            )
+        if suggested_max_tokens is not None:
+            ret["suggested_max_tokens"] = suggested_max_tokens
+        if suggested_n is not None:
+            ret["suggested_n"] = suggested_n
+        return ret
+
+    def get_request_efficiency_stats(self):
+        """
+        Returns a dict mapping each (model, template id) pair seen by the
+        "request_efficiency" analysis to a dict with its answers' stats and
+        suggested "max_tokens" and "n" caps.
+        """
+        return self._request_efficiency_tracker.get_stats()
+
+    def add_call_metrics(self, input, response, latency, stream_start_latency):
+        """
+        Adds a successful call's latency and token metrics to the quantile
+        sketches of its model (see analysis/call_metrics.py).
+        """
+        self._call_metrics_tracker.add(
+            get_model_param(input),
+            self._get_endpoint_name(),
+            get_call_metrics(
+                latency, stream_start_latency, response.get("usage") or {}
+            ),
+        )
+
+    def get_call_metrics_tracker(self):
+        """
+        Returns the CallMetricsTracker holding the quantile sketches of the
+        calls' metrics, to query or merge with other processes' trackers.
+        """
+        return self._call_metrics_tracker
+
+    @abc.abstractmethod
+    def get_cacheable_prompts(self, request):
+        """
+        Returns a tuple of the prompts in the given request as OpenAI's
+        prompt caching sees them, each either a text or a list of token
+        ids.
         """
         pass
 
@@ -138,6 +634,30 @@ class OpenAIEndpointWrappingLogic(metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def replace_prompt_texts(self, request, replace_function):
+        """
+        Returns a shallow copy of the given request in which each prompt
+        text is replaced with the result of the given function on it.
+        """
+        pass
+
+    def get_prompt_token_arrays(self, request):
+        """
+        Returns a tuple of all the prompts in the given request that are
+        given as token ids (lists of ints) rather than texts.
+        """
+        return ()
+
+    @abc.abstractmethod
+    def get_texts_by_role(self, input, response):
+        """
+        Returns a dict mapping each analyzer role (see analysis/registry.py)
+        relevant for this endpoint to a tuple of the matching texts in the
+        given request and response.
+        """
+        pass
+
     @abc.abstractclassmethod
     def get_all_response_texts(self, response):
         """
@@ -12,3 +12,23 @@ class InvalidMonaCredsException(Exception):
 
 class InvalidLagnchainLLMException(Exception):
     pass
+
+
+class InvalidAnalyzerException(Exception):
+    pass
+
+
+class InvalidQueuePolicyException(Exception):
+    pass
+
+
+class InvalidOpenCircuitPolicyException(Exception):
+    pass
+
+
+class UnknownColumnException(Exception):
+    pass
+
+
+class InvalidProfanityEngineException(Exception):
+    pass
@@ -2,4 +2,7 @@ from .logger import Logger
 from .in_memory_logging import InMemoryLogger
 from .standard_logging import StandardLogger
 from .file_logger import FileLogger
+from .background_logger import BackgroundLogger
+from .sqlite_logger import SQLiteLogger
+from .aggregating_logger import AggregatingLogger
 from .mona_logger.mona_logger import MonaLogger
@@ -0,0 +1,354 @@
+from .logger import Logger
+from ..analysis.templates import DEFAULT_TEMPLATE_ID_KEY
+import atexit
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_ALLOWED_LATENESS_SECONDS = 60
+
+_USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def _get_numbers(value):
+    """
+    Returns a list of the numbers (including bools) in the given value,
+    which may be a single number or a tuple of numbers (as in per-choice
+    analyses).
+    """
+    values = value if isinstance(value, (tuple, list)) else (value,)
+    return [
+        x
+        for x in values
+        if isinstance(x, (int, float)) and not math.isnan(x)
+    ]
+
+
+def _get_bucket(value):
+    """
+    Returns the upper bound of the histogram bucket of the given value.
+    Buckets are powers of two, so they fit seconds, token counts and
+    probabilities alike.
+    """
+    if value <= 0:
+        return 0
+    return 2 ** math.ceil(math.log2(value))
+
+
+def _get_hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, default=str)
+
+
+class _FieldAccumulator:
+    """
+    Accumulates the count, sum, min, max and histogram of a field's values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = {}
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = _get_bucket(value)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "max": self.max,
+            "histogram": {
+                str(bucket): self.histogram[bucket]
+                for bucket in sorted(self.histogram)
+            },
+        }
+
+
+class _GroupAccumulator:
+    def __init__(self):
+        self.count = 0
+        self.exception_count = 0
+        self.fields = {}
+
+    def add(self, message):
+        self.count += 1
+        self.exception_count += bool(message.get("is_exception"))
+        values = {
+            "latency": message.get("latency"),
+            "stream_start_latency": message.get("stream_start_latency"),
+        }
+        usage = (message.get("response") or {}).get("usage") or {}
+        values.update((name, usage.get(name)) for name in _USAGE_FIELDS)
+        for analysis_type, fields in (message.get("analysis") or {}).items():
+            for field, value in fields.items():
+                values[f"{analysis_type}.{field}"] = value
+        for name, value in values.items():
+            for number in _get_numbers(value):
+                if name not in self.fields:
+                    self.fields[name] = _FieldAccumulator()
+                self.fields[name].add(number)
+
+
+class AggregatingLogger(Logger):
+    """
+    A logger that, instead of logging every message, folds messages into
+    per-window accumulators and logs a single summary message per window
+    (of window_seconds) and group to the given downstream logger.
+
+    Messages are grouped by model, api name and prompt template id (the
+    "template_id_key" in the message's additional data), and by the values
+    of the given group_by_additional_data_keys. Each summary holds the
+    window's start time and length, the group's keys, the number of
+    messages (and of exceptions among them), and the count, sum, mean, min,
+    max and power-of-two histogram of the latencies, token counts and
+    numeric analysis fields (named "<analysis type>.<field>", with each
+    choice's value counted for per-choice fields).
+
+    Messages with exceptions are passed to the downstream logger as is (and
+    not aggregated), unless pass_through_exceptions is False.
+
+    A message is counted in the window of its export timestamp (if given as
+    a number) or of the time it's logged. Since the export timestamp is
+    usually the call's start time and calls end out of order, a window is
+    only closed allowed_lateness_seconds after its end (which should cover
+    the slowest calls' latency), either once a message stamped that late is
+    logged, or by a background thread (every window_seconds). Its summaries
+    are then logged, and messages of closed windows that arrive later are
+    dropped (counted in self.late_count), so each window and group gets a
+    single summary. All open windows' summaries are logged on "flush" and
+    on exit.
+
+    Each process aggregates its own messages, so summaries hold (and their
+    context ids include) the host name and process id, keeping the
+    summaries of different workers apart.
+    """
+
+    def __init__(
+        self,
+        logger,
+        window_seconds=DEFAULT_WINDOW_SECONDS,
+        group_by_additional_data_keys=(),
+        template_id_key=DEFAULT_TEMPLATE_ID_KEY,
+        pass_through_exceptions=True,
+        allowed_lateness_seconds=DEFAULT_ALLOWED_LATENESS_SECONDS,
+    ):
+        self.logger = logger
+        self.late_count = 0
+        self._host = socket.gethostname()
+        self._window_seconds = window_seconds
+        self._allowed_lateness_seconds = allowed_lateness_seconds
+        # Windows that ended by this time are closed.
+        self._closed_until = -math.inf
+        self._group_by_additional_data_keys = tuple(
+            group_by_additional_data_keys
+        )
+        self._template_id_key = template_id_key
+        self._pass_through_exceptions = pass_through_exceptions
+        # Maps (window start, group key) pairs to their accumulators.
+        self._accumulators = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._pid = os.getpid()
+
+        atexit.register(self.close)
+
+    def start_monitoring(self, openai_class_name):
+        return self.logger.start_monitoring(openai_class_name)
+
+    def _ensure_thread(self):
+        # The thread is (re)started lazily, since threads don't survive
+        # forking (e.g., in pre-forking web servers).
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._pid != os.getpid():
+                # Forked: the accumulated messages are the parent's.
+                self._pid = os.getpid()
+                self._accumulators = {}
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._log_past_windows_periodically,
+                    name="MonaAggregatingLogger",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _log_past_windows_periodically(self):
+        while not self._stop_event.wait(self._window_seconds):
+            try:
+                for summary in self._pop_summaries(time.time()):
+                    self.logger.log(*summary)
+            except Exception:
+                logging.exception("Failed logging aggregated summaries")
+
+    def _get_group_key(self, message):
+        additional_data = message.get("additional_data") or {}
+        return (
+            (message.get("response") or {}).get("model")
+            or (message.get("input") or {}).get("model"),
+            message.get("api_name"),
+            _get_hashable(additional_data.get(self._template_id_key)),
+            tuple(
+                _get_hashable(additional_data.get(x))
+                for x in self._group_by_additional_data_keys
+            ),
+        )
+
+    def _get_window_start(self, timestamp):
+        return timestamp - timestamp % self._window_seconds
+
+    def _get_summary(self, window_start, group_key, accumulator):
+        """
+        Returns the (message, context id, export timestamp) args for logging
+        the given group's summary.
+        """
+        model, api_name, template_id, additional_data_values = group_key
+        pid = os.getpid()
+        message = {
+            "host": self._host,
+            "pid": pid,
+            "window_start": window_start,
+            "window_seconds": self._window_seconds,
+            "model": model,
+            "api_name": api_name,
+            "template_id": template_id,
+            "count": accumulator.count,
+            "exception_count": accumulator.exception_count,
+            "fields": {
+                name: field.to_dict()
+                for name, field in accumulator.fields.items()
+            },
+        }
+        if self._group_by_additional_data_keys:
+            message["additional_data"] = dict(
+                zip(
+                    self._group_by_additional_data_keys,
+                    additional_data_values,
+                )
+            )
+        context_id = ":".join(
+            str(x)
+            for x in (
+                "summary",
+                self._host,
+                pid,
+                window_start,
+                model,
+                api_name,
+                template_id,
+                *additional_data_values,
+            )
+        )
+        return message, context_id, window_start
+
+    def _pop_summaries(self, now=None):
+        """
+        Closes the windows that ended at least the allowed lateness before
+        the given time (or all windows if None), and returns a list of the
+        summaries of the closed windows, removing them.
+        """
+        with self._lock:
+            if now is None:
+                keys = list(self._accumulators)
+                self._closed_until = max(
+                    (self._closed_until,)
+                    + tuple(x[0] + self._window_seconds for x in keys)
+                )
+            else:
+                self._closed_until = max(
+                    self._closed_until, now - self._allowed_lateness_seconds
+                )
+                keys = [
+                    key
+                    for key in self._accumulators
+                    if key[0] + self._window_seconds <= self._closed_until
+                ]
+            return [
+                self._get_summary(*key, self._accumulators.pop(key))
+                for key in sorted(keys, key=lambda x: x[0])
+            ]
+
+    def _add(self, message, export_timestamp):
+        """
+        Folds the given message into its window's accumulator (unless the
+        window is already closed), and returns the summaries of the windows
+        closed by the message's time.
+        """
+        timestamp = (
+            export_timestamp
+            if isinstance(export_timestamp, (int, float))
+            else time.time()
+        )
+        key = (self._get_window_start(timestamp), self._get_group_key(message))
+        with self._lock:
+            if key[0] + self._window_seconds <= self._closed_until:
+                self.late_count += 1
+                return []
+            accumulator = self._accumulators.get(key)
+            if accumulator is None:
+                accumulator = self._accumulators[key] = _GroupAccumulator()
+            accumulator.add(message)
+        self._ensure_thread()
+        return self._pop_summaries(timestamp)
+
+    def _is_passed_through(self, message):
+        return not isinstance(message, dict) or (
+            self._pass_through_exceptions and message.get("is_exception")
+        )
+
+    def log(self, message: dict, context_id=None, export_timestamp=None):
+        """
+        Adds the given message to its window's summary, logging the
+        summaries of the windows that ended.
+        """
+        if self._is_passed_through(message):
+            return self.logger.log(message, context_id, export_timestamp)
+        for summary in self._add(message, export_timestamp):
+            self.logger.log(*summary)
+
+    async def alog(
+        self, message: dict, context_id=None, export_timestamp=None
+    ):
+        if self._is_passed_through(message):
+            return await self.logger.alog(
+                message, context_id, export_timestamp
+            )
+        for summary in self._add(message, export_timestamp):
+            await self.logger.alog(*summary)
+
+    def flush(self):
+        """
+        Logs the summaries of all windows, including the current ones, and
+        closes them, so messages of these windows that are logged later are
+        dropped (and counted in self.late_count) rather than summarized
+        again under the same context id.
+        """
+        for summary in self._pop_summaries():
+            self.logger.log(*summary)
+
+    def close(self):
+        """
+        Stops the background thread and logs all summaries.
+        """
+        self._stop_event.set()
+        self.flush()
@@ -0,0 +1,158 @@
+from .logger import Logger
+from ..exceptions import InvalidQueuePolicyException
+from collections import deque
+import asyncio
+import atexit
+import logging
+import threading
+
+DROP_POLICY = "drop"
+BLOCK_POLICY = "block"
+FULL_QUEUE_POLICIES = (DROP_POLICY, BLOCK_POLICY)
+
+DEFAULT_MAX_QUEUE_SIZE = 10000
+DEFAULT_FLUSH_TIMEOUT_SECONDS = 5
+
+
+class BackgroundLogger(Logger):
+    """
+    A logger that wraps any other logger and logs messages with it from a
+    background daemon thread, so that logging (e.g., exporting to Mona)
+    never slows down the monitored calls: "log" returns as soon as the
+    message is queued.
+
+    Messages are kept in a bounded queue. When it's full, new messages are
+    either dropped (counted in self.dropped_count) or wait for room,
+    according to the given full_queue_policy ("drop" or "block").
+
+    Queued messages are flushed on interpreter exit, waiting at most
+    flush_timeout_seconds for them to be logged.
+    """
+
+    def __init__(
+        self,
+        logger,
+        max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+        full_queue_policy=DROP_POLICY,
+        flush_timeout_seconds=DEFAULT_FLUSH_TIMEOUT_SECONDS,
+    ):
+        if full_queue_policy not in FULL_QUEUE_POLICIES:
+            raise InvalidQueuePolicyException(
+                f"Full queue policy must be one of {FULL_QUEUE_POLICIES}, "
+                f"got '{full_queue_policy}'"
+            )
+        self.logger = logger
+        self.dropped_count = 0
+        self._is_blocking = full_queue_policy == BLOCK_POLICY
+        self._flush_timeout_seconds = flush_timeout_seconds
+        # Appending and popping from a deque are atomic, so the calling
+        # threads only need to take a free slot, without any other locking.
+        self._queue = deque()
+        self._free_slots = threading.Semaphore(max_queue_size)
+        self._queued_messages = threading.Semaphore(0)
+        self._is_logging = False
+        self._idle_condition = threading.Condition()
+        self._is_closed = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # The thread is (re)started lazily, since threads don't survive
+        # forking (e.g., in pre-forking web servers).
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._log_queued_messages,
+                    name="MonaBackgroundLogger",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _log_queued_messages(self):
+        while True:
+            self._queued_messages.acquire()
+            if not self._queue:
+                # Woken up by close.
+                return
+            self._is_logging = True
+            args = self._queue.popleft()
+            self._free_slots.release()
+            try:
+                self.logger.log(*args)
+            except Exception:
+                logging.exception("Failed logging a message in background")
+            with self._idle_condition:
+                self._is_logging = False
+                self._idle_condition.notify_all()
+
+    def _enqueue(self, args):
+        self._queue.append(args)
+        self._queued_messages.release()
+        self._ensure_thread()
+
+    def start_monitoring(self, openai_class_name):
+        return self.logger.start_monitoring(openai_class_name)
+
+    def log(self, message: dict, context_id=None, export_timestamp=None):
+        """
+        Queues the given message to be logged by the wrapped logger.
+        """
+        if self._is_closed:
+            return self.logger.log(message, context_id, export_timestamp)
+        if not self._free_slots.acquire(blocking=self._is_blocking):
+            self.dropped_count += 1
+            return
+        self._enqueue((message, context_id, export_timestamp))
+
+    async def alog(
+        self, message: dict, context_id=None, export_timestamp=None
+    ):
+        """
+        Queues the given message to be logged by the wrapped logger. With
+        the "block" policy, waiting for room in the queue doesn't block the
+        event loop.
+        """
+        if self._is_closed:
+            return await self.logger.alog(
+                message, context_id, export_timestamp
+            )
+        if not self._free_slots.acquire(blocking=False):
+            if not self._is_blocking:
+                self.dropped_count += 1
+                return
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._free_slots.acquire
+            )
+        self._enqueue((message, context_id, export_timestamp))
+
+    def flush(self, timeout=None):
+        """
+        Waits until all queued messages are logged, or until the given
+        timeout (in seconds) passes. Returns whether all messages were
+        logged.
+        """
+        with self._idle_condition:
+            return self._idle_condition.wait_for(
+                lambda: not self._queue and not self._is_logging, timeout
+            )
+
+    def close(self):
+        """
+        Flushes the queued messages (waiting at most the flush timeout) and
+        stops the background thread. Messages logged after closing are
+        logged synchronously.
+        """
+        if self._is_closed:
+            return
+        self._is_closed = True
+        if not self.flush(self._flush_timeout_seconds):
+            logging.warning(
+                f"{len(self._queue) + self._is_logging} messages were not "
+                "logged before the flush timeout"
+            )
+        self._queue.clear()
+        self._queued_messages.release()
@@ -0,0 +1,464 @@
+"""
+A disk-backed write-ahead spool for messages that couldn't be exported
+(e.g., during a Mona outage), and a replayer that re-exports them from a
+background thread.
+
+Each process appends messages to segment files in its own subdirectory of
+the spool directory (named by its pid), so that processes sharing a spool
+(e.g., pre-forked web server workers) never interleave records or
+overwrite each other's acknowledgments. Each record is made of its payload
+length, a CRC32 of the payload, and the JSON payload itself. Records are
+fsync-ed in batches (every fsync_every_records records or
+fsync_interval_seconds, whichever comes first) by a background thread, so
+appending never waits for the disk. Segments are rotated at
+max_segment_bytes, and new records are dropped (and counted) once the
+process' spool holds max_total_bytes.
+
+The position of the last record that was exported is kept in an "ack" file
+(atomically replaced on each acknowledgment), and fully acknowledged
+segments are deleted. After a crash, reading resumes from the acknowledged
+position, and a partially written record at the end of the last segment is
+truncated. The unacknowledged records of processes that exited (or of a
+previous run) are adopted, by moving them to a live process' spool.
+"""
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+
+DEFAULT_MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+DEFAULT_FSYNC_EVERY_RECORDS = 100
+DEFAULT_FSYNC_INTERVAL_SECONDS = 1
+DEFAULT_REPLAY_BATCH_SIZE = 100
+DEFAULT_REPLAY_INTERVAL_SECONDS = 5
+
+SEGMENT_SUFFIX = ".seg"
+ACK_FILE_NAME = "ack.json"
+
+# Payload length and CRC32.
+_RECORD_HEADER = struct.Struct(">II")
+
+
+def _get_record(payload):
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_records(file, offset):
+    """
+    Yields each valid record's payload in the given segment file from the
+    given offset, along with the offset after it. Stops at the end of the
+    file or at the first partially written or corrupt record.
+    """
+    file.seek(offset)
+    while True:
+        header = file.read(_RECORD_HEADER.size)
+        if len(header) < _RECORD_HEADER.size:
+            return
+        length, crc = _RECORD_HEADER.unpack(header)
+        payload = file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset += _RECORD_HEADER.size + length
+        yield payload, offset
+
+
+def _get_segments(directory):
+    return sorted(
+        int(x[: -len(SEGMENT_SUFFIX)])
+        for x in os.listdir(directory)
+        if x.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _get_segment_path(directory, segment):
+    return os.path.join(directory, f"{segment:020d}{SEGMENT_SUFFIX}")
+
+
+def _read_ack_position(directory, first_segment):
+    try:
+        with open(os.path.join(directory, ACK_FILE_NAME)) as file:
+            ack = json.load(file)
+        position = (ack["segment"], ack["offset"])
+    except FileNotFoundError:
+        position = (first_segment, 0)
+    # Acknowledged segments may have been deleted.
+    return max(position, (first_segment, 0))
+
+
+def _read_segments_records(directory, segments, position):
+    """
+    Yields each record dict in the given segments of the given directory,
+    starting at the given position, along with the position after it.
+    """
+    segment, offset = position
+    for next_segment in segments:
+        if next_segment < segment:
+            continue
+        if next_segment != segment:
+            segment, offset = next_segment, 0
+        try:
+            with open(_get_segment_path(directory, segment), "rb") as file:
+                for payload, offset in _read_records(file, offset):
+                    yield json.loads(payload), (segment, offset)
+        except FileNotFoundError:
+            # Deleted by a concurrent acknowledgment.
+            continue
+
+
+def _is_process_alive(pid):
+    if os.name == "nt":
+        # os.kill terminates processes on Windows, so spools of other
+        # processes are never adopted there.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Owned by another user.
+        return True
+    return True
+
+
+class DiskSpool:
+    """
+    A thread-safe, append-only spool of (message, context id, export
+    timestamp) records in segment files under the given directory. See the
+    module's docstring for the format and guarantees.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_segment_bytes=DEFAULT_MAX_SEGMENT_BYTES,
+        max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+        fsync_every_records=DEFAULT_FSYNC_EVERY_RECORDS,
+        fsync_interval_seconds=DEFAULT_FSYNC_INTERVAL_SECONDS,
+    ):
+        self.directory = directory
+        self.dropped_count = 0
+        self._max_segment_bytes = max_segment_bytes
+        self._max_total_bytes = max_total_bytes
+        self._fsync_every_records = fsync_every_records
+        self._fsync_interval_seconds = fsync_interval_seconds
+        self._is_closed = False
+        self._init_process_state()
+
+    def _init_process_state(self):
+        self._pid = os.getpid()
+        self.process_directory = os.path.join(self.directory, str(self._pid))
+        self._unsynced_records_count = 0
+        self._lock = threading.Lock()
+        self._sync_event = threading.Event()
+        self._sync_thread = None
+        self._sync_thread_lock = threading.Lock()
+
+        os.makedirs(self.process_directory, exist_ok=True)
+        self._segments = self._recover_segments()
+        self._ack_position = _read_ack_position(
+            self.process_directory, self._segments[0]
+        )
+        self._write_file = self._open_last_segment()
+        self._total_bytes = sum(
+            os.path.getsize(self._get_segment_path(x)) for x in self._segments
+        )
+        self.adopt_orphaned_spools()
+
+    def _ensure_process_state(self):
+        # After forking, the child process switches to its own directory.
+        # The parent's segment file is unbuffered, so the child's copy
+        # holds no records of the parent's to write.
+        if self._pid != os.getpid():
+            self._init_process_state()
+
+    def _get_segment_path(self, segment):
+        return _get_segment_path(self.process_directory, segment)
+
+    def _get_ack_path(self):
+        return os.path.join(self.process_directory, ACK_FILE_NAME)
+
+    def _open_last_segment(self):
+        # Unbuffered, so that each record is written in a single call (and
+        # never left in a buffer that a forked process would inherit).
+        return open(
+            self._get_segment_path(self._segments[-1]), "ab", buffering=0
+        )
+
+    def _recover_segments(self):
+        """
+        Returns a sorted list of the existing segments' indices (creating
+        the first one if needed), after truncating a partially written
+        record at the end of the last segment.
+        """
+        segments = _get_segments(self.process_directory) or [0]
+        last_segment_path = self._get_segment_path(segments[-1])
+        with open(last_segment_path, "ab+") as file:
+            valid_end = 0
+            for _, valid_end in _read_records(file, 0):
+                pass
+            if file.seek(0, os.SEEK_END) > valid_end:
+                logging.warning(
+                    f"Truncating a partial record at the end of "
+                    f"{last_segment_path}"
+                )
+                file.truncate(valid_end)
+        return segments
+
+    def _sync(self):
+        os.fsync(self._write_file.fileno())
+        self._unsynced_records_count = 0
+
+    def _ensure_sync_thread(self):
+        # The thread is (re)started lazily, since threads don't survive
+        # forking (e.g., in pre-forking web servers).
+        thread = self._sync_thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._sync_thread_lock:
+            if self._sync_thread is None or not self._sync_thread.is_alive():
+                self._sync_thread = threading.Thread(
+                    target=self._sync_periodically,
+                    name="MonaDiskSpoolSync",
+                    daemon=True,
+                )
+                self._sync_thread.start()
+
+    def _sync_appended_records(self):
+        with self._lock:
+            if self._write_file.closed or not self._unsynced_records_count:
+                return
+            self._unsynced_records_count = 0
+            # Fsync a duplicate descriptor outside the lock, so appending
+            # (and even rotating the segment) doesn't wait for the disk.
+            fd = os.dup(self._write_file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _sync_periodically(self):
+        while not self._is_closed:
+            self._sync_event.wait(self._fsync_interval_seconds)
+            self._sync_event.clear()
+            try:
+                self._sync_appended_records()
+            except Exception:
+                logging.exception("Failed syncing the disk spool")
+
+    def _rotate_segment(self):
+        self._sync()
+        self._write_file.close()
+        self._segments.append(self._segments[-1] + 1)
+        self._write_file = self._open_last_segment()
+
+    def append(self, message, context_id=None, export_timestamp=None):
+        """
+        Appends the given message to the spool. Returns False if the spool
+        is full and the message was dropped.
+        """
+        record = _get_record(
+            json.dumps(
+                {
+                    "message": message,
+                    "context_id": context_id,
+                    "export_timestamp": export_timestamp,
+                }
+            ).encode()
+        )
+        self._ensure_process_state()
+        with self._lock:
+            if self._total_bytes + len(record) > self._max_total_bytes:
+                self.dropped_count += 1
+                return False
+            if (
+                self._write_file.tell()
+                and self._write_file.tell() + len(record)
+                > self._max_segment_bytes
+            ):
+                self._rotate_segment()
+            self._write_file.write(record)
+            self._total_bytes += len(record)
+            self._unsynced_records_count += 1
+            if self._unsynced_records_count >= self._fsync_every_records:
+                self._sync_event.set()
+        self._ensure_sync_thread()
+        return True
+
+    def read_batch(self, max_records):
+        """
+        Returns a list of up to the given number of unacknowledged records,
+        each as a (record dict, position) pair, where the position is to be
+        given to "ack" once the record is exported.
+        """
+        self._ensure_process_state()
+        with self._lock:
+            position = self._ack_position
+            segments = list(self._segments)
+        # Reading is done outside the lock, so appending isn't blocked.
+        # Records appended meanwhile may be partially written, but reading
+        # stops at the first partial record.
+        ret = []
+        for record in _read_segments_records(
+            self.process_directory, segments, position
+        ):
+            ret.append(record)
+            if len(ret) == max_records:
+                break
+        return ret
+
+    def ack(self, position):
+        """
+        Marks all records up to the given position (see read_batch) as
+        exported, and deletes the segments holding only such records.
+        """
+        self._ensure_process_state()
+        with self._lock:
+            temp_path = self._get_ack_path() + ".tmp"
+            with open(temp_path, "w") as file:
+                json.dump(
+                    {"segment": position[0], "offset": position[1]}, file
+                )
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self._get_ack_path())
+            self._ack_position = position
+            while self._segments[0] < position[0]:
+                segment_path = self._get_segment_path(self._segments.pop(0))
+                self._total_bytes -= os.path.getsize(segment_path)
+                os.remove(segment_path)
+
+    def is_empty(self):
+        """
+        Returns whether all the records in the spool were acknowledged.
+        """
+        return not self.read_batch(1)
+
+    def adopt_orphaned_spools(self):
+        """
+        Moves the unacknowledged records in the spool directories of
+        processes that are no longer running (e.g., workers that were
+        restarted, or a previous run) to this process' spool.
+        """
+        self._ensure_process_state()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                owner_pid = int(name.split(".")[0])
+            except ValueError:
+                continue
+            if (
+                path == self.process_directory
+                or not os.path.isdir(path)
+                or owner_pid != self._pid
+                and _is_process_alive(owner_pid)
+            ):
+                continue
+            if owner_pid != self._pid:
+                # Renaming is atomic, so only one process adopts each spool.
+                # If this process exits before it's done, the directory is
+                # adopted in turn by another one.
+                adopted_path = os.path.join(
+                    self.directory, f"{self._pid}.{name}"
+                )
+                try:
+                    os.rename(path, adopted_path)
+                except OSError:
+                    continue
+                path = adopted_path
+            self._adopt_spool(path)
+
+    def _adopt_spool(self, path):
+        segments = _get_segments(path)
+        if segments:
+            for record, _ in _read_segments_records(
+                path, segments, _read_ack_position(path, segments[0])
+            ):
+                self.append(
+                    record["message"],
+                    record["context_id"],
+                    record["export_timestamp"],
+                )
+            with self._lock:
+                self._sync()
+        shutil.rmtree(path)
+
+    def close(self):
+        if self._pid != os.getpid():
+            # Nothing was appended in this (forked) process.
+            return
+        self._is_closed = True
+        self._sync_event.set()
+        with self._lock:
+            if not self._write_file.closed:
+                self._sync()
+                self._write_file.close()
+
+
+class SpoolReplayer:
+    """
+    Re-exports the records in the given spool in batches from a background
+    daemon thread, every interval_seconds, using the given export function
+    (which gets a list of record dicts, each with a message, context id and
+    export timestamp, and returns whether they were all exported). Replaying
+    stops at the first failed batch, which is retried as a whole on the next
+    interval.
+    """
+
+    def __init__(
+        self,
+        spool,
+        export_function,
+        batch_size=DEFAULT_REPLAY_BATCH_SIZE,
+        interval_seconds=DEFAULT_REPLAY_INTERVAL_SECONDS,
+    ):
+        self._spool = spool
+        self._export_function = export_function
+        self._batch_size = batch_size
+        self._interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def replay(self):
+        """
+        Exports all spooled records, acknowledging each batch once it's
+        exported. Returns whether all records were exported.
+        """
+        while True:
+            batch = self._spool.read_batch(self._batch_size)
+            if not batch:
+                return True
+            if not self._export_function([record for record, _ in batch]):
+                return False
+            self._spool.ack(batch[-1][1])
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval_seconds):
+            try:
+                self._spool.adopt_orphaned_spools()
+                self.replay()
+            except Exception:
+                logging.exception("Failed replaying spooled messages")
+
+    def start(self):
+        """
+        Starts the background thread, unless it's already running. Call
+        again after forking (e.g., on each log), since threads don't survive
+        it.
+        """
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="MonaSpoolReplayer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
@@ -1,37 +1,323 @@
 from .logger import Logger
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import atexit
+import glob
+import gzip
+import heapq
 import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_BUFFER_SIZE_BYTES = 64 * 1024
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1
+DEFAULT_ALLOWED_LATENESS_SECONDS = 60
+ROTATED_FILE_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+_TEMPORARY_FILE_SUFFIX = ".tmp"
+
+
+def _open_log_file(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rt")
+    return open(file_name)
+
+
+def _read_timestamped_records(file_name):
+    """
+    Yields each record in the given log file along with its export
+    timestamp. Records without a numeric export timestamp get the timestamp
+    of the record before them, so the file's order is kept.
+    """
+    timestamp = float("-inf")
+    with _open_log_file(file_name) as file:
+        for line in file:
+            record = json.loads(line)
+            if isinstance(record["export_timestamp"], (int, float)):
+                timestamp = record["export_timestamp"]
+            yield timestamp, record
+
+
+def _reorder_records(timestamped_records, allowed_lateness_seconds):
+    """
+    Yields the given (timestamp, record) pairs in timestamp order, assuming
+    no record is stamped more than allowed_lateness_seconds before a record
+    that comes before it. Only the records of the last allowed lateness are
+    held in memory.
+    """
+    heap = []
+    latest_timestamp = float("-inf")
+    for index, (timestamp, record) in enumerate(timestamped_records):
+        # The index keeps equal timestamps in the file's order.
+        heapq.heappush(heap, (timestamp, index, record))
+        latest_timestamp = max(latest_timestamp, timestamp)
+        while heap[0][0] <= latest_timestamp - allowed_lateness_seconds:
+            timestamp, _, record = heapq.heappop(heap)
+            yield timestamp, record
+    while heap:
+        timestamp, _, record = heapq.heappop(heap)
+        yield timestamp, record
+
+
+def get_log_file_names(file_name):
+    """
+    Returns a list of all the log files written by FileLoggers with the
+    given file name, including per-process and rotated files.
+    """
+    file_names = {
+        x
+        for x in (file_name, *glob.glob(f"{file_name}.*"))
+        if os.path.isfile(x) and not x.endswith(_TEMPORARY_FILE_SUFFIX)
+    }
+    # A rotated file whose compression just finished isn't removed yet.
+    return sorted(x for x in file_names if f"{x}.gz" not in file_names)
+
+
+def read_merged_records(
+    file_names, allowed_lateness_seconds=DEFAULT_ALLOWED_LATENESS_SECONDS
+):
+    """
+    Yields the records in all the given log files (e.g., from
+    get_log_file_names) in export timestamp order.
+
+    FileLogger writes records when calls end, but they're usually stamped
+    with the calls' start time, so records in each file are only roughly in
+    timestamp order. Each file is sorted lazily, assuming no record is
+    written more than allowed_lateness_seconds (which should cover the
+    slowest calls' latency) after a record stamped later than it, and the
+    files are then merged, without loading them into memory.
+    """
+    for _, record in heapq.merge(
+        *(
+            _reorder_records(
+                _read_timestamped_records(x), allowed_lateness_seconds
+            )
+            for x in file_names
+        ),
+        key=lambda x: x[0],
+    ):
+        yield record
+
+
+def _compress_file(file_name):
+    # The archive is written under a temporary name, so that a partial
+    # archive is never read as a log file.
+    temporary_file_name = f"{file_name}.gz{_TEMPORARY_FILE_SUFFIX}"
+    with open(file_name, "rb") as source, gzip.open(
+        temporary_file_name, "wb"
+    ) as target:
+        shutil.copyfileobj(source, target)
+    os.replace(temporary_file_name, file_name + ".gz")
+    os.remove(file_name)
 
 
 class FileLogger(Logger):
     """
-    A simple logging class that saves monitored data in a file.
+    A logging class that saves monitored data in a file, one JSON record per
+    line (NDJSON).
+
+    Records are buffered and written to the file once the buffer holds
+    buffer_size_bytes, or once flush_interval_seconds passed since the last
+    write (checked when records are logged, and by a background thread so
+    that records aren't held back when logging pauses), and on exit.
+
+    The file can be rotated once it holds max_file_bytes and/or every
+    rotation_interval_seconds: the current file is renamed with the rotation
+    time and a counter as a suffix (and gzipped in the background if
+    compress_rotated_files is set), and a new file is started.
+
+    "alog" writes on a dedicated writer thread, so the event loop never
+    blocks on disk I/O.
+
+    When several processes log to the same file name (e.g., pre-forked web
+    server workers), set per_process_files so that each process writes to
+    its own "<file_name>.<pid>" file, opened (in append mode) on its first
+    log. Use get_log_file_names and read_merged_records to read all
+    processes' records in export timestamp order.
     """
 
-    def __init__(self, file_name):
-        self.file = open(file_name, "w")
+    def __init__(
+        self,
+        file_name,
+        buffer_size_bytes=DEFAULT_BUFFER_SIZE_BYTES,
+        flush_interval_seconds=DEFAULT_FLUSH_INTERVAL_SECONDS,
+        max_file_bytes=None,
+        rotation_interval_seconds=None,
+        compress_rotated_files=False,
+        per_process_files=False,
+    ):
+        self.file_name = file_name
+        self._per_process_files = per_process_files
+        self._buffer_size_bytes = buffer_size_bytes
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_file_bytes = max_file_bytes
+        self._rotation_interval_seconds = rotation_interval_seconds
+        self._compress_rotated_files = compress_rotated_files
+        self._rotations_count = 0
+        self._stop_event = threading.Event()
+        self.file = None
+        self._init_process_state()
+        if not per_process_files:
+            self._open_file("w")
 
         atexit.register(self.close_file)
 
+    def _init_process_state(self):
+        self._pid = os.getpid()
+        self._current_file_name = (
+            f"{self.file_name}.{self._pid}"
+            if self._per_process_files
+            else self.file_name
+        )
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        # A single writer thread keeps the async records' order.
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="MonaFileLogger"
+        )
+        # Compression has its own thread, so it doesn't hold back writes.
+        self._compressor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="MonaFileLoggerCompressor"
+        )
+        self._flusher_thread = None
+        self._flusher_lock = threading.Lock()
+
+    def _ensure_process_file(self):
+        if not self._per_process_files:
+            return
+        if self._pid != os.getpid():
+            # Forked: the buffer, lock and writer thread belong to the
+            # parent process.
+            self._init_process_state()
+            self.file = None
+        if self.file is None:
+            self._open_file("a")
+
+    def _ensure_flusher_thread(self):
+        # The thread is (re)started lazily, since threads don't survive
+        # forking (e.g., in pre-forking web servers).
+        thread = self._flusher_thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._flusher_lock:
+            if (
+                self._flusher_thread is None
+                or not self._flusher_thread.is_alive()
+            ):
+                self._flusher_thread = threading.Thread(
+                    target=self._flush_periodically,
+                    name="MonaFileLoggerFlusher",
+                    daemon=True,
+                )
+                self._flusher_thread.start()
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self._flush_interval_seconds):
+            try:
+                with self._lock:
+                    if (
+                        self._buffer
+                        and not self.file.closed
+                        and time.monotonic() - self._last_flush_time
+                        >= self._flush_interval_seconds
+                    ):
+                        self._flush()
+            except Exception:
+                logging.exception("Failed flushing records to the log file")
+
+    def _open_file(self, mode):
+        self.file = open(self._current_file_name, mode)
+        self._file_bytes = self.file.tell()
+        now = time.monotonic()
+        self._last_flush_time = now
+        self._file_start_time = now
+
+    def _should_rotate(self):
+        return (
+            self._max_file_bytes is not None
+            and self._file_bytes >= self._max_file_bytes
+        ) or (
+            self._rotation_interval_seconds is not None
+            and time.monotonic() - self._file_start_time
+            >= self._rotation_interval_seconds
+        )
+
+    def _rotate(self):
+        self.file.close()
+        self._rotations_count += 1
+        rotated_file_name = (
+            f"{self._current_file_name}."
+            f"{time.strftime(ROTATED_FILE_TIME_FORMAT)}."
+            f"{self._rotations_count}"
+        )
+        os.replace(self._current_file_name, rotated_file_name)
+        if self._compress_rotated_files:
+            self._compressor.submit(_compress_file, rotated_file_name)
+        self._open_file("w")
+
+    def _flush(self):
+        if self._buffer:
+            data = "".join(self._buffer)
+            self.file.write(data)
+            self._file_bytes += len(data)
+            self._buffer = []
+            self._buffered_bytes = 0
+        self.file.flush()
+        self._last_flush_time = time.monotonic()
+        if self._should_rotate():
+            self._rotate()
+
+    def flush(self):
+        """
+        Writes all buffered records to the file.
+        """
+        with self._lock:
+            if self.file is not None and not self.file.closed:
+                self._flush()
+
     def close_file(self):
-        if not self.file.closed:
-            self.file.close()
+        self._stop_event.set()
+        if self._flusher_thread is not None:
+            self._flusher_thread.join()
+        with self._lock:
+            if self.file is not None and not self.file.closed:
+                self._flush()
+                self.file.close()
+        self._writer.shutdown(wait=True)
+        self._compressor.shutdown(wait=True)
 
     def log(self, message: dict, context_id=None, export_timestamp=None):
-        self.file.writelines(
-            [
-                json.dumps(
-                    {
-                        "message": message,
-                        "context_id": context_id,
-                        "export_timestamp": export_timestamp,
-                    }
-                )
-            ]
+        record = (
+            json.dumps(
+                {
+                    "message": message,
+                    "context_id": context_id,
+                    "export_timestamp": export_timestamp,
+                }
+            )
+            + "\n"
         )
+        self._ensure_process_file()
+        self._ensure_flusher_thread()
+        with self._lock:
+            self._buffer.append(record)
+            self._buffered_bytes += len(record)
+            if (
+                self._buffered_bytes >= self._buffer_size_bytes
+                or time.monotonic() - self._last_flush_time
+                >= self._flush_interval_seconds
+                or self._should_rotate()
+            ):
+                self._flush()
 
     async def alog(
         self, message: dict, context_id=None, export_timestamp=None
     ):
-        # TODO: Imlement actual asyncio usage.
-        return self.log(message, context_id, export_timestamp)
+        self._ensure_process_file()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._writer, self.log, message, context_id, export_timestamp
+        )
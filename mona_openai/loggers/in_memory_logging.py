@@ -1,17 +1,120 @@
 from .logger import Logger
+from ..exceptions import UnknownColumnException
+from array import array
 from collections import deque
+import math
+import threading
+import time
 
 DEFAULT_MAX_LEN = 1000
 
+# Numeric columns kept for every message. Missing values are NaN.
+TIMESTAMP_COLUMN = "timestamp"
+_MESSAGE_COLUMNS = (
+    "latency",
+    "stream_start_latency",
+    "is_exception",
+    "is_async",
+)
+_USAGE_COLUMNS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+_NO_MODEL = -1
+_UNKNOWN_MODEL = -2
+
+
+def _get_numeric(value):
+    """
+    Returns the given value as a float if it's a number (or a bool, or a
+    tuple holding a single number, as in single-choice analyses), and NaN
+    otherwise.
+    """
+    if isinstance(value, (tuple, list)) and len(value) == 1:
+        value = value[0]
+    if isinstance(value, (int, float)):
+        return float(value)
+    return math.nan
+
 
 class InMemoryLogger(Logger):
     """
-    A simple logging class that saves monitored data in an in-memory list
-    under self.latest_messages.
+    A simple logging class that saves monitored data in memory, for the
+    latest max_len messages.
+
+    Full messages are kept in an in-memory list under self.latest_messages
+    (unless keep_messages is False). In addition, the numeric fields of each
+    message (latency, token counts, exception and async flags, and numeric
+    analysis fields, named "<analysis type>.<field>") and its model are kept
+    in a columnar ring buffer of typed arrays, allowing quick aggregate
+    queries (e.g., for a health endpoint) with get_percentiles,
+    get_mean_by_model and get_count, vectorized with numpy (which is only
+    imported on the first query).
     """
 
-    def __init__(self, max_len=DEFAULT_MAX_LEN):
-        self.latest_messages = deque(maxlen=max_len)
+    def __init__(self, max_len=DEFAULT_MAX_LEN, keep_messages=True):
+        self.latest_messages = deque(maxlen=max_len if keep_messages else 0)
+        self._max_len = max_len
+        self._columns = {
+            name: self._get_empty_column()
+            for name in (
+                TIMESTAMP_COLUMN,
+                *_MESSAGE_COLUMNS,
+                *_USAGE_COLUMNS,
+            )
+        }
+        self._model_ids = array("i", [_NO_MODEL] * max_len)
+        self._models = []
+        self._next_index = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _get_empty_column(self):
+        return array("d", [math.nan] * self._max_len)
+
+    def _get_model_id(self, model, is_new_model_allowed=True):
+        if model is None:
+            return _NO_MODEL
+        try:
+            return self._models.index(model)
+        except ValueError:
+            if not is_new_model_allowed:
+                return _UNKNOWN_MODEL
+            self._models.append(model)
+            return len(self._models) - 1
+
+    def _get_filter_model_id(self, model):
+        return (
+            None
+            if model is None
+            else self._get_model_id(model, is_new_model_allowed=False)
+        )
+
+    def _validate_column_name(self, column_name):
+        if column_name not in self._columns:
+            raise UnknownColumnException(
+                f"Unknown column '{column_name}', must be one of "
+                f"{self.get_column_names()}"
+            )
+
+    def _get_row(self, message):
+        if not isinstance(message, dict):
+            return {}, None
+        response = message.get("response") or {}
+        row = {
+            name: _get_numeric(message.get(name)) for name in _MESSAGE_COLUMNS
+        }
+        usage = response.get("usage") or {}
+        row.update(
+            (name, _get_numeric(usage.get(name))) for name in _USAGE_COLUMNS
+        )
+        for analysis_type, fields in (message.get("analysis") or {}).items():
+            for field, value in fields.items():
+                value = _get_numeric(value)
+                if not math.isnan(value):
+                    row[f"{analysis_type}.{field}"] = value
+        model = response.get("model") or (message.get("input") or {}).get(
+            "model"
+        )
+        return row, model
 
     def log(self, message: dict, context_id=None, export_timestamp=None):
         self.latest_messages.append(
@@ -21,8 +124,150 @@ class InMemoryLogger(Logger):
                 "export_timestamp": export_timestamp,
             }
         )
+        row, model = self._get_row(message)
+        row[TIMESTAMP_COLUMN] = time.time()
+        with self._lock:
+            index = self._next_index
+            for name, column in self._columns.items():
+                column[index] = row.pop(name, math.nan)
+            # Analysis fields seen for the first time.
+            for name, value in row.items():
+                self._columns[name] = self._get_empty_column()
+                self._columns[name][index] = value
+            self._model_ids[index] = self._get_model_id(model)
+            self._next_index = (index + 1) % self._max_len
+            self._count = min(self._count + 1, self._max_len)
 
     async def alog(
         self, message: dict, context_id=None, export_timestamp=None
     ):
         self.log(message, context_id, export_timestamp)
+
+    def get_column_names(self):
+        """
+        Returns a list of the names of all the numeric columns.
+        """
+        return list(self._columns)
+
+    def _get_start(self, last_seconds):
+        """
+        Returns the logical index (possibly negative, to be taken modulo the
+        buffer's length) of the oldest message logged in the last given
+        number of seconds (or of the oldest message if None). Messages from
+        it up to self._next_index are in logging order.
+        """
+        start = self._next_index - self._count
+        if last_seconds is None:
+            return start
+        since = time.time() - last_seconds
+        timestamps = self._columns[TIMESTAMP_COLUMN]
+        # Binary search the first message in the time window.
+        low, high = start, self._next_index
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle % self._max_len] < since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _get_slice(self, column, start):
+        """
+        Returns a numpy copy of the given column's values from the given
+        logical index (see _get_start) up to the latest message.
+        """
+        # Imported here so that numpy is only loaded when actually used.
+        import numpy as np
+
+        values = np.frombuffer(
+            column, dtype=np.float64 if column.typecode == "d" else np.intc
+        )
+        if start < 0:
+            return np.concatenate(
+                (values[start % self._max_len:], values[: self._next_index])
+            )
+        return values[start: self._next_index].copy()
+
+    def _get_values(self, column_name, last_seconds, model):
+        import numpy as np
+
+        self._validate_column_name(column_name)
+        start = self._get_start(last_seconds)
+        values = self._get_slice(self._columns[column_name], start)
+        is_selected = ~np.isnan(values)
+        model_id = self._get_filter_model_id(model)
+        if model_id is not None:
+            is_selected &= self._get_slice(self._model_ids, start) == model_id
+        return values[is_selected]
+
+    def get_percentiles(
+        self, column_name, percentiles, last_seconds=None, model=None
+    ):
+        """
+        Returns a list of the given percentiles (between 0 and 100) of the
+        given column's values, for the messages logged in the last given
+        number of seconds and/or with the given model, or None if there are
+        no such values.
+        """
+        import numpy as np
+
+        with self._lock:
+            values = self._get_values(column_name, last_seconds, model)
+        if not values.size:
+            return None
+        # Linear interpolation between the closest ranks.
+        return np.percentile(values, percentiles).tolist()
+
+    def get_mean_by_model(self, column_name, last_seconds=None):
+        """
+        Returns a dict of the mean of the given column's values for each
+        model, for the messages logged in the last given number of seconds.
+        """
+        import numpy as np
+
+        self._validate_column_name(column_name)
+        with self._lock:
+            start = self._get_start(last_seconds)
+            values = self._get_slice(self._columns[column_name], start)
+            model_ids = self._get_slice(self._model_ids, start)
+            models = list(self._models)
+        is_valid = ~np.isnan(values)
+        # Shifted so that messages without a model get a non-negative id.
+        model_ids = model_ids[is_valid] - _NO_MODEL
+        counts = np.bincount(model_ids, minlength=len(models) + 1)
+        sums = np.bincount(
+            model_ids, weights=values[is_valid], minlength=len(models) + 1
+        )
+        ret = {}
+        for shifted_model_id in np.flatnonzero(counts):
+            model_id = shifted_model_id + _NO_MODEL
+            model = models[model_id] if model_id != _NO_MODEL else None
+            ret[model] = (
+                sums[shifted_model_id] / counts[shifted_model_id]
+            ).item()
+        return ret
+
+    def get_count(self, last_seconds=None, model=None, is_exception=None):
+        """
+        Returns the number of messages logged in the last given number of
+        seconds, optionally only those with the given model and/or
+        exception flag.
+        """
+        import numpy as np
+
+        with self._lock:
+            start = self._get_start(last_seconds)
+            if model is None and is_exception is None:
+                return self._next_index - start
+            is_selected = np.ones(self._next_index - start, dtype=bool)
+            model_id = self._get_filter_model_id(model)
+            if model_id is not None:
+                is_selected &= (
+                    self._get_slice(self._model_ids, start) == model_id
+                )
+            if is_exception is not None:
+                is_selected &= (
+                    self._get_slice(self._columns["is_exception"], start)
+                    == is_exception
+                )
+        return int(np.count_nonzero(is_selected))
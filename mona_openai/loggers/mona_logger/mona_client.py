@@ -1,6 +1,3 @@
-from mona_sdk.client import Client
-from mona_sdk.async_client import AsyncClient
-
 from ...exceptions import InvalidMonaCredsException
 
 
@@ -16,6 +13,10 @@ def get_mona_clients(creds):
     creds: Either a tuple or a dict containing API key and secret for
         Mona's API.
     """
+    # Imported here so that the Mona SDK is only loaded when actually used.
+    from mona_sdk.async_client import AsyncClient
+    from mona_sdk.client import Client
+
     if len(creds) != 2:
         raise InvalidMonaCredsException(
             "There should be exactly two parts to Mona creds. API key and"
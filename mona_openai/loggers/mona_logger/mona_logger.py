@@ -1,18 +1,110 @@
+from ..disk_spool import (
+    DEFAULT_REPLAY_INTERVAL_SECONDS,
+    DiskSpool,
+    SpoolReplayer,
+)
 from ..logger import Logger
-from mona_sdk import MonaSingleMessage
 from .mona_client import get_mona_clients
+from ...exceptions import InvalidOpenCircuitPolicyException
+from ...util.retry_util import (
+    DEFAULT_BASE_DELAY_SECONDS,
+    DEFAULT_COOL_DOWN_SECONDS,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_MAX_DELAY_SECONDS,
+    DEFAULT_MAX_RETRIES,
+    CircuitBreaker,
+    acall_with_retries,
+    call_with_retries,
+    get_backoff_delays,
+)
+from collections import deque
+import atexit
 import logging
+import threading
+import time
+
+DROP_POLICY = "drop"
+SPOOL_POLICY = "spool"
+OPEN_CIRCUIT_POLICIES = (DROP_POLICY, SPOOL_POLICY)
+
+DEFAULT_MAX_SPOOL_SIZE = 10000
+DEFAULT_MAX_SPOOLED_EXPORTS_PER_LOG = 5
+
+
+def _get_mona_single_message(**kwargs):
+    # Imported here so that the Mona SDK is only loaded when actually used.
+    from mona_sdk import MonaSingleMessage
+
+    return MonaSingleMessage(**kwargs)
 
 
 class MonaLogger(Logger):
+    """
+    A logger that exports messages to Mona.
+
+    Failed exports are retried up to max_retries times with exponential
+    backoff. After failure_threshold consecutive failed exports, Mona isn't
+    called at all for cool_down_seconds, after which a single export is
+    tried to probe whether Mona is back. Messages that couldn't be exported
+    are either dropped (counted in self.dropped_count) or, with the "spool"
+    open_circuit_policy, kept in memory (up to max_spool_size, oldest
+    dropped first) and exported once an export succeeds again: each
+    successful "log" exports up to max_spooled_exports_per_log spooled
+    messages, so the spool drains gradually without slowing down any single
+    call much.
+
+    If spool_directory is given (with the "spool" policy), messages are
+    spooled to disk instead (see loggers/disk_spool.py), and re-exported by
+    a background thread every replay_interval_seconds once Mona is
+    healthy. Spooled messages keep their original export timestamp.
+    """
+
     def __init__(
         self,
         mona_creds,
         context_class,
         mona_clients_getter=get_mona_clients,
+        max_retries=DEFAULT_MAX_RETRIES,
+        base_delay_seconds=DEFAULT_BASE_DELAY_SECONDS,
+        max_delay_seconds=DEFAULT_MAX_DELAY_SECONDS,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        cool_down_seconds=DEFAULT_COOL_DOWN_SECONDS,
+        open_circuit_policy=DROP_POLICY,
+        max_spool_size=DEFAULT_MAX_SPOOL_SIZE,
+        max_spooled_exports_per_log=DEFAULT_MAX_SPOOLED_EXPORTS_PER_LOG,
+        spool_directory=None,
+        replay_interval_seconds=DEFAULT_REPLAY_INTERVAL_SECONDS,
     ):
+        if open_circuit_policy not in OPEN_CIRCUIT_POLICIES:
+            raise InvalidOpenCircuitPolicyException(
+                f"Open circuit policy must be one of {OPEN_CIRCUIT_POLICIES},"
+                f" got '{open_circuit_policy}'"
+            )
         self.client, self.async_client = mona_clients_getter(mona_creds)
         self.context_class = context_class
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold, cool_down_seconds
+        )
+        self.dropped_count = 0
+        # Messages are dropped from callers' threads and background ones.
+        self._dropped_count_lock = threading.Lock()
+        self._max_retries = max_retries
+        self._base_delay_seconds = base_delay_seconds
+        self._max_delay_seconds = max_delay_seconds
+        self._max_spooled_exports_per_log = max_spooled_exports_per_log
+        self._spool = None
+        self.disk_spool = None
+        if open_circuit_policy == SPOOL_POLICY and spool_directory:
+            self.disk_spool = DiskSpool(spool_directory)
+            self.spool_replayer = SpoolReplayer(
+                self.disk_spool,
+                self._export_spooled_records,
+                interval_seconds=replay_interval_seconds,
+            )
+            self.spool_replayer.start()
+            atexit.register(self.disk_spool.close)
+        elif open_circuit_policy == SPOOL_POLICY:
+            self._spool = deque(maxlen=max_spool_size)
 
     def start_monitoring(self, openai_class_name):
         """
@@ -35,28 +127,158 @@ class MonaLogger(Logger):
             )
         return response
 
+    def _ensure_spool_replayer(self):
+        # The replayer thread is restarted lazily, since threads don't
+        # survive forking (e.g., in pre-forking web servers).
+        if self.disk_spool is not None:
+            self.spool_replayer.start()
+
+    def _get_mona_message(self, message, context_id, export_timestamp):
+        return _get_mona_single_message(
+            message=message,
+            contextClass=self.context_class,
+            contextId=context_id,
+            exportTimestamp=export_timestamp,
+        )
+
+    def _get_backoff_delays(self):
+        return get_backoff_delays(
+            self._max_retries,
+            self._base_delay_seconds,
+            self._max_delay_seconds,
+        )
+
+    def _count_dropped_message(self):
+        with self._dropped_count_lock:
+            self.dropped_count += 1
+
+    def _handle_unexported_message(self, mona_message):
+        # Keep the message's original time when exporting it later.
+        if mona_message.exportTimestamp is None:
+            mona_message.exportTimestamp = time.time()
+        if self.disk_spool is not None:
+            if not self.disk_spool.append(
+                mona_message.message,
+                mona_message.contextId,
+                mona_message.exportTimestamp,
+            ):
+                self._count_dropped_message()
+            return
+        if self._spool is None:
+            self._count_dropped_message()
+            return
+        if len(self._spool) == self._spool.maxlen:
+            self._count_dropped_message()
+        self._spool.append(mona_message)
+
+    def _handle_export_result(self, is_success, result, mona_message):
+        if is_success:
+            self.circuit_breaker.record_success()
+            return
+        self.circuit_breaker.record_failure()
+        logging.warning(f"Failed exporting message to Mona: {result}")
+        self._handle_unexported_message(mona_message)
+
+    def _pop_spooled_message(self):
+        try:
+            return self._spool.popleft() if self._spool is not None else None
+        except IndexError:
+            return None
+
+    def _handle_failed_spooled_export(self, mona_message):
+        self.circuit_breaker.record_failure()
+        # Put it back, to keep the export order.
+        self._spool.appendleft(mona_message)
+
+    def _export_spooled_records(self, records):
+        """
+        Exports a batch of records from the disk spool in a single call if
+        Mona is healthy, returning whether they were all exported.
+        """
+        if not self.circuit_breaker.is_call_allowed():
+            return False
+        is_success, result = call_with_retries(
+            self.client.export_batch,
+            (
+                [
+                    self._get_mona_message(
+                        x["message"], x["context_id"], x["export_timestamp"]
+                    )
+                    for x in records
+                ],
+            ),
+            (),
+        )
+        # The batch result holds the number of messages that failed.
+        is_success = is_success and bool(result) and not result["failed"]
+        if is_success:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+        return is_success
+
     def log(self, message, context_id, export_timestamp):
         """
         Logs the given message to Mona.
         """
-        return self.client.export(
-            MonaSingleMessage(
-                message=message,
-                contextClass=self.context_class,
-                contextId=context_id,
-                exportTimestamp=export_timestamp,
-            )
+        self._ensure_spool_replayer()
+        mona_message = self._get_mona_message(
+            message, context_id, export_timestamp
+        )
+        if not self.circuit_breaker.is_call_allowed():
+            return self._handle_unexported_message(mona_message)
+        is_success, result = call_with_retries(
+            self.client.export, (mona_message,), self._get_backoff_delays()
         )
+        self._handle_export_result(is_success, result, mona_message)
+        if is_success:
+            self._export_spooled_messages()
+            return result
+
+    def _export_spooled_messages(self):
+        # Spooled messages are exported without retries, stopping at the
+        # first failure.
+        for _ in range(self._max_spooled_exports_per_log):
+            if self.circuit_breaker.is_open:
+                return
+            mona_message = self._pop_spooled_message()
+            if mona_message is None:
+                return
+            is_success, _ = call_with_retries(
+                self.client.export, (mona_message,), ()
+            )
+            if not is_success:
+                return self._handle_failed_spooled_export(mona_message)
 
     async def alog(self, message, context_id, export_timestamp):
         """
         Async logs the given message to Mona.
         """
-        return await self.async_client.export_async(
-            MonaSingleMessage(
-                message=message,
-                contextClass=self.context_class,
-                contextId=context_id,
-                exportTimestamp=export_timestamp,
-            )
+        self._ensure_spool_replayer()
+        mona_message = self._get_mona_message(
+            message, context_id, export_timestamp
+        )
+        if not self.circuit_breaker.is_call_allowed():
+            return self._handle_unexported_message(mona_message)
+        is_success, result = await acall_with_retries(
+            self.async_client.export_async,
+            (mona_message,),
+            self._get_backoff_delays(),
         )
+        self._handle_export_result(is_success, result, mona_message)
+        if is_success:
+            await self._aexport_spooled_messages()
+            return result
+
+    async def _aexport_spooled_messages(self):
+        for _ in range(self._max_spooled_exports_per_log):
+            if self.circuit_breaker.is_open:
+                return
+            mona_message = self._pop_spooled_message()
+            if mona_message is None:
+                return
+            is_success, _ = await acall_with_retries(
+                self.async_client.export_async, (mona_message,), ()
+            )
+            if not is_success:
+                return self._handle_failed_spooled_export(mona_message)
@@ -0,0 +1,309 @@
+from .logger import Logger
+from collections import deque
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1
+DEFAULT_MAX_QUEUE_SIZE = 100000
+DEFAULT_QUERY_LIMIT = 100
+RETENTION_CHECK_INTERVAL_SECONDS = 60
+
+_TABLE_NAME = "mona_messages"
+
+# Columns extracted from each message to allow fast local queries. The full
+# message is kept as JSON as well.
+_SCALAR_COLUMNS = (
+    ("logged_time", "REAL"),
+    ("export_timestamp", "REAL"),
+    ("context_id", "TEXT"),
+    ("api_name", "TEXT"),
+    ("model", "TEXT"),
+    ("latency", "REAL"),
+    ("stream_start_latency", "REAL"),
+    ("is_exception", "INTEGER"),
+    ("prompt_tokens", "INTEGER"),
+    ("completion_tokens", "INTEGER"),
+    ("total_tokens", "INTEGER"),
+)
+_INDEXED_COLUMNS = (
+    "logged_time",
+    "context_id",
+    "model",
+    "latency",
+    "is_exception",
+)
+_COLUMN_NAMES = tuple(x for x, _ in _SCALAR_COLUMNS) + ("message",)
+
+_INSERT_STATEMENT = (
+    f"INSERT INTO {_TABLE_NAME} ({', '.join(_COLUMN_NAMES)}) "
+    f"VALUES ({', '.join('?' * len(_COLUMN_NAMES))})"
+)
+
+
+def _get_row(message, context_id, export_timestamp, logged_time):
+    fields = message if isinstance(message, dict) else {}
+    response = fields.get("response") or {}
+    request_input = fields.get("input") or {}
+    usage = response.get("usage") or {}
+    return (
+        logged_time,
+        export_timestamp
+        if isinstance(export_timestamp, (int, float))
+        else None,
+        context_id,
+        fields.get("api_name"),
+        response.get("model") or request_input.get("model"),
+        fields.get("latency"),
+        fields.get("stream_start_latency"),
+        fields.get("is_exception"),
+        usage.get("prompt_tokens"),
+        usage.get("completion_tokens"),
+        usage.get("total_tokens"),
+        json.dumps(message),
+    )
+
+
+def _connect(database_path):
+    connection = sqlite3.connect(database_path)
+    # WAL lets queries read while the writer thread writes, and with it
+    # "NORMAL" sync is safe from corruption and much faster than "FULL".
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SQLiteLogger(Logger):
+    """
+    A logging class that saves monitored data in a local SQLite database,
+    for querying recent calls (e.g., when debugging) without exporting them
+    anywhere.
+
+    "log" only queues the message. A background writer thread inserts the
+    queued messages in batched transactions (of up to batch_size messages),
+    whenever batch_size messages are queued or every flush_interval_seconds,
+    and on exit. Up to max_queue_size messages are queued, after which new
+    messages are dropped (counted in self.dropped_count).
+
+    The latency, stream start latency, token counts, model, api name,
+    exception flag, context id and timestamps are saved in (partly indexed)
+    columns, along with the full message as JSON. Messages logged more than
+    retention_seconds ago are deleted periodically.
+
+    Use "query" to read saved messages.
+    """
+
+    def __init__(
+        self,
+        database_path,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval_seconds=DEFAULT_FLUSH_INTERVAL_SECONDS,
+        max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+        retention_seconds=None,
+    ):
+        self.database_path = database_path
+        self.dropped_count = 0
+        self._batch_size = batch_size
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_queue_size = max_queue_size
+        self._retention_seconds = retention_seconds
+        self._last_retention_time = None
+        self._queue = deque()
+        self._wake_event = threading.Event()
+        self._is_writing = False
+        self._idle_condition = threading.Condition()
+        self._is_closed = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._pid = os.getpid()
+
+        self._create_table()
+        atexit.register(self.close)
+
+    def _create_table(self):
+        connection = _connect(self.database_path)
+        with connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {_TABLE_NAME} ("
+                "id INTEGER PRIMARY KEY, "
+                + ", ".join(f"{name} {type}" for name, type in _SCALAR_COLUMNS)
+                + ", message TEXT)"
+            )
+            for column in _INDEXED_COLUMNS:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_TABLE_NAME}_{column} "
+                    f"ON {_TABLE_NAME} ({column})"
+                )
+        connection.close()
+
+    def _ensure_thread(self):
+        # The thread is (re)started lazily, since threads don't survive
+        # forking (e.g., in pre-forking web servers).
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._pid != os.getpid():
+                # Forked: the queued messages are the parent's to write.
+                self._pid = os.getpid()
+                self._queue.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._write_queued_messages,
+                    name="MonaSQLiteLogger",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _write_batch(self, connection):
+        with self._idle_condition:
+            self._is_writing = True
+        rows = []
+        while self._queue and len(rows) < self._batch_size:
+            rows.append(self._queue.popleft())
+        try:
+            with connection:
+                connection.executemany(_INSERT_STATEMENT, rows)
+        finally:
+            with self._idle_condition:
+                self._is_writing = False
+                self._idle_condition.notify_all()
+
+    def _delete_old_messages(self, connection):
+        now = time.time()
+        if self._retention_seconds is None or (
+            self._last_retention_time is not None
+            and now - self._last_retention_time
+            < RETENTION_CHECK_INTERVAL_SECONDS
+        ):
+            return
+        self._last_retention_time = now
+        with connection:
+            connection.execute(
+                f"DELETE FROM {_TABLE_NAME} WHERE logged_time < ?",
+                (now - self._retention_seconds,),
+            )
+
+    def _write_queued_messages(self):
+        connection = _connect(self.database_path)
+        while True:
+            self._wake_event.wait(self._flush_interval_seconds)
+            self._wake_event.clear()
+            try:
+                while self._queue:
+                    self._write_batch(connection)
+                self._delete_old_messages(connection)
+            except Exception:
+                logging.exception("Failed writing messages to SQLite")
+            if self._is_closed and not self._queue:
+                connection.close()
+                return
+
+    def log(self, message: dict, context_id=None, export_timestamp=None):
+        """
+        Queues the given message to be written to the database.
+        """
+        if len(self._queue) >= self._max_queue_size:
+            self.dropped_count += 1
+            return
+        self._queue.append(
+            _get_row(message, context_id, export_timestamp, time.time())
+        )
+        self._ensure_thread()
+        if len(self._queue) >= self._batch_size:
+            self._wake_event.set()
+
+    async def alog(
+        self, message: dict, context_id=None, export_timestamp=None
+    ):
+        # Queuing never blocks, so there's no need to leave the event loop.
+        self.log(message, context_id, export_timestamp)
+
+    def flush(self, timeout=None):
+        """
+        Waits until all queued messages are written, or until the given
+        timeout (in seconds) passes. Returns whether all messages were
+        written.
+        """
+        self._wake_event.set()
+        with self._idle_condition:
+            return self._idle_condition.wait_for(
+                lambda: not self._queue and not self._is_writing, timeout
+            )
+
+    def close(self):
+        """
+        Writes the queued messages and stops the writer thread.
+        """
+        if self._is_closed:
+            return
+        self._is_closed = True
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def query(
+        self,
+        context_id=None,
+        model=None,
+        api_name=None,
+        is_exception=None,
+        min_latency=None,
+        since=None,
+        until=None,
+        limit=DEFAULT_QUERY_LIMIT,
+    ):
+        """
+        Returns a list of up to "limit" saved messages matching all the
+        given filters, newest first. "since" and "until" are logging times
+        (as given by time.time()). Each message is returned as a dict with
+        the message itself, the context id, export timestamp and logging
+        time.
+
+        Queued messages aren't returned until written; call "flush" first
+        to include them.
+        """
+        conditions = []
+        params = []
+        for column, value in (
+            ("context_id", context_id),
+            ("model", model),
+            ("api_name", api_name),
+            ("is_exception", is_exception),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        for condition, value in (
+            ("latency >= ?", min_latency),
+            ("logged_time >= ?", since),
+            ("logged_time < ?", until),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+        connection = sqlite3.connect(self.database_path)
+        try:
+            rows = connection.execute(
+                f"SELECT message, context_id, export_timestamp, logged_time "
+                f"FROM {_TABLE_NAME} {where}"
+                "ORDER BY logged_time DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        finally:
+            connection.close()
+        return [
+            {
+                "message": json.loads(message),
+                "context_id": context_id,
+                "export_timestamp": export_timestamp,
+                "logged_time": logged_time,
+            }
+            for message, context_id, export_timestamp, logged_time in rows
+        ]
@@ -8,6 +8,10 @@ from .endpoints.wrapping_getter import get_endpoint_wrapping
 from .loggers.mona_logger.mona_client import get_mona_clients
 from .util.func_util import add_conditional_sampling
 from .util.async_util import (
+    DEFAULT_BACKGROUND_CONCURRENCY,
+    DEFAULT_BACKGROUND_MAX_PENDING,
+    BackgroundTasks,
+    drain_background_tasks,
     run_in_an_event_loop,
     call_non_blocking_sync_or_async,
 )
@@ -22,6 +26,7 @@ MONA_ARGS_PREFIX = "MONA_"
 CONTEXT_ID_ARG_NAME = MONA_ARGS_PREFIX + "context_id"
 EXPORT_TIMESTAMP_ARG_NAME = MONA_ARGS_PREFIX + "export_timestamp"
 ADDITIONAL_DATA_ARG_NAME = MONA_ARGS_PREFIX + "additional_data"
+PRECOMPUTED_ANALYSIS_ARG_NAME = MONA_ARGS_PREFIX + "precomputed_analysis"
 
 
 def _get_logging_message(
@@ -35,6 +40,7 @@ def _get_logging_message(
     analysis_getter,
     message_cleaner,
     additional_data,
+    precomputed_analysis=None,
 ):
     """
     Returns a dict object containing all the monitoring analysis to be used
@@ -57,11 +63,24 @@ def _get_logging_message(
 
     if response:
         message["response"] = response
-        message["analysis"] = analysis_getter(request_input, response)
+        message["analysis"] = analysis_getter(
+            request_input, response, additional_data, precomputed_analysis
+        )
 
     return message_cleaner(message)
 
 
+def _merge_analyses(analysis, other_analysis):
+    """
+    Returns a dict with the fields of both given analysis dicts for each
+    analysis type, preferring the second's fields.
+    """
+    return {
+        x: {**analysis.get(x, {}), **other_analysis.get(x, {})}
+        for x in {**analysis, **other_analysis}
+    }
+
+
 # TODO(itai): Consider creating some sturct (as NamedTuple or dataclass) for
 #   the specs param.
 
@@ -128,6 +147,10 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
         MONA_export_timestamp: Can be used to simulate as if the
             current call was made in a different time, as far as Mona
             is concerned.
+        MONA_precomputed_analysis: A dict mapping analysis types to dicts
+            of analysis fields that are already known (e.g., from OpenAI's
+            moderation endpoint), which are logged as is instead of being
+            calculated locally.
 
     Args:
         openai_class: An OpenAI API class to wrap with monitoring
@@ -139,6 +162,22 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
 
     sampling_ratio = validate_and_get_sampling_ratio(specs)
 
+    # Async logging is done in background tasks if requested.
+    background_tasks = (
+        BackgroundTasks(
+            specs.get(
+                "background_logging_concurrency",
+                DEFAULT_BACKGROUND_CONCURRENCY,
+            ),
+            specs.get(
+                "background_logging_max_pending",
+                DEFAULT_BACKGROUND_MAX_PENDING,
+            ),
+        )
+        if specs.get("background_async_logging", False)
+        else None
+    )
+
     base_class = get_endpoint_wrapping(
         openai_class.__name__, specs
     ).wrap_class(openai_class)
@@ -187,6 +226,9 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
                 analysis_getter=super()._get_full_analysis,
                 message_cleaner=super()._get_clean_message,
                 additional_data=kwargs_param.get(ADDITIONAL_DATA_ARG_NAME),
+                precomputed_analysis=kwargs_param.get(
+                    PRECOMPUTED_ANALYSIS_ARG_NAME
+                ),
             )
 
         @classmethod
@@ -210,29 +252,51 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
             stream_start_time = None
 
             async def _inner_log_message(is_exception):
-                return await call_non_blocking_sync_or_async(
-                    export_function,
-                    (
-                        cls._get_logging_message(
-                            kwargs,
-                            start_time,
-                            is_exception,
-                            is_async,
-                            stream_start_time,
-                            response,
-                        ),
-                        kwargs.get(
-                            CONTEXT_ID_ARG_NAME,
-                            response["id"] if response else None,
-                        ),
-                        kwargs.get(EXPORT_TIMESTAMP_ARG_NAME, start_time),
+                export_args = (
+                    cls._get_logging_message(
+                        kwargs,
+                        start_time,
+                        is_exception,
+                        is_async,
+                        stream_start_time,
+                        response,
+                    ),
+                    kwargs.get(
+                        CONTEXT_ID_ARG_NAME,
+                        response["id"] if response else None,
                     ),
+                    kwargs.get(EXPORT_TIMESTAMP_ARG_NAME, start_time),
+                )
+                # Sync calls run in their own short-lived event loop, which
+                # would cancel any leftover background task.
+                if is_async and background_tasks is not None:
+                    background_tasks.schedule(
+                        call_non_blocking_sync_or_async(
+                            export_function, export_args
+                        )
+                    )
+                    return
+                return await call_non_blocking_sync_or_async(
+                    export_function, export_args
                 )
 
-            log_message = add_conditional_sampling(
+            sampled_log_message = add_conditional_sampling(
                 _inner_log_message, sampling_ratio
             )
 
+            async def log_message(is_exception):
+                # Metrics are tracked for all calls, regardless of sampling.
+                if not is_exception:
+                    base_class._add_call_metrics(
+                        kwargs,
+                        response,
+                        time.time() - start_time,
+                        stream_start_time - start_time
+                        if stream_start_time is not None
+                        else None,
+                    )
+                return await sampled_log_message(is_exception)
+
             start_time = time.time()
 
             async def inner_super_function():
@@ -300,6 +364,19 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
                 await inner_handle_exception()
                 raise
 
+        @classmethod
+        def get_background_dropped_count(cls):
+            """
+            Returns the number of messages that weren't logged since too
+            many were already pending in background tasks (see the
+            "background_logging_max_pending" spec).
+            """
+            return (
+                background_tasks.dropped_count
+                if background_tasks is not None
+                else 0
+            )
+
         @classmethod
         def create(cls, *args, **kwargs):
             """
@@ -323,6 +400,18 @@ def monitor_with_logger(openai_class, logger, specs=EMPTY_DICT):
     return type(base_class.__name__, (MonitoredOpenAI,), {})
 
 
+async def monitor_drain(timeout=None):
+    """
+    Waits until all messages that are being logged in the background on the
+    running event loop (see the "background_async_logging" spec) are
+    logged, or until the given timeout (in seconds) passes. Call this when
+    shutting down an async application so no messages are lost.
+
+    Returns whether all messages were logged.
+    """
+    return await drain_background_tasks(timeout)
+
+
 def get_rest_monitor(
     openai_endpoint_name,
     mona_creds,
@@ -376,6 +465,7 @@ def get_rest_monitor_with_logger(
             additional_data=EMPTY_DICT,
             context_id=None,
             export_timestamp=None,
+            precomputed_analysis=None,
         ):
             """
             Actual logic for logging requests, responses and exceptions.
@@ -385,8 +475,14 @@ def get_rest_monitor_with_logger(
             if additional_data is None:
                 additional_data = EMPTY_DICT
 
+            if precomputed_analysis is None:
+                precomputed_analysis = EMPTY_DICT
+
             def _inner_log_message(
-                is_exception, more_additional_data, response=None
+                is_exception,
+                more_additional_data,
+                response=None,
+                more_precomputed_analysis=EMPTY_DICT,
             ):
                 return message_logging_function(
                     _get_logging_message(
@@ -404,6 +500,9 @@ def get_rest_monitor_with_logger(
                             **additional_data,
                             **more_additional_data,
                         },
+                        precomputed_analysis=_merge_analyses(
+                            precomputed_analysis, more_precomputed_analysis
+                        ),
                     ),
                     context_id,
                     export_timestamp,
@@ -413,18 +512,30 @@ def get_rest_monitor_with_logger(
                 _inner_log_message, sampling_ratio
             )
 
-            def log_response(response, additional_data=EMPTY_DICT):
+            def log_response(
+                response,
+                additional_data=EMPTY_DICT,
+                precomputed_analysis=EMPTY_DICT,
+            ):
                 """
                 Only when this function is called, will data be logged
                 out. This function should be called with a
                 response object from the OpenAI API as close as
                 possible to when it is received to allow accurate
                 latency logging.
+
+                Analysis fields that are only known after the response is
+                received (e.g., the answers' moderation results) can be
+                given in precomputed_analysis.
                 """
+                wrapping_logic.add_call_metrics(
+                    request_dict, response, time.time() - start_time, None
+                )
                 return log_message(
                     False,
                     more_additional_data=additional_data,
                     response=response,
+                    more_precomputed_analysis=precomputed_analysis,
                 )
 
             def log_exception(additional_data=EMPTY_DICT):
@@ -439,6 +550,7 @@ def get_rest_monitor_with_logger(
             additional_data=None,
             context_id=None,
             export_timestamp=None,
+            precomputed_analysis=None,
         ):
             """
             Sets up logging for OpenAI request/response objects.
@@ -451,6 +563,12 @@ def get_rest_monitor_with_logger(
             response object, as well as an exception logging function in case
             of exceptions.
 
+            Analysis fields that are already known (e.g., from OpenAI's
+            moderation endpoint or an external PII service) can be given in
+            precomputed_analysis, a dict mapping analysis types to dicts of
+            fields. These are logged as is instead of being calculated
+            locally.
+
             Note that this call does not log anything until one of the
             returned callbacks is called.
             """
@@ -460,6 +578,7 @@ def get_rest_monitor_with_logger(
                 additional_data,
                 context_id,
                 export_timestamp,
+                precomputed_analysis,
             )
 
         @classmethod
@@ -469,6 +588,7 @@ def get_rest_monitor_with_logger(
             additional_data=None,
             context_id=None,
             export_timestamp=None,
+            precomputed_analysis=None,
         ):
             """
             Async version of "log_request". See function's docstring for more
@@ -480,8 +600,25 @@ def get_rest_monitor_with_logger(
                 additional_data,
                 context_id,
                 export_timestamp,
+                precomputed_analysis,
             )
 
+        @classmethod
+        def get_request_efficiency_stats(cls):
+            """
+            Returns the "request_efficiency" analysis stats and suggested
+            caps for each model and prompt template pair.
+            """
+            return wrapping_logic.get_request_efficiency_stats()
+
+        @classmethod
+        def get_call_metrics_tracker(cls):
+            """
+            Returns the tracker of the calls' latency and token metrics'
+            quantile sketches per model (see analysis/call_metrics.py).
+            """
+            return wrapping_logic.get_call_metrics_tracker()
+
     return RestClient
 
 
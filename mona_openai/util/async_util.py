@@ -1,8 +1,18 @@
-import nest_asyncio
 import asyncio
+import logging
+import threading
+import time
+import weakref
 from types import MappingProxyType
 from inspect import iscoroutinefunction
 
+DEFAULT_BACKGROUND_CONCURRENCY = 100
+DEFAULT_BACKGROUND_MAX_PENDING = 10000
+
+# All running background tasks (of all event loops), kept here so they
+# aren't garbage collected before they're done, and so they can be drained.
+_background_tasks = set()
+
 
 def run_in_an_event_loop(coroutine):
     """
@@ -19,6 +29,8 @@ def run_in_an_event_loop(coroutine):
             # This happens in environments that already have an event loop
             # that is "run forever". We therefor must allow a "nested" event
             # loop that we can run within the main loop.
+            import nest_asyncio
+
             nest_asyncio.apply()
             return asyncio.run(coroutine)
 
@@ -37,3 +49,90 @@ async def call_non_blocking_sync_or_async(
     if iscoroutinefunction(function):
         return await function(*func_args, **func_kwargs)
     return function(*func_args, **func_kwargs)
+
+
+def _on_background_task_done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Background task failed", exc_info=task.exception())
+
+
+class BackgroundTasks:
+    """
+    Runs coroutines as background tasks on the running event loop, with at
+    most the given number of them running concurrently (on each loop).
+
+    At most max_pending tasks (running or waiting to run) are kept on each
+    loop, so that a slow or failing logger can't hold an unbounded number
+    of messages in memory. Coroutines scheduled beyond that are dropped
+    (and counted in self.dropped_count).
+    """
+
+    def __init__(
+        self,
+        concurrency=DEFAULT_BACKGROUND_CONCURRENCY,
+        max_pending=DEFAULT_BACKGROUND_MAX_PENDING,
+    ):
+        self.dropped_count = 0
+        self._concurrency = concurrency
+        self._max_pending = max_pending
+        # asyncio semaphores are bound to a single event loop.
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._pending_counts = weakref.WeakKeyDictionary()
+        # Different loops may run on different threads.
+        self._dropped_count_lock = threading.Lock()
+
+    def _get_semaphore(self, loop):
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self._concurrency)
+        return self._semaphores[loop]
+
+    def schedule(self, coroutine):
+        """
+        Schedules the given coroutine to run in the background and returns
+        its task, or None if there are already max_pending tasks and the
+        coroutine was dropped.
+        """
+        loop = asyncio.get_running_loop()
+        pending_count = self._pending_counts.get(loop, 0)
+        if pending_count >= self._max_pending:
+            with self._dropped_count_lock:
+                self.dropped_count += 1
+            # Avoids a "never awaited" warning.
+            coroutine.close()
+            return None
+        self._pending_counts[loop] = pending_count + 1
+        semaphore = self._get_semaphore(loop)
+
+        async def run_with_semaphore():
+            async with semaphore:
+                return await coroutine
+
+        def on_done(task):
+            self._pending_counts[loop] -= 1
+
+        task = loop.create_task(run_with_semaphore())
+        _background_tasks.add(task)
+        task.add_done_callback(_on_background_task_done)
+        task.add_done_callback(on_done)
+        return task
+
+
+async def drain_background_tasks(timeout=None):
+    """
+    Waits until all background tasks of the running event loop are done
+    (including ones scheduled while waiting), or until the given timeout
+    (in seconds) passes. Returns whether all tasks are done.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        tasks = {x for x in _background_tasks if x.get_loop() is loop}
+        if not tasks:
+            return True
+        remaining_time = (
+            None if deadline is None else deadline - time.monotonic()
+        )
+        if remaining_time is not None and remaining_time <= 0:
+            return False
+        await asyncio.wait(tasks, timeout=remaining_time)
@@ -0,0 +1,174 @@
+"""
+A utility module for estimating quantiles of streams of numbers in fixed
+memory.
+
+QuantileSketch is a KLL sketch: values are kept in a hierarchy of
+"compactors", where each value in level h stands for 2**h original values.
+When a level is full, it is sorted and every other value (starting from a
+random offset) is promoted to the next level, and the rest are dropped.
+Lower levels get exponentially smaller capacities, so the sketch holds
+O(k * log(n / k)) values, with a rank error of about 1.7 / k.
+
+Sketches of the same k can be merged (e.g., sketches from different
+processes), and the result is as accurate as a single sketch of all the
+values.
+"""
+import math
+import random
+
+DEFAULT_K = 200
+_CAPACITY_DECAY = 2 / 3
+_MIN_CAPACITY = 2
+
+
+class QuantileSketch:
+    """
+    A mergeable, fixed-memory sketch of a stream of numbers that estimates
+    their quantiles, along with their exact count, min and max.
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._compactors = [[]]
+        self._max_size = self._get_capacity(0)
+        self._random = random.Random()
+
+    def __len__(self):
+        return self.count
+
+    def _get_capacity(self, level):
+        height = len(self._compactors) - level - 1
+        return max(
+            _MIN_CAPACITY, math.ceil(self.k * _CAPACITY_DECAY**height)
+        )
+
+    def _get_size(self):
+        return sum(len(x) for x in self._compactors)
+
+    def _grow(self):
+        self._compactors.append([])
+        self._max_size = sum(
+            self._get_capacity(level)
+            for level in range(len(self._compactors))
+        )
+
+    def _compact(self, level):
+        compactor = self._compactors[level]
+        if level + 1 == len(self._compactors):
+            self._grow()
+        compactor.sort()
+        # With an odd number of values, one stays in this level.
+        leftover = [compactor.pop()] if len(compactor) % 2 else []
+        self._compactors[level + 1].extend(
+            compactor[self._random.randint(0, 1)::2]
+        )
+        self._compactors[level] = leftover
+
+    def _compress(self):
+        while self._get_size() >= self._max_size:
+            for level in range(len(self._compactors)):
+                if len(self._compactors[level]) >= self._get_capacity(level):
+                    self._compact(level)
+                    break
+
+    def add(self, value):
+        """
+        Adds the given number to the sketch.
+        """
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._compactors[0].append(value)
+        if len(self._compactors[0]) >= self._get_capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        """
+        Adds all the values of the given sketch to this sketch.
+        """
+        if other.count == 0:
+            return
+        while len(self._compactors) < len(other._compactors):
+            self._grow()
+        for level, compactor in enumerate(other._compactors):
+            self._compactors[level].extend(compactor)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _get_weighted_values(self):
+        return sorted(
+            (value, 2**level)
+            for level, compactor in enumerate(self._compactors)
+            for value in compactor
+        )
+
+    def get_quantiles(self, quantiles):
+        """
+        Returns a tuple with the estimated value of each of the given
+        quantiles (numbers between 0 and 1), or None for all if the sketch
+        is empty.
+        """
+        if self.count == 0:
+            return tuple(None for _ in quantiles)
+
+        weighted_values = self._get_weighted_values()
+        total_weight = sum(weight for _, weight in weighted_values)
+        ret = []
+        for quantile in quantiles:
+            if quantile <= 0:
+                ret.append(self.min)
+                continue
+            if quantile >= 1:
+                ret.append(self.max)
+                continue
+            target_weight = quantile * total_weight
+            cumulative_weight = 0
+            for value, weight in weighted_values:
+                cumulative_weight += weight
+                if cumulative_weight >= target_weight:
+                    ret.append(value)
+                    break
+        return tuple(ret)
+
+    def get_quantile(self, quantile):
+        """
+        Returns the estimated value of the given quantile (a number between
+        0 and 1), or None if the sketch is empty.
+        """
+        return self.get_quantiles((quantile,))[0]
+
+    def to_dict(self):
+        """
+        Returns a JSON serializable dict representation of the sketch, to be
+        loaded (e.g., in another process) using from_dict.
+        """
+        return {
+            "k": self.k,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "compactors": [list(x) for x in self._compactors],
+        }
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        """
+        Returns a sketch from a dict created by to_dict.
+        """
+        sketch = cls(sketch_dict["k"])
+        sketch.count = sketch_dict["count"]
+        sketch.min = sketch_dict["min"]
+        sketch.max = sketch_dict["max"]
+        sketch._compactors = [list(x) for x in sketch_dict["compactors"]]
+        sketch._max_size = sum(
+            sketch._get_capacity(level)
+            for level in range(len(sketch._compactors))
+        )
+        return sketch
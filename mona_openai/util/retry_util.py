@@ -0,0 +1,131 @@
+"""
+A utility module for calling unreliable functions (e.g., exporting data to
+a remote backend) with retries and a circuit breaker.
+"""
+import asyncio
+import random
+import threading
+import time
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BASE_DELAY_SECONDS = 0.1
+DEFAULT_MAX_DELAY_SECONDS = 2
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOL_DOWN_SECONDS = 30
+
+
+def get_backoff_delays(max_retries, base_delay_seconds, max_delay_seconds):
+    """
+    Returns a tuple of the delays (in seconds) to wait before each retry,
+    growing exponentially up to max_delay_seconds, with "full jitter" (a
+    random delay up to that value) so that many clients failing together
+    don't retry together.
+    """
+    return tuple(
+        random.uniform(
+            0, min(max_delay_seconds, base_delay_seconds * 2**attempt)
+        )
+        for attempt in range(max_retries)
+    )
+
+
+def _is_failed_result(result):
+    # Some clients report failures by returning False instead of raising.
+    return result is False
+
+
+def call_with_retries(function, args, backoff_delays):
+    """
+    Calls the given function with the given args until it succeeds (doesn't
+    raise an exception or return False), retrying after each of the given
+    delays.
+
+    Returns a pair of whether the call succeeded and the function's last
+    result (or raised exception).
+    """
+    for delay in (*backoff_delays, None):
+        try:
+            result = function(*args)
+            if not _is_failed_result(result):
+                return True, result
+        except Exception as e:
+            result = e
+        if delay is not None:
+            time.sleep(delay)
+    return False, result
+
+
+async def acall_with_retries(function, args, backoff_delays):
+    """
+    Async version of call_with_retries for coroutine functions.
+    """
+    for delay in (*backoff_delays, None):
+        try:
+            result = await function(*args)
+            if not _is_failed_result(result):
+                return True, result
+        except Exception as e:
+            result = e
+        if delay is not None:
+            await asyncio.sleep(delay)
+    return False, result
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker. After failure_threshold consecutive
+    failures the circuit "opens" and calls aren't allowed for
+    cool_down_seconds. Then, a single probe call is allowed: if it succeeds
+    the circuit closes again, and otherwise it stays open for another
+    cool down window.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        cool_down_seconds=DEFAULT_COOL_DOWN_SECONDS,
+    ):
+        self._failure_threshold = failure_threshold
+        self._cool_down_seconds = cool_down_seconds
+        self._failures_count = 0
+        self._opened_time = None
+        self._is_probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_time is not None
+
+    def is_call_allowed(self):
+        """
+        Returns whether a call should be made now. When the cool down window
+        is over, this returns True only for a single probe call until its
+        result is recorded.
+        """
+        with self._lock:
+            if self._opened_time is None:
+                return True
+            if (
+                self._is_probing
+                or time.monotonic() - self._opened_time
+                < self._cool_down_seconds
+            ):
+                return False
+            self._is_probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures_count = 0
+            self._opened_time = None
+            self._is_probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures_count += 1
+            if (
+                self._is_probing
+                or self._failures_count >= self._failure_threshold
+            ):
+                self._opened_time = time.monotonic()
+            self._is_probing = False
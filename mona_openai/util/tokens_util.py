@@ -1,14 +1,20 @@
 """
 A utility module for everything realted to encoding tokens.
 """
-import tiktoken
+from functools import lru_cache
+
+_DETOKENIZE_CACHE_SIZE = 1024
 
 
 def _get_number_of_tokens(text, enc):
-    return len(enc.encode(text))
+    # Pre-tokenized prompts are given as lists of token ids.
+    return len(enc.encode(text)) if isinstance(text, str) else len(text)
 
 
 def _get_encoding(model):
+    # Imported here so that tiktoken is only loaded when actually used.
+    import tiktoken
+
     return tiktoken.encoding_for_model(model)
 
 
@@ -29,3 +35,25 @@ def get_usage(model, prompt_texts, response_texts):
     usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
 
     return usage
+
+
+def tokenize(model, text):
+    """
+    Returns the token ids of the given text using the given model's
+    encoding.
+    """
+    return _get_encoding(model).encode(text)
+
+
+@lru_cache(maxsize=_DETOKENIZE_CACHE_SIZE)
+def _detokenize(model, tokens):
+    return _get_encoding(model).decode(list(tokens))
+
+
+def detokenize(model, tokens):
+    """
+    Returns the text for the given token ids using the given model's
+    encoding. Results are cached, so repeated prompts (e.g., the same
+    pre-tokenized template) are only decoded once.
+    """
+    return _detokenize(model, tuple(tokens))
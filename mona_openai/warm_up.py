@@ -0,0 +1,97 @@
+"""
+Logic for eagerly loading everything monitored calls need, so that the first
+monitored call in a fresh process isn't slower than the rest.
+
+Models, tokenizers and other resources are loaded lazily on first use and
+cached for the lifetime of the process, so calling warm_up (e.g., from a
+post-fork hook of a pre-forking web server) moves that cost out of the
+first served request.
+"""
+import time
+from types import MappingProxyType
+
+from .analysis.keywords import get_keyword_matcher
+from .analysis.privacy import get_privacy_analyzers
+from .analysis.profanity import get_profanity_prob, get_specs_profanity_model
+from .analysis.registry import get_registered_analyzers
+from .endpoints.endpoint_wrapping import is_analysis_enabled
+from .util.tokens_util import get_usage
+
+EMPTY_DICT = MappingProxyType({})
+
+# Includes a phone number and an email so that all privacy matching logic
+# (and the lazily loaded metadata it needs) is exercised.
+_WARM_UP_TEXT = "Warm up text, call +1 650-253-0000 or mail to me@example.com"
+
+
+def _warm_up_privacy():
+    (analyzer,) = get_privacy_analyzers((_WARM_UP_TEXT,))
+    analyzer.get_phone_numbers_count()
+    analyzer.get_emails_count()
+
+
+def _get_warm_up_steps(specs, models):
+    """
+    Returns a tuple of (step name, function) pairs for all the warm up steps
+    needed for the given specs and models.
+    """
+    steps = []
+    if is_analysis_enabled(specs, "profanity"):
+        steps.append(
+            (
+                "profanity",
+                lambda: get_profanity_prob(
+                    (_WARM_UP_TEXT,), get_specs_profanity_model(specs)
+                ),
+            )
+        )
+    if is_analysis_enabled(specs, "privacy"):
+        steps.append(("privacy", _warm_up_privacy))
+    if specs.get("keywords"):
+        steps.append(
+            ("keywords", lambda: get_keyword_matcher(specs["keywords"]))
+        )
+    for analyzer in get_registered_analyzers():
+        if is_analysis_enabled(
+            specs, analyzer.name, analyzer.enabled_by_default
+        ):
+            steps.append(
+                (
+                    f"analyzer:{analyzer.name}",
+                    lambda analyzer=analyzer: analyzer.batch_function(
+                        (_WARM_UP_TEXT,)
+                    ),
+                )
+            )
+    # Tokenizers are used to calculate the usage of stream responses.
+    for model in models:
+        steps.append(
+            (
+                f"tokenizer:{model}",
+                lambda model=model: get_usage(model, (_WARM_UP_TEXT,), ()),
+            )
+        )
+    return tuple(steps)
+
+
+def warm_up(specs=EMPTY_DICT, models=()):
+    """
+    Eagerly loads everything that monitored calls with the given specs and
+    OpenAI models will need: the profanity model, privacy matchers' data,
+    keyword automatons, registered analyzers and the models' tokenizers.
+
+    Returns a dict mapping each warm up step name to the number of seconds
+    it took.
+
+    Args:
+        specs: The same specs dictionary given when creating the monitored
+            class.
+        models: The OpenAI model names that will be used (e.g.,
+            ["gpt-3.5-turbo"]), whose tokenizers should be loaded.
+    """
+    ret = {}
+    for name, step in _get_warm_up_steps(specs, models):
+        start_time = time.perf_counter()
+        step()
+        ret[name] = time.perf_counter() - start_time
+    return ret
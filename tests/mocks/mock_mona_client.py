@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 from deepdiff import DeepDiff
 from mona_sdk.client import Client
 
@@ -87,3 +90,70 @@ def get_mock_mona_clients_getter(
         ), _get_mock_mona_client(async_expected_export_messages)
 
     return mock_get_mona_client
+
+
+def get_flaky_mona_clients_getter(failures, latency_seconds=0):
+    """
+    Returns a getter function for a pair of stand-in "sync" and "async"
+    Mona clients, which take the given latency on each export and fail the
+    exports whose index (counting all exports of both clients) is in the
+    given failures dict, either by raising the mapped exception or by
+    returning False if it's mapped to False (batch exports then report all
+    their messages as failed). Exported messages and their
+    export timestamps are kept in the clients' "exported_messages" and
+    "exported_timestamps" lists.
+    """
+
+    class FlakyMonaClient(Client):
+        def __init__(
+            self, exported_messages, exported_timestamps, exports_count
+        ):
+            self.exported_messages = exported_messages
+            self.exported_timestamps = exported_timestamps
+            self._exports_count = exports_count
+
+        def create_openai_context_class(self, context_class, openai_api_type):
+            return {}
+
+        def _export_messages(self, messages):
+            export_index = self._exports_count[0]
+            self._exports_count[0] += 1
+            failure = failures.get(export_index)
+            if isinstance(failure, Exception):
+                raise failure
+            if failure is False:
+                return False
+            for message in messages:
+                self.exported_messages.append(message.message)
+                self.exported_timestamps.append(message.exportTimestamp)
+            return True
+
+        def _export(self, message):
+            return self._export_messages((message,))
+
+        def export(self, message, filter_none_fields=None):
+            time.sleep(latency_seconds)
+            return self._export(message)
+
+        def export_batch(
+            self, events, default_action=None, filter_none_fields=None
+        ):
+            # Counted as a single export.
+            time.sleep(latency_seconds)
+            failed = 0 if self._export_messages(events) else len(events)
+            return {
+                "total": len(events),
+                "sent": len(events) - failed,
+                "failed": failed,
+                "failure_reason": {},
+            }
+
+        async def export_async(self, message, filter_none_fields=None):
+            await asyncio.sleep(latency_seconds)
+            return self._export(message)
+
+    def flaky_get_mona_clients(creds):
+        shared_state = ([], [], [0])
+        return FlakyMonaClient(*shared_state), FlakyMonaClient(*shared_state)
+
+    return flaky_get_mona_clients
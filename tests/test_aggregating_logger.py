@@ -0,0 +1,231 @@
+"""
+Tests for the windowed aggregating logger.
+"""
+import asyncio
+import os
+import socket
+import time
+
+from mona_openai.loggers import AggregatingLogger, InMemoryLogger
+
+
+def _get_message(
+    latency,
+    model="text-davinci-003",
+    template_id=None,
+    customer_id=None,
+    is_exception=False,
+):
+    message = {
+        "input": {"model": model, "prompt": "prompt"},
+        "latency": latency,
+        "stream_start_latency": None,
+        "is_exception": is_exception,
+        "api_name": "Completion",
+        "is_async": False,
+        "additional_data": {
+            "template_id": template_id,
+            "customer_id": customer_id,
+        },
+    }
+    if not is_exception:
+        message["response"] = {
+            "model": model,
+            "usage": {
+                "prompt_tokens": 5,
+                "completion_tokens": 7,
+                "total_tokens": 12,
+            },
+        }
+        message["analysis"] = {
+            "textual": {"answer_words_count": (3, 5)},
+            "profanity": {"has_profanity": (False, True)},
+        }
+    return message
+
+
+_CONTEXT_ID_PREFIX = f"summary:{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_summaries(logger):
+    return [x["message"] for x in logger.latest_messages]
+
+
+def test_summary_fields():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream, window_seconds=60)
+    now = time.time()
+    logger.log(_get_message(1), "a", now)
+    logger.log(_get_message(3), "b", now)
+    assert _get_summaries(downstream) == []
+    logger.flush()
+
+    (summary,) = downstream.latest_messages
+    window_start = now - now % 60
+    assert summary["export_timestamp"] == window_start
+    assert summary["context_id"] == (
+        f"{_CONTEXT_ID_PREFIX}:{window_start}:text-davinci-003:Completion:None"
+    )
+    message = summary["message"]
+    assert message["host"] == socket.gethostname()
+    assert message["pid"] == os.getpid()
+    assert message["window_start"] == window_start
+    assert message["window_seconds"] == 60
+    assert message["model"] == "text-davinci-003"
+    assert message["api_name"] == "Completion"
+    assert message["template_id"] is None
+    assert message["count"] == 2
+    assert message["exception_count"] == 0
+    assert "additional_data" not in message
+    assert message["fields"]["latency"] == {
+        "count": 2,
+        "sum": 4,
+        "mean": 2,
+        "min": 1,
+        "max": 3,
+        "histogram": {"1": 1, "4": 1},
+    }
+    assert "stream_start_latency" not in message["fields"]
+    assert message["fields"]["total_tokens"]["sum"] == 24
+    # Each choice is counted.
+    assert message["fields"]["textual.answer_words_count"]["count"] == 4
+    assert message["fields"]["profanity.has_profanity"]["mean"] == 0.5
+
+
+def test_groups():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(
+        downstream, group_by_additional_data_keys=("customer_id",)
+    )
+    now = time.time()
+    logger.log(_get_message(1, template_id="t1", customer_id="c1"), None, now)
+    logger.log(_get_message(1, template_id="t1", customer_id="c2"), None, now)
+    logger.log(_get_message(1, template_id="t2", customer_id="c1"), None, now)
+    logger.log(_get_message(1, model="gpt-4", customer_id="c1"), None, now)
+    logger.log(_get_message(1, template_id="t1", customer_id="c1"), None, now)
+    logger.flush()
+
+    groups = {
+        (
+            x["model"],
+            x["template_id"],
+            x["additional_data"]["customer_id"],
+        ): x["count"]
+        for x in _get_summaries(downstream)
+    }
+    assert groups == {
+        ("text-davinci-003", "t1", "c1"): 2,
+        ("text-davinci-003", "t1", "c2"): 1,
+        ("text-davinci-003", "t2", "c1"): 1,
+        ("gpt-4", None, "c1"): 1,
+    }
+
+
+def test_past_windows_are_logged_on_next_message():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream, window_seconds=60)
+    now = time.time()
+    logger.log(_get_message(1), None, now - 120)
+    logger.log(_get_message(2), None, now - 120)
+    assert _get_summaries(downstream) == []
+    logger.log(_get_message(3), None, now)
+    assert [x["count"] for x in _get_summaries(downstream)] == [2]
+    logger.flush()
+    assert [x["count"] for x in _get_summaries(downstream)] == [2, 1]
+
+
+def test_out_of_order_timestamps():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(
+        downstream, window_seconds=60, allowed_lateness_seconds=10
+    )
+    logger.log(_get_message(1), None, 119.0)
+    logger.log(_get_message(1), None, 120.2)
+    # A slow call that started in the previous window, which is still open.
+    logger.log(_get_message(1), None, 110.0)
+    assert _get_summaries(downstream) == []
+
+    logger.log(_get_message(1), None, 130.0)
+    assert [
+        (x["context_id"], x["message"]["count"])
+        for x in downstream.latest_messages
+    ] == [(f"{_CONTEXT_ID_PREFIX}:60.0:text-davinci-003:Completion:None", 2)]
+
+    # Too late for the closed window.
+    logger.log(_get_message(1), None, 119.5)
+    assert logger.late_count == 1
+    logger.flush()
+    assert [
+        (x["context_id"], x["message"]["count"])
+        for x in downstream.latest_messages
+    ] == [
+        (f"{_CONTEXT_ID_PREFIX}:60.0:text-davinci-003:Completion:None", 2),
+        (f"{_CONTEXT_ID_PREFIX}:120.0:text-davinci-003:Completion:None", 2),
+    ]
+
+
+def test_background_thread_logs_past_windows():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(
+        downstream, window_seconds=0.05, allowed_lateness_seconds=0
+    )
+    logger.log(_get_message(1))
+    for _ in range(50):
+        if downstream.latest_messages:
+            break
+        time.sleep(0.01)
+    assert [x["count"] for x in _get_summaries(downstream)] == [1]
+    logger.close()
+
+
+def test_exceptions():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream)
+    exception_message = _get_message(1, is_exception=True)
+    logger.log(exception_message, "context")
+    assert list(downstream.latest_messages) == [
+        {
+            "message": exception_message,
+            "context_id": "context",
+            "export_timestamp": None,
+        }
+    ]
+
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream, pass_through_exceptions=False)
+    logger.log(_get_message(1, is_exception=True))
+    logger.log(_get_message(1))
+    logger.flush()
+    ((summary),) = _get_summaries(downstream)
+    assert summary["count"] == 2
+    assert summary["exception_count"] == 1
+
+
+def test_alog():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream, window_seconds=60)
+    now = time.time()
+
+    async def run():
+        await asyncio.gather(
+            *(logger.alog(_get_message(i), None, now - 120) for i in range(5))
+        )
+        await logger.alog(_get_message(1), None, now)
+
+    asyncio.run(run())
+    assert [x["count"] for x in _get_summaries(downstream)] == [5]
+
+
+def test_flush_closes_windows():
+    downstream = InMemoryLogger()
+    logger = AggregatingLogger(downstream, window_seconds=60)
+    logger.log(_get_message(1), None, 70.0)
+    logger.flush()
+    logger.log(_get_message(1), None, 80.0)
+    logger.log(_get_message(1), None, 130.0)
+    logger.flush()
+    assert logger.late_count == 1
+    assert [
+        (x["message"]["window_start"], x["message"]["count"])
+        for x in downstream.latest_messages
+    ] == [(60.0, 1), (120.0, 1)]
@@ -0,0 +1,180 @@
+"""
+Tests for registering custom analyzers.
+"""
+import os
+import signal
+
+import pytest
+from openai import ChatCompletion, Completion
+
+from mona_openai import monitor_with_logger
+from mona_openai.analysis.registry import (
+    ANSWER_ROLE,
+    EXPENSIVE_COST,
+    AnalyzerRegistration,
+    LAST_USER_MESSAGE_ROLE,
+    PROMPT_ROLE,
+    register_analyzer,
+    start_analyzers,
+    unregister_analyzer,
+)
+from mona_openai.exceptions import InvalidAnalyzerException
+from mona_openai.loggers import InMemoryLogger
+from .mocks.mock_openai import get_mock_openai_class
+
+_ONLY_REGISTERED_SPECS = {
+    "analysis": {"privacy": False, "textual": False, "profanity": False}
+}
+
+_COMPLETION_RESPONSE = {
+    "choices": [
+        {"finish_reason": "length", "index": 0, "text": "one two three"},
+        {"finish_reason": "length", "index": 1, "text": "four"},
+    ],
+    "usage": {"completion_tokens": 4, "prompt_tokens": 2, "total_tokens": 6},
+    "id": "cmpl-1",
+    "model": "text-ada-001",
+}
+
+_CHAT_RESPONSE = {
+    "choices": [
+        {
+            "finish_reason": "length",
+            "index": 0,
+            "message": {"role": "assistant", "content": "one two"},
+        },
+    ],
+    "usage": {"completion_tokens": 2, "prompt_tokens": 5, "total_tokens": 7},
+    "id": "chatcmpl-1",
+    "model": "gpt-3.5-turbo",
+}
+
+
+@pytest.fixture
+def batch_calls():
+    calls = []
+
+    def word_count_batch(texts):
+        calls.append(tuple(texts))
+        return [{"words": len(text.split())} for text in texts]
+
+    register_analyzer("words", word_count_batch)
+    register_analyzer(
+        "chars",
+        lambda texts: [{"chars": len(text)} for text in texts],
+        roles=(ANSWER_ROLE,),
+        cost=EXPENSIVE_COST,
+    )
+    yield calls
+    unregister_analyzer("words")
+    unregister_analyzer("chars")
+
+
+def _get_analysis(openai_class, response, input, specs):
+    logger = InMemoryLogger()
+    monitor_with_logger(
+        get_mock_openai_class(openai_class, (response,), ()), logger, specs
+    ).create(**input)
+    return logger.latest_messages[0]["message"]["analysis"]
+
+
+def test_completion_batched(batch_calls):
+    analysis = _get_analysis(
+        Completion,
+        _COMPLETION_RESPONSE,
+        {"prompt": "some prompt", "model": "text-ada-001", "n": 2},
+        _ONLY_REGISTERED_SPECS,
+    )
+    assert analysis == {
+        "words": {"prompt_words": (2,), "answer_words": (3, 1)},
+        "chars": {"answer_chars": (13, 4)},
+    }
+    # All texts from all roles are analyzed in a single batch.
+    assert batch_calls == [("some prompt", "one two three", "four")]
+
+
+def test_chat_last_user_message(batch_calls):
+    analysis = _get_analysis(
+        ChatCompletion,
+        _CHAT_RESPONSE,
+        {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {"role": "system", "content": "be nice"},
+                {"role": "user", "content": "hi there you"},
+            ],
+        },
+        _ONLY_REGISTERED_SPECS,
+    )
+    assert analysis["words"] == {
+        "prompt_words": (2, 3),
+        "answer_words": (2,),
+        f"{LAST_USER_MESSAGE_ROLE}_words": 3,
+    }
+
+
+def test_disabled_by_specs(batch_calls):
+    analysis = _get_analysis(
+        Completion,
+        _COMPLETION_RESPONSE,
+        {"prompt": "some prompt", "model": "text-ada-001", "n": 2},
+        {"analysis": {**_ONLY_REGISTERED_SPECS["analysis"], "words": False}},
+    )
+    assert analysis == {"chars": {"answer_chars": (13, 4)}}
+    assert batch_calls == []
+
+
+def test_field_selection(batch_calls):
+    analysis = _get_analysis(
+        Completion,
+        _COMPLETION_RESPONSE,
+        {"prompt": "some prompt", "model": "text-ada-001", "n": 2},
+        {
+            "analysis": {
+                **_ONLY_REGISTERED_SPECS["analysis"],
+                "words": ["answer_words"],
+            }
+        },
+    )
+    assert analysis == {
+        "words": {"answer_words": (3, 1)},
+        "chars": {"answer_chars": (13, 4)},
+    }
+
+
+def test_invalid_registrations():
+    with pytest.raises(InvalidAnalyzerException):
+        register_analyzer("privacy", lambda texts: [])
+    with pytest.raises(InvalidAnalyzerException):
+        register_analyzer("bla", lambda texts: [], roles=("bla",))
+    with pytest.raises(InvalidAnalyzerException):
+        register_analyzer(
+            "bla", lambda texts: [], roles=(PROMPT_ROLE,), cost="bla"
+        )
+
+
+def test_expensive_analyzer_after_fork():
+    registration = AnalyzerRegistration(
+        "fork_test",
+        lambda texts: [{"length": len(x)} for x in texts],
+        (ANSWER_ROLE,),
+        EXPENSIVE_COST,
+    )
+    texts_by_role = {ANSWER_ROLE: ("one", "three")}
+    # Start the executor's threads in the parent.
+    assert start_analyzers((registration,), texts_by_role)() == {
+        "fork_test": {"answer_length": (3, 5)}
+    }
+
+    pid = os.fork()
+    if pid == 0:
+        # The child would hang forever on the parent's executor.
+        signal.alarm(5)
+        try:
+            result = start_analyzers((registration,), texts_by_role)()
+            is_correct = result["fork_test"]["answer_length"] == (3, 5)
+            os._exit(0 if is_correct else 1)
+        finally:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,136 @@
+"""
+Tests for logging async calls in background tasks.
+"""
+import asyncio
+
+from openai import Completion
+
+from mona_openai import monitor_drain, monitor_with_logger
+from mona_openai.loggers import InMemoryLogger
+from .mocks.mock_openai import get_mock_openai_class
+
+_RESPONSE = {
+    "choices": [{"finish_reason": "length", "index": 0, "text": "hi"}],
+    "usage": {"completion_tokens": 1, "prompt_tokens": 1, "total_tokens": 2},
+    "id": "cmpl-1",
+    "model": "text-ada-001",
+}
+
+_SPECS = {
+    "analysis": {"privacy": False, "profanity": False},
+    "background_async_logging": True,
+}
+
+
+class SlowAsyncLogger(InMemoryLogger):
+    """
+    An in-memory logger whose async logging takes the given time, and which
+    tracks the maximal number of concurrent alog calls.
+    """
+
+    def __init__(self, seconds):
+        super().__init__()
+        self._seconds = seconds
+        self.running_count = 0
+        self.max_running_count = 0
+
+    async def alog(self, message, context_id=None, export_timestamp=None):
+        self.running_count += 1
+        self.max_running_count = max(
+            self.max_running_count, self.running_count
+        )
+        await asyncio.sleep(self._seconds)
+        self.running_count -= 1
+        await super().alog(message, context_id, export_timestamp)
+
+
+def _get_monitored_completion(logger, calls_count, specs=_SPECS):
+    return monitor_with_logger(
+        get_mock_openai_class(Completion, (), (_RESPONSE,) * calls_count),
+        logger,
+        specs,
+    )
+
+
+def test_acreate_doesnt_wait_for_logging():
+    logger = SlowAsyncLogger(0.05)
+    monitored_completion = _get_monitored_completion(logger, 1)
+
+    async def run():
+        response = await monitored_completion.acreate(
+            prompt="hello", model="text-ada-001"
+        )
+        assert response == _RESPONSE
+        assert len(logger.latest_messages) == 0
+        assert await monitor_drain()
+        assert len(logger.latest_messages) == 1
+
+    asyncio.run(run())
+
+
+def test_concurrency_limit():
+    logger = SlowAsyncLogger(0.01)
+    monitored_completion = _get_monitored_completion(
+        logger, 10, _SPECS | {"background_logging_concurrency": 2}
+    )
+
+    async def run():
+        for _ in range(10):
+            await monitored_completion.acreate(
+                prompt="hello", model="text-ada-001"
+            )
+        assert await monitor_drain()
+
+    asyncio.run(run())
+    assert len(logger.latest_messages) == 10
+    assert logger.max_running_count == 2
+
+
+def test_max_pending_limit():
+    logger = SlowAsyncLogger(0.01)
+    monitored_completion = _get_monitored_completion(
+        logger,
+        5,
+        _SPECS
+        | {
+            "background_logging_concurrency": 1,
+            "background_logging_max_pending": 2,
+        },
+    )
+
+    async def run():
+        # The mock calls don't yield to the event loop, so no background
+        # task finishes between them.
+        for _ in range(5):
+            await monitored_completion.acreate(
+                prompt="hello", model="text-ada-001"
+            )
+        assert await monitor_drain()
+
+    asyncio.run(run())
+    assert len(logger.latest_messages) == 2
+    assert monitored_completion.get_background_dropped_count() == 3
+
+
+def test_drain_timeout():
+    logger = SlowAsyncLogger(10)
+    monitored_completion = _get_monitored_completion(logger, 1)
+
+    async def run():
+        await monitored_completion.acreate(
+            prompt="hello", model="text-ada-001"
+        )
+        assert not await monitor_drain(timeout=0.01)
+
+    asyncio.run(run())
+
+
+def test_sync_create_logs_immediately():
+    logger = SlowAsyncLogger(10)
+    monitored_completion = monitor_with_logger(
+        get_mock_openai_class(Completion, (_RESPONSE,), ()),
+        logger,
+        _SPECS,
+    )
+    monitored_completion.create(prompt="hello", model="text-ada-001")
+    assert len(logger.latest_messages) == 1
@@ -0,0 +1,162 @@
+"""
+Tests for the background thread logger.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from openai import Completion
+
+from mona_openai import monitor_with_logger
+from mona_openai.exceptions import InvalidQueuePolicyException
+from mona_openai.loggers import BackgroundLogger, InMemoryLogger
+from .mocks.mock_openai import get_mock_openai_class
+
+_RESPONSE = {
+    "choices": [{"finish_reason": "length", "index": 0, "text": "hi"}],
+    "usage": {"completion_tokens": 1, "prompt_tokens": 1, "total_tokens": 2},
+    "id": "cmpl-1",
+    "model": "text-ada-001",
+}
+
+
+class SlowLogger(InMemoryLogger):
+    """
+    An in-memory logger that waits for the given event before logging
+    anything.
+    """
+
+    def __init__(self, release_event):
+        super().__init__()
+        self._release_event = release_event
+
+    def log(self, message, context_id=None, export_timestamp=None):
+        self._release_event.wait()
+        if message == "fail":
+            raise ValueError("Failed logging")
+        super().log(message, context_id, export_timestamp)
+
+
+def _get_logged_messages(logger):
+    return [x["message"] for x in logger.latest_messages]
+
+
+def test_invalid_policy():
+    with pytest.raises(InvalidQueuePolicyException):
+        BackgroundLogger(InMemoryLogger(), full_queue_policy="wait")
+
+
+def test_log_returns_before_logging():
+    release_event = threading.Event()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(underlying_logger)
+    logger.log("message 1")
+    logger.log("message 2", "context_id", 1234)
+    assert _get_logged_messages(underlying_logger) == []
+
+    release_event.set()
+    assert logger.flush(timeout=5)
+    assert list(underlying_logger.latest_messages) == [
+        {"message": "message 1", "context_id": None, "export_timestamp": None},
+        {
+            "message": "message 2",
+            "context_id": "context_id",
+            "export_timestamp": 1234,
+        },
+    ]
+
+
+def test_drop_policy():
+    release_event = threading.Event()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(underlying_logger, max_queue_size=2)
+    for i in range(5):
+        logger.log(i)
+    # One message may have been taken by the thread already.
+    assert logger.dropped_count in (2, 3)
+
+    release_event.set()
+    assert logger.flush(timeout=5)
+    assert len(underlying_logger.latest_messages) == 5 - logger.dropped_count
+
+
+def test_block_policy():
+    release_event = threading.Event()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(
+        underlying_logger, max_queue_size=1, full_queue_policy="block"
+    )
+    threading.Timer(0.1, release_event.set).start()
+    for i in range(5):
+        logger.log(i)
+    assert logger.flush(timeout=5)
+    assert logger.dropped_count == 0
+    assert _get_logged_messages(underlying_logger) == list(range(5))
+
+
+def test_failed_logging_doesnt_stop_thread():
+    release_event = threading.Event()
+    release_event.set()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(underlying_logger)
+    logger.log("fail")
+    logger.log("message")
+    assert logger.flush(timeout=5)
+    assert _get_logged_messages(underlying_logger) == ["message"]
+
+
+def test_flush_timeout():
+    release_event = threading.Event()
+    logger = BackgroundLogger(SlowLogger(release_event))
+    logger.log("message")
+    assert not logger.flush(timeout=0.05)
+    release_event.set()
+    assert logger.flush(timeout=5)
+
+
+def test_close():
+    release_event = threading.Event()
+    release_event.set()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(underlying_logger)
+    logger.log("message 1")
+    logger.close()
+    assert _get_logged_messages(underlying_logger) == ["message 1"]
+    # Logged synchronously after closing.
+    logger.log("message 2")
+    assert _get_logged_messages(underlying_logger) == [
+        "message 1",
+        "message 2",
+    ]
+
+
+def test_alog():
+    underlying_logger = InMemoryLogger()
+    logger = BackgroundLogger(underlying_logger)
+    asyncio.run(logger.alog("message"))
+    assert logger.flush(timeout=5)
+    assert _get_logged_messages(underlying_logger) == ["message"]
+
+
+def test_monitored_call_doesnt_wait_for_logging():
+    release_event = threading.Event()
+    underlying_logger = SlowLogger(release_event)
+    logger = BackgroundLogger(underlying_logger)
+    monitored_completion = monitor_with_logger(
+        get_mock_openai_class(Completion, (_RESPONSE,), ()),
+        logger,
+        {"analysis": {"privacy": False, "profanity": False}},
+    )
+
+    start_time = time.time()
+    assert (
+        monitored_completion.create(prompt="hello", model="text-ada-001")
+        == _RESPONSE
+    )
+    assert time.time() - start_time < 1
+    assert len(underlying_logger.latest_messages) == 0
+
+    release_event.set()
+    assert logger.flush(timeout=5)
+    assert len(underlying_logger.latest_messages) == 1
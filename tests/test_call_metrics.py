@@ -0,0 +1,112 @@
+"""
+Tests for the calls' metrics quantile sketches.
+"""
+import json
+
+import pytest
+
+from mona_openai.analysis.call_metrics import (
+    CallMetricsTracker,
+    get_call_metrics,
+)
+
+
+def test_get_call_metrics():
+    assert get_call_metrics(
+        2, 0.5, {"prompt_tokens": 10, "completion_tokens": 4}
+    ) == {
+        "latency": 2,
+        "stream_start_latency": 0.5,
+        "prompt_tokens": 10,
+        "completion_tokens": 4,
+        "per_token_latency": 0.5,
+    }
+    metrics = get_call_metrics(2, None, {"completion_tokens": 0})
+    assert metrics["per_token_latency"] is None
+    assert metrics["prompt_tokens"] is None
+
+
+def _add_calls(tracker, model, latencies, endpoint="Completion"):
+    for latency in latencies:
+        tracker.add(
+            model,
+            endpoint,
+            get_call_metrics(
+                latency, None, {"prompt_tokens": 10, "completion_tokens": 5}
+            ),
+        )
+
+
+def test_quantiles_by_model_and_endpoint():
+    tracker = CallMetricsTracker()
+    # Fewer values than the sketch's size, so the quantiles are exact.
+    _add_calls(tracker, "model-a", range(1, 51))
+    _add_calls(tracker, "model-b", range(1001, 1051))
+    _add_calls(tracker, "model-b", (5000,), endpoint="ChatCompletion")
+
+    assert tracker.get_quantiles("latency", (0.5, 0.99), "model-a") == {
+        0.5: 25,
+        0.99: 50,
+    }
+    # Including both endpoints' calls.
+    assert tracker.get_quantiles("latency", (0.5,), "model-b") == {0.5: 1026}
+    assert tracker.get_quantiles(
+        "latency", (1,), "model-b", "Completion"
+    ) == {1: 1050}
+    assert tracker.get_quantiles("latency", (0.5,)) == {0.5: 1001}
+    assert tracker.get_quantiles(
+        "per_token_latency", (0,), endpoint="ChatCompletion"
+    ) == {0: 1000}
+    assert tracker.get_quantiles("stream_start_latency") is None
+    assert tracker.get_quantiles("latency", model="model-c") is None
+
+    stats = tracker.get_stats((0.5,))
+    assert set(stats) == {
+        ("model-a", "Completion"),
+        ("model-b", "Completion"),
+        ("model-b", "ChatCompletion"),
+    }
+    assert stats[("model-a", "Completion")]["latency"] == {
+        "count": 50,
+        "min": 1,
+        "max": 50,
+        "quantiles": {0.5: 25},
+    }
+
+
+def test_fixed_memory():
+    tracker = CallMetricsTracker(k=50)
+    _add_calls(tracker, "model-a", range(20000))
+    (sketch,) = tracker.to_dict()["sketches"][:1]
+    assert sum(len(x) for x in sketch["sketch"]["compactors"]) < 500
+    assert tracker.get_quantiles("latency", (0.5,))[0.5] == pytest.approx(
+        10000, rel=0.1
+    )
+
+
+def test_merge_across_processes():
+    tracker = CallMetricsTracker()
+    other_tracker = CallMetricsTracker()
+    _add_calls(tracker, "model-a", range(1, 51))
+    _add_calls(other_tracker, "model-a", range(51, 101))
+    _add_calls(other_tracker, "model-b", (7,))
+
+    # As sent from another process.
+    tracker.merge_dict(json.loads(json.dumps(other_tracker.to_dict())))
+    assert tracker.get_quantiles("latency", (0.5, 1), "model-a") == {
+        0.5: 50,
+        1: 100,
+    }
+    assert tracker.get_stats()[("model-b", "Completion")]["latency"][
+        "count"
+    ] == 1
+
+    restored = CallMetricsTracker.from_dict(tracker.to_dict())
+    assert restored.get_stats() == tracker.get_stats()
+
+    merged = CallMetricsTracker()
+    merged.merge(restored)
+    merged.merge(restored)
+    assert merged.get_stats()[("model-a", "Completion")]["latency"][
+        "count"
+    ] == 200
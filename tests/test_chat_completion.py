@@ -552,3 +552,75 @@ def test_stream_multiple_answers():
         ),
     ).create(**input):
         pass
+
+
+def test_keywords():
+    analysis = deepcopy(_DEFAULT_ANALYSIS)
+    analysis["keywords"] = {
+        "total_prompt_topics_keyword_count": 1,
+        "answer_topics_keyword_count": (1,),
+        "answer_unknown_topics_keyword_count": (1,),
+        "last_user_message_topics_keyword_count": 1,
+    }
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"keywords": {"topics": ["text", "name"]}},
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=analysis),), ()
+        ),
+    ).create(**_DEFAULT_INPUT)
+
+
+def test_prefix_cache(monkeypatch):
+    class MockEncoding:
+        def encode(self, text):
+            return text.split()
+
+    monkeypatch.setattr(
+        "mona_openai.util.tokens_util._get_encoding",
+        lambda model: MockEncoding(),
+    )
+    system_message = {"role": "system", "content": "Be nice " * 20}
+    new_input = deepcopy(_DEFAULT_INPUT)
+    new_input["messages"] = [system_message] + new_input["messages"]
+
+    def get_analysis(shared_token_count, shared_ratio):
+        return {
+            "prefix_cache": {
+                "prompt_shared_prefix_token_count": (shared_token_count,),
+                "prompt_shared_prefix_ratio": (shared_ratio,),
+            }
+        }
+
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE, _DEFAULT_RESPONSE), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "analysis": {
+                "privacy": False,
+                "textual": False,
+                "profanity": False,
+                "prefix_cache": True,
+            },
+            "prefix_cache_block_size": 4,
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(
+                    input=_remove_text_content_from_input(new_input),
+                    analysis=get_analysis(0, 0.0),
+                ),
+                _get_mona_message(
+                    input=_remove_text_content_from_input(new_input),
+                    analysis=get_analysis(48, 48 / 49),
+                ),
+            ),
+            (),
+        ),
+    )
+    monitored_completion.create(**new_input)
+    monitored_completion.create(**new_input)
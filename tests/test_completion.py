@@ -685,3 +685,433 @@ def test_stream_async():
             pass
 
     asyncio.run(iterate_gen())
+
+
+def test_overlap():
+    expected_analysis = deepcopy(_DEFAULT_ANALYSIS)
+    expected_analysis["overlap"] = {
+        "answer_unigram_novelty_ratio": (1.0,),
+        "answer_bigram_novelty_ratio": (1.0,),
+        "answer_trigram_novelty_ratio": (1.0,),
+    }
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"analysis": {"overlap": True}},
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=expected_analysis),), ()
+        ),
+    ).create(**_DEFAULT_INPUT)
+
+
+def test_near_duplicate():
+    other_input = deepcopy(_DEFAULT_INPUT)
+    other_input["prompt"] = "I want to generate some other text about "
+
+    analysis = {
+        "near_duplicate": {
+            "answer_near_duplicate_count": (0,),
+            "answer_near_duplicate_max_similarity": (0.0,),
+        }
+    }
+    second_analysis = {
+        "near_duplicate": {
+            "answer_near_duplicate_count": (1,),
+            "answer_near_duplicate_max_similarity": (1.0,),
+        }
+    }
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE, _DEFAULT_RESPONSE), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "analysis": {
+                "privacy": False,
+                "textual": False,
+                "profanity": False,
+                "near_duplicate": True,
+            }
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(analysis=analysis),
+                _get_mona_message(analysis=second_analysis),
+            ),
+            (),
+        ),
+    )
+    monitored_completion.create(**_DEFAULT_INPUT)
+    monitored_completion.create(**other_input)
+
+
+def test_prefix_cache():
+    # Token prompts aren't tokenized again, and only the "tokens" analysis
+    # runs on them otherwise.
+    template = list(range(32))
+    response = deepcopy(_DEFAULT_RESPONSE)
+    response["usage"]["prompt_tokens_details"] = {"cached_tokens": 32}
+
+    def get_analysis(shared_token_count, shared_ratio, **additional_fields):
+        return {
+            "tokens": {"prompt_token_count": (40,)},
+            "prefix_cache": {
+                "prompt_shared_prefix_token_count": (shared_token_count,),
+                "prompt_shared_prefix_ratio": (shared_ratio,),
+                **additional_fields,
+            },
+        }
+
+    new_input = deepcopy(_DEFAULT_INPUT)
+    new_input["prompt"] = template + [100] * 8
+    other_input = deepcopy(_DEFAULT_INPUT)
+    other_input["prompt"] = template + [200] * 8
+
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE, response), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"analysis": {"prefix_cache": True}},
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(analysis=get_analysis(0, 0.0)),
+                _get_mona_message(
+                    analysis=get_analysis(
+                        32, 0.8, prompt_cached_token_count=32
+                    ),
+                    response=_get_response_without_texts(response),
+                ),
+            ),
+            (),
+        ),
+    )
+    monitored_completion.create(**new_input)
+    monitored_completion.create(**other_input)
+
+
+def test_request_efficiency():
+    new_input = deepcopy(_DEFAULT_INPUT)
+    additional_data = {"template_id": "some_template"}
+    new_input["MONA_additional_data"] = additional_data
+
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "analysis": {
+                "privacy": False,
+                "textual": False,
+                "profanity": False,
+                "request_efficiency": True,
+            },
+            "request_efficiency_min_samples": 1,
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(
+                    additional_data=additional_data,
+                    analysis={
+                        "request_efficiency": {
+                            "answer_token_count": (5,),
+                            "distinct_answer_count": 1,
+                            "answer_max_tokens_ratio": (1.0,),
+                            # No suggested max_tokens since the answer was
+                            # truncated.
+                            "suggested_n": 1,
+                        }
+                    },
+                ),
+            ),
+            (),
+        ),
+    )
+    monitored_completion.create(**new_input)
+
+    stats = monitored_completion.get_request_efficiency_stats()
+    assert tuple(stats) == (("text-ada-001", "some_template"),)
+    assert stats[("text-ada-001", "some_template")]["calls_count"] == 1
+    assert (
+        stats[("text-ada-001", "some_template")]["truncated_answers_ratio"]
+        == 1
+    )
+
+
+def test_prompt_template():
+    new_input = deepcopy(_DEFAULT_INPUT)
+    additional_data = {"template_id": "some_template"}
+    new_input["MONA_additional_data"] = additional_data
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "prompt_templates": {
+                "some_template": "I want to generate some {what} about "
+            }
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(additional_data=additional_data),), ()
+        ),
+    ).create(**new_input)
+
+
+@pytest.mark.parametrize("engine", ("mmap", "numpy"))
+def test_profanity_engine(tmp_path, engine):
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "profanity_engine": engine,
+            "profanity_model_path": str(tmp_path / "profanity_model.bin"),
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(),), ()
+        ),
+    ).create(**_DEFAULT_INPUT)
+
+
+def test_keywords():
+    analysis = deepcopy(_DEFAULT_ANALYSIS)
+    analysis["keywords"] = {
+        "prompt_topics_keyword_count": (1,),
+        "answer_topics_keyword_count": (1,),
+        "answer_unknown_topics_keyword_count": (1,),
+    }
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"keywords": {"topics": ["text", "name"]}},
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=analysis),), ()
+        ),
+    ).create(**_DEFAULT_INPUT)
+
+
+def test_field_selection(monkeypatch):
+    def fail_extracting_phone_numbers(text):
+        raise AssertionError("Phone numbers shouldn't be extracted")
+
+    monkeypatch.setattr(
+        "mona_openai.analysis.privacy._extract_phone_numbers",
+        fail_extracting_phone_numbers,
+    )
+    analysis = {
+        "privacy": {"answer_unknown_email_count": (0,)},
+        "textual": _DEFAULT_ANALYSIS["textual"],
+        "profanity": {"answer_has_profanity": (False,)},
+    }
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {
+            "analysis": {
+                "privacy": ["answer_unknown_email_count"],
+                "profanity": ["answer_has_profanity"],
+            }
+        },
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=analysis),), ()
+        ),
+    ).create(**_DEFAULT_INPUT)
+
+
+_PRECOMPUTED_PROFANITY = {
+    "prompt_profanity_prob": (0.01,),
+    "answer_profanity_prob": (0.02,),
+    "prompt_has_profanity": (False,),
+    "answer_has_profanity": (False,),
+}
+
+
+def _fail_getting_profanity(*args):
+    raise AssertionError("Profanity shouldn't be calculated")
+
+
+def test_precomputed_analysis(monkeypatch):
+    monkeypatch.setattr(
+        "mona_openai.endpoints.completion.get_profanity_prob",
+        _fail_getting_profanity,
+    )
+    monkeypatch.setattr(
+        "mona_openai.endpoints.completion.get_has_profanity",
+        _fail_getting_profanity,
+    )
+    precomputed_analysis = {
+        "profanity": _PRECOMPUTED_PROFANITY,
+        "privacy": {"prompt_email_count": (1,)},
+        "moderation": {"answer_flagged": (False,)},
+    }
+    analysis = deepcopy(_DEFAULT_ANALYSIS) | {
+        "profanity": _PRECOMPUTED_PROFANITY,
+        "moderation": {"answer_flagged": (False,)},
+    }
+    analysis["privacy"]["prompt_email_count"] = (1,)
+    new_input = deepcopy(_DEFAULT_INPUT)
+    new_input["MONA_precomputed_analysis"] = precomputed_analysis
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=analysis),), ()
+        ),
+    ).create(**new_input)
+
+
+def test_rest_precomputed_analysis(monkeypatch):
+    monkeypatch.setattr(
+        "mona_openai.endpoints.completion.get_profanity_prob",
+        _fail_getting_profanity,
+    )
+    monkeypatch.setattr(
+        "mona_openai.endpoints.completion.get_has_profanity",
+        _fail_getting_profanity,
+    )
+    analysis = deepcopy(_DEFAULT_ANALYSIS) | {
+        "profanity": _PRECOMPUTED_PROFANITY
+    }
+    prompt_fields = ("prompt_profanity_prob", "prompt_has_profanity")
+
+    get_rest_monitor(
+        Completion.__name__,
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(analysis=analysis),), ()
+        ),
+    ).log_request(
+        _DEFAULT_INPUT,
+        precomputed_analysis={
+            "profanity": {
+                x: _PRECOMPUTED_PROFANITY[x] for x in prompt_fields
+            }
+        },
+    )[0](
+        _DEFAULT_RESPONSE,
+        precomputed_analysis={
+            "profanity": {
+                x: y
+                for x, y in _PRECOMPUTED_PROFANITY.items()
+                if x not in prompt_fields
+            }
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "prompt, expected_token_counts",
+    (([1, 2, 3], (3,)), ([[1, 2, 3], [4, 5]], (3, 2))),
+)
+def test_token_prompts(prompt, expected_token_counts):
+    new_input = deepcopy(_DEFAULT_INPUT)
+    new_input["prompt"] = prompt
+
+    monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(
+                    analysis={
+                        "tokens": {"prompt_token_count": expected_token_counts}
+                    }
+                ),
+            ),
+            (),
+        ),
+    ).create(**new_input)
+
+
+def test_analyze_token_prompts(monkeypatch):
+    decoded_tokens = []
+
+    class MockEncoding:
+        def decode(self, tokens):
+            decoded_tokens.append(tokens)
+            return _DEFAULT_INPUT["prompt"]
+
+    monkeypatch.setattr(
+        "mona_openai.util.tokens_util._get_encoding",
+        lambda model: MockEncoding(),
+    )
+    new_input = deepcopy(_DEFAULT_INPUT)
+    # Unique tokens, so that decoding isn't cached from other tests.
+    new_input["prompt"] = [1234, 5678, 91011]
+
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE, _DEFAULT_RESPONSE), ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"analyze_token_prompts": True},
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (
+                _get_mona_message(
+                    analysis=_DEFAULT_ANALYSIS
+                    | {"tokens": {"prompt_token_count": (3,)}}
+                ),
+            )
+            * 2,
+            (),
+        ),
+    )
+    monitored_completion.create(**new_input)
+    monitored_completion.create(**new_input)
+
+    # Decoding is cached across calls.
+    assert decoded_tokens == [[1234, 5678, 91011]]
+
+
+def test_call_metrics():
+    # Metrics are tracked even for calls that aren't sampled for logging.
+    monitored_completion = monitor(
+        _get_mock_openai_class((_DEFAULT_RESPONSE,) * 3, ()),
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        {"sampling_ratio": 0},
+        mona_clients_getter=get_mock_mona_clients_getter((), ()),
+    )
+    for _ in range(3):
+        monitored_completion.create(**_DEFAULT_INPUT)
+
+    tracker = monitored_completion.get_call_metrics_tracker()
+    stats = tracker.get_stats()
+    assert tuple(stats) == (("text-ada-001", "Completion"),)
+    metrics = stats[("text-ada-001", "Completion")]
+    # No stream start latency for non-stream calls.
+    assert set(metrics) == {
+        "latency",
+        "prompt_tokens",
+        "completion_tokens",
+        "per_token_latency",
+    }
+    assert metrics["completion_tokens"]["count"] == 3
+    assert metrics["prompt_tokens"]["quantiles"] == {
+        0.5: 8,
+        0.95: 8,
+        0.99: 8,
+    }
+    assert tracker.get_quantiles("latency", (0.99,))[0.99] < 1
+
+
+def test_rest_call_metrics():
+    rest_monitor = get_rest_monitor(
+        Completion.__name__,
+        (),
+        _DEFAULT_CONTEXT_CLASS,
+        mona_clients_getter=get_mock_mona_clients_getter(
+            (_get_mona_message(),), ()
+        ),
+    )
+    rest_monitor.log_request(_DEFAULT_INPUT)[0](_DEFAULT_RESPONSE)
+    assert rest_monitor.get_call_metrics_tracker().get_quantiles(
+        "completion_tokens", (0.5,), model="text-ada-001"
+    ) == {0.5: 5}
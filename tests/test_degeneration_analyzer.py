@@ -0,0 +1,65 @@
+import zlib
+
+from mona_openai.analysis.degeneration import DegenerationTracker
+
+
+def test_longest_repeated_substring():
+    assert (
+        DegenerationTracker()
+        .update("abcXabcYabc")
+        .get_longest_repeated_substring_length()
+        == 3
+    )
+
+
+def test_longest_repeated_substring_overlapping():
+    assert (
+        DegenerationTracker()
+        .update("aaaa")
+        .get_longest_repeated_substring_length()
+        == 3
+    )
+
+
+def test_no_repetition():
+    tracker = DegenerationTracker().update("abc")
+    assert tracker.get_longest_repeated_substring_length() == 0
+    assert tracker.get_repeated_ngram_ratio() == 0
+
+
+def test_repeated_ngram_ratio():
+    # 6 trigrams, the last 2 of which are repetitions.
+    assert (
+        DegenerationTracker()
+        .update("I am a bot I am a bot")
+        .get_repeated_ngram_ratio()
+        == 2 / 6
+    )
+
+
+def test_compression_ratio():
+    text = "I am a bot " * 20
+    assert DegenerationTracker().update(text).get_compression_ratio() == len(
+        text
+    ) / len(zlib.compress(text.encode()))
+
+
+def test_incremental_updates():
+    text = "the model keeps looping the model keeps looping on and on"
+    tracker = DegenerationTracker()
+    for i in range(0, len(text), 4):
+        tracker.update(text[i:i + 4])
+    full_text_tracker = DegenerationTracker().update(text)
+
+    assert (
+        tracker.get_longest_repeated_substring_length()
+        == full_text_tracker.get_longest_repeated_substring_length()
+    )
+    assert (
+        tracker.get_repeated_ngram_ratio()
+        == full_text_tracker.get_repeated_ngram_ratio()
+    )
+    assert (
+        tracker.get_compression_ratio()
+        == full_text_tracker.get_compression_ratio()
+    )
@@ -0,0 +1,219 @@
+"""
+Tests for the disk spool and its replayer.
+"""
+import os
+import threading
+
+from mona_openai.loggers import MonaLogger
+from mona_openai.loggers.disk_spool import (
+    SEGMENT_SUFFIX,
+    DiskSpool,
+    SpoolReplayer,
+)
+from .mocks.mock_mona_client import get_flaky_mona_clients_getter
+
+
+def _get_segment_files(directory):
+    return sorted(
+        x for x in os.listdir(directory) if x.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _get_messages(batch):
+    return [record["message"] for record, _ in batch]
+
+
+def test_append_read_and_ack(tmp_path):
+    spool = DiskSpool(tmp_path)
+    assert spool.is_empty()
+    spool.append({"a": 1}, "context 1", 1234)
+    spool.append({"a": 2})
+
+    batch = spool.read_batch(10)
+    assert [x for x, _ in batch] == [
+        {
+            "message": {"a": 1},
+            "context_id": "context 1",
+            "export_timestamp": 1234,
+        },
+        {"message": {"a": 2}, "context_id": None, "export_timestamp": None},
+    ]
+
+    spool.ack(batch[0][1])
+    assert _get_messages(spool.read_batch(10)) == [{"a": 2}]
+    spool.ack(batch[1][1])
+    assert spool.is_empty()
+
+
+def test_segments_rotation(tmp_path):
+    spool = DiskSpool(tmp_path, max_segment_bytes=100)
+    for i in range(10):
+        spool.append(i)
+    assert len(_get_segment_files(spool.process_directory)) > 1
+
+    batch = spool.read_batch(100)
+    assert _get_messages(batch) == list(range(10))
+    spool.ack(batch[-1][1])
+    assert len(_get_segment_files(spool.process_directory)) == 1
+    assert spool.is_empty()
+
+    spool.append(10)
+    assert _get_messages(spool.read_batch(100)) == [10]
+
+
+def test_size_cap(tmp_path):
+    spool = DiskSpool(tmp_path, max_total_bytes=200)
+    results = [spool.append(i) for i in range(10)]
+    assert results[0]
+    assert not results[-1]
+    assert spool.dropped_count == results.count(False)
+    assert len(spool.read_batch(100)) == results.count(True)
+
+
+def test_crash_recovery(tmp_path):
+    spool = DiskSpool(tmp_path, fsync_every_records=1)
+    for i in range(3):
+        spool.append(i)
+    spool.ack(spool.read_batch(1)[0][1])
+    # Simulate a crash in the middle of writing a record.
+    spool._write_file.write(b"\x00\x00\x01\x00partial")
+    spool._write_file.flush()
+
+    recovered_spool = DiskSpool(tmp_path)
+    assert _get_messages(recovered_spool.read_batch(10)) == [1, 2]
+    recovered_spool.append(3)
+    assert _get_messages(recovered_spool.read_batch(10)) == [1, 2, 3]
+
+
+def test_sync_off_the_appending_thread(tmp_path, monkeypatch):
+    syncing_threads = []
+    is_synced = threading.Event()
+    original_fsync = os.fsync
+
+    def fsync(fd):
+        syncing_threads.append(threading.current_thread())
+        original_fsync(fd)
+        is_synced.set()
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    # Only the number of records triggers a sync.
+    spool = DiskSpool(
+        tmp_path, fsync_every_records=2, fsync_interval_seconds=60
+    )
+    spool.append(0)
+    assert not syncing_threads
+    spool.append(1)
+    assert is_synced.wait(timeout=5)
+    assert syncing_threads == [spool._sync_thread]
+    spool.close()
+
+
+def test_replayer(tmp_path):
+    spool = DiskSpool(tmp_path)
+    for i in range(5):
+        spool.append(i, None, 1000 + i)
+    exported = []
+    is_healthy = False
+
+    def export(records):
+        if not is_healthy and 2 in (x["message"] for x in records):
+            return False
+        exported.append(
+            [(x["message"], x["export_timestamp"]) for x in records]
+        )
+        return True
+
+    replayer = SpoolReplayer(spool, export, batch_size=2)
+    assert not replayer.replay()
+    assert exported == [[(0, 1000), (1, 1001)]]
+
+    is_healthy = True
+    assert replayer.replay()
+    assert [[x for x, _ in batch] for batch in exported] == [
+        [0, 1],
+        [2, 3],
+        [4],
+    ]
+    assert spool.is_empty()
+
+
+def test_mona_logger_disk_spool(tmp_path):
+    logger = MonaLogger(
+        (),
+        "TEST_CLASS",
+        get_flaky_mona_clients_getter(
+            {
+                0: ConnectionError("Mona is down"),
+                2: ConnectionError("Mona is down"),
+            }
+        ),
+        max_retries=0,
+        open_circuit_policy="spool",
+        spool_directory=tmp_path,
+        replay_interval_seconds=60,
+    )
+    logger.log("message 1", "context 1", None)
+    logger.log("message 2", "context 2", 1234)
+    logger.log("message 3", "context 3", None)
+    assert logger.client.exported_messages == ["message 2"]
+    spooled_timestamps = [
+        x["export_timestamp"] for x, _ in logger.disk_spool.read_batch(10)
+    ]
+    assert len(spooled_timestamps) == 2
+    assert None not in spooled_timestamps
+
+    assert logger.spool_replayer.replay()
+    # Replayed in a single batch export.
+    assert logger.client._exports_count[0] == 4
+    assert logger.client.exported_messages == [
+        "message 2",
+        "message 1",
+        "message 3",
+    ]
+    assert logger.client.exported_timestamps == [1234, *spooled_timestamps]
+    assert logger.disk_spool.is_empty()
+
+
+def test_replayer_restarted_after_fork(tmp_path):
+    logger = MonaLogger(
+        (),
+        "TEST_CLASS",
+        get_flaky_mona_clients_getter({}),
+        open_circuit_policy="spool",
+        spool_directory=tmp_path,
+    )
+    pid = os.fork()
+    if pid == 0:
+        # Threads don't survive forking.
+        is_restarted = not logger.spool_replayer._thread.is_alive()
+        logger.log("message", "context", None)
+        is_restarted &= logger.spool_replayer._thread.is_alive()
+        os._exit(0 if is_restarted else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_forked_processes_spools(tmp_path):
+    spool = DiskSpool(tmp_path)
+    spool.append("parent 0")
+    pid = os.fork()
+    if pid == 0:
+        spool.append("child 0")
+        spool.append("child 1")
+        spool.ack(spool.read_batch(1)[0][1])
+        os._exit(0)
+    spool.append("parent 1")
+    os.waitpid(pid, 0)
+
+    # Each process only read and acknowledged its own records.
+    assert os.path.isdir(tmp_path / str(pid))
+    assert _get_messages(spool.read_batch(10)) == ["parent 0", "parent 1"]
+
+    # The exited child's unacknowledged records are moved to this spool.
+    spool.adopt_orphaned_spools()
+    assert not os.path.exists(tmp_path / str(pid))
+    assert _get_messages(spool.read_batch(10)) == [
+        "parent 0",
+        "parent 1",
+        "child 1",
+    ]
@@ -0,0 +1,262 @@
+"""
+Tests for the NDJSON file logger.
+"""
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from mona_openai.loggers import FileLogger, file_logger
+from mona_openai.loggers.file_logger import (
+    get_log_file_names,
+    read_merged_records,
+)
+
+
+def _read_records(file_name):
+    with open(file_name) as file:
+        return [json.loads(x) for x in file]
+
+
+def _get_rotated_files(tmp_path):
+    return sorted(x for x in os.listdir(tmp_path) if x != "log.json")
+
+
+def test_newline_delimited_records(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(file_name)
+    logger.log({"a": 1}, "context 1", 1234)
+    logger.log({"a": 2})
+    logger.close_file()
+    assert _read_records(file_name) == [
+        {
+            "message": {"a": 1},
+            "context_id": "context 1",
+            "export_timestamp": 1234,
+        },
+        {"message": {"a": 2}, "context_id": None, "export_timestamp": None},
+    ]
+
+
+def test_buffering(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(
+        file_name, buffer_size_bytes=200, flush_interval_seconds=60
+    )
+    logger.log("message")
+    assert _read_records(file_name) == []
+    # Each record is about 70 bytes.
+    for _ in range(4):
+        logger.log("message")
+    assert len(_read_records(file_name)) == 3
+    logger.flush()
+    assert len(_read_records(file_name)) == 5
+
+
+def test_flush_interval(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(file_name, flush_interval_seconds=0.01)
+    logger.log("message")
+    # Written in the background, even though nothing else is logged.
+    deadline = time.monotonic() + 5
+    while not _read_records(file_name) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(_read_records(file_name)) == 1
+    logger.close_file()
+    assert not logger._flusher_thread.is_alive()
+
+
+def test_size_rotation(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(file_name, buffer_size_bytes=0, max_file_bytes=100)
+    for i in range(5):
+        logger.log(i)
+    logger.close_file()
+
+    rotated_files = _get_rotated_files(tmp_path)
+    assert len(rotated_files) == 2
+    records = [
+        x
+        for rotated_file in rotated_files
+        for x in _read_records(tmp_path / rotated_file)
+    ] + _read_records(file_name)
+    assert [x["message"] for x in records] == list(range(5))
+
+
+def test_time_rotation_with_compression(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(
+        file_name,
+        buffer_size_bytes=0,
+        rotation_interval_seconds=0.05,
+        compress_rotated_files=True,
+    )
+    logger.log(1)
+    time.sleep(0.05)
+    logger.log(2)
+    logger.close_file()
+
+    (rotated_file,) = _get_rotated_files(tmp_path)
+    assert rotated_file.endswith(".gz")
+    with gzip.open(tmp_path / rotated_file, "rt") as file:
+        assert [json.loads(x)["message"] for x in file] == [1, 2]
+
+
+def test_compression_doesnt_block_alog(tmp_path, monkeypatch):
+    is_compression_released = threading.Event()
+    compressed_file_names = []
+
+    def compress_file(file_name):
+        is_compression_released.wait()
+        compressed_file_names.append(file_name)
+
+    monkeypatch.setattr(file_logger, "_compress_file", compress_file)
+    logger = FileLogger(
+        str(tmp_path / "log.json"),
+        buffer_size_bytes=0,
+        max_file_bytes=1,
+        compress_rotated_files=True,
+    )
+    logger.log(1)
+
+    async def run():
+        # The rotated file's compression is still running.
+        await asyncio.wait_for(logger.alog(2), timeout=5)
+
+    asyncio.run(run())
+    assert not compressed_file_names
+    is_compression_released.set()
+    logger.close_file()
+    assert len(compressed_file_names) == 2
+
+
+def test_alog_writes_on_writer_thread(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(file_name)
+    writing_threads = []
+    original_log = logger.log
+
+    def tracking_log(*args):
+        writing_threads.append(threading.current_thread())
+        return original_log(*args)
+
+    logger.log = tracking_log
+
+    async def run():
+        await asyncio.gather(*(logger.alog(i) for i in range(10)))
+
+    asyncio.run(run())
+    logger.close_file()
+    assert threading.current_thread() not in writing_threads
+    assert [x["message"] for x in _read_records(file_name)] == list(range(10))
+
+
+def test_per_process_files_after_fork(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(
+        file_name, flush_interval_seconds=60, per_process_files=True
+    )
+    # Buffered before forking, so the children inherit the buffer.
+    logger.log("parent", None, 0)
+
+    children_pids = []
+    for i in range(3):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for j in range(1, 4):
+                    logger.log(f"child {i}", None, i + j * 10)
+                logger.close_file()
+            finally:
+                os._exit(0)
+        children_pids.append(pid)
+    for pid in children_pids:
+        os.waitpid(pid, 0)
+    logger.close_file()
+
+    assert not os.path.exists(file_name)
+    file_names = get_log_file_names(file_name)
+    assert sorted(file_names) == sorted(
+        f"{file_name}.{pid}" for pid in (os.getpid(), *children_pids)
+    )
+    for child_pid in children_pids:
+        # The parent's buffered record is only written by the parent.
+        assert all(
+            x["message"] != "parent"
+            for x in _read_records(f"{file_name}.{child_pid}")
+        )
+
+    records = list(read_merged_records(file_names))
+    assert [x["export_timestamp"] for x in records] == [
+        0, 10, 11, 12, 20, 21, 22, 30, 31, 32
+    ]
+
+
+def test_per_process_files_append(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    for i in range(2):
+        logger = FileLogger(file_name, per_process_files=True)
+        logger.log(i)
+        logger.close_file()
+    (process_file_name,) = get_log_file_names(file_name)
+    assert [x["message"] for x in _read_records(process_file_name)] == [0, 1]
+
+
+def test_read_merged_records_with_rotated_files(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(
+        file_name,
+        buffer_size_bytes=0,
+        max_file_bytes=100,
+        compress_rotated_files=True,
+    )
+    other_logger = FileLogger(str(tmp_path / "other.json"))
+    for i in range(6):
+        (logger if i % 2 else other_logger).log(i, None, i)
+    # A record without a timestamp stays after the one before it.
+    logger.log("no timestamp")
+    logger.close_file()
+    other_logger.close_file()
+
+    file_names = get_log_file_names(file_name)
+    assert any(x.endswith(".gz") for x in file_names)
+    file_names += get_log_file_names(str(tmp_path / "other.json"))
+    assert [x["message"] for x in read_merged_records(file_names)] == [
+        0, 1, 2, 3, 4, 5, "no timestamp"
+    ]
+
+
+def test_read_merged_records_out_of_order(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    logger = FileLogger(file_name)
+    # Written when calls end, stamped with their start time.
+    for timestamp in (10, 5, 30, 20, 40, 25, 100):
+        logger.log(timestamp, None, timestamp)
+    logger.close_file()
+    other_logger = FileLogger(str(tmp_path / "other.json"))
+    other_logger.log(15, None, 15)
+    other_logger.close_file()
+
+    file_names = [file_name, str(tmp_path / "other.json")]
+    assert [x["message"] for x in read_merged_records(file_names)] == [
+        5, 10, 15, 20, 25, 30, 40, 100
+    ]
+    # Records later than the allowed lateness stay in the file's order.
+    assert [
+        x["message"]
+        for x in read_merged_records(file_names, allowed_lateness_seconds=5)
+    ] == [5, 10, 15, 20, 30, 25, 40, 100]
+
+
+def test_get_log_file_names_during_compression(tmp_path):
+    file_name = str(tmp_path / "log.json")
+    for name in ("log.json", "log.json.1", "log.json.2", "log.json.2.gz"):
+        (tmp_path / name).write_text("")
+    (tmp_path / "log.json.1.gz.tmp").write_bytes(b"partial")
+    assert get_log_file_names(file_name) == [
+        file_name,
+        f"{file_name}.1",
+        f"{file_name}.2.gz",
+    ]
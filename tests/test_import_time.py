@@ -0,0 +1,85 @@
+"""
+Guards against heavy dependencies being imported before they're needed.
+
+Each test runs in a fresh interpreter, since these modules may already be
+imported by other tests in this process.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+_HEAVY_MODULES = (
+    "mona_sdk",
+    "profanity_check",
+    "sklearn",
+    "phonenumbers",
+    "tiktoken",
+    "numpy",
+)
+
+# Imported by the openai package itself.
+_OPENAI_DEPENDENCIES = ("numpy",)
+
+
+def _get_loaded_heavy_modules(code):
+    """
+    Runs the given code in a fresh interpreter and returns which of the
+    heavy modules were imported after it ran.
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{code}\nimport json, sys\n"
+            f"print(json.dumps([x for x in {_HEAVY_MODULES!r} "
+            "if x in sys.modules]))",
+        ],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def test_import():
+    assert _get_loaded_heavy_modules("import mona_openai") == []
+
+
+@pytest.mark.parametrize(
+    "specs, expected_modules",
+    (
+        ({"analysis": {"privacy": False, "profanity": False}}, []),
+        ({"analysis": {"profanity": False}}, ["phonenumbers"]),
+        (
+            {"analysis": {"privacy": False}},
+            ["profanity_check", "sklearn"],
+        ),
+    ),
+)
+def test_monitored_call(tmp_path, specs, expected_modules):
+    code = f"""
+from openai import Completion
+from mona_openai import FileLogger, monitor_with_logger
+from tests.mocks.mock_openai import get_mock_openai_class
+
+response = {{
+    "choices": [{{"finish_reason": "length", "index": 0, "text": "hi"}}],
+    "usage": {{"completion_tokens": 1, "prompt_tokens": 1, "total_tokens": 2}},
+    "id": "cmpl-1",
+    "model": "text-ada-001",
+}}
+monitor_with_logger(
+    get_mock_openai_class(Completion, (response,), ()),
+    FileLogger({str(tmp_path / "log.json")!r}),
+    {specs!r},
+).create(prompt="hello", model="text-ada-001")
+"""
+    assert sorted(
+        x
+        for x in _get_loaded_heavy_modules(code)
+        if x not in _OPENAI_DEPENDENCIES
+    ) == sorted(expected_modules)
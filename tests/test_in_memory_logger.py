@@ -0,0 +1,116 @@
+"""
+Tests for the in-memory logger's columnar statistics.
+"""
+import math
+import time
+
+import pytest
+
+from mona_openai.exceptions import UnknownColumnException
+from mona_openai.loggers import InMemoryLogger
+
+
+def _get_message(
+    latency, model="text-davinci-003", is_exception=False, profanity=0.1
+):
+    message = {
+        "input": {"model": model, "prompt": "prompt"},
+        "latency": latency,
+        "stream_start_latency": None,
+        "is_exception": is_exception,
+        "api_name": "Completion",
+        "is_async": False,
+    }
+    if not is_exception:
+        message["response"] = {
+            "model": model,
+            "usage": {
+                "prompt_tokens": 5,
+                "completion_tokens": 7,
+                "total_tokens": 12,
+            },
+        }
+        message["analysis"] = {
+            "profanity": {"answer_profanity_prob": (profanity,)},
+            "textual": {"answer_words_count": (3, 4)},
+        }
+    return message
+
+
+def test_percentiles():
+    logger = InMemoryLogger()
+    for latency in range(1, 101):
+        logger.log(_get_message(latency))
+    assert logger.get_percentiles("latency", (0, 50, 99, 100)) == [
+        1,
+        50.5,
+        pytest.approx(99.01),
+        100,
+    ]
+    assert logger.get_percentiles("total_tokens", (50,)) == [12]
+    assert logger.get_percentiles("stream_start_latency", (50,)) is None
+    assert logger.get_percentiles("latency", (50,), model="gpt-4") is None
+
+
+def test_analysis_columns():
+    logger = InMemoryLogger()
+    logger.log(_get_message(1, profanity=0.2))
+    logger.log(_get_message(1, is_exception=True))
+    logger.log(_get_message(1, profanity=0.4))
+    assert "profanity.answer_profanity_prob" in logger.get_column_names()
+    # Multiple choices' values aren't kept as scalars.
+    assert "textual.answer_words_count" not in logger.get_column_names()
+    assert logger.get_percentiles(
+        "profanity.answer_profanity_prob", (50,)
+    ) == [pytest.approx(0.3)]
+    with pytest.raises(UnknownColumnException):
+        logger.get_percentiles("textual.answer_words_count", (50,))
+
+
+def test_mean_by_model_and_counts():
+    logger = InMemoryLogger()
+    logger.log(_get_message(1))
+    logger.log(_get_message(3))
+    logger.log(_get_message(10, model="gpt-4"))
+    logger.log(_get_message(20, model="gpt-4", is_exception=True))
+    logger.log("not a monitoring message")
+    assert logger.get_mean_by_model("latency") == {
+        "text-davinci-003": 2,
+        "gpt-4": 15,
+    }
+    assert logger.get_mean_by_model("is_exception") == {
+        "text-davinci-003": 0,
+        "gpt-4": 0.5,
+    }
+    assert logger.get_count() == 5
+    assert logger.get_count(model="gpt-4") == 2
+    assert logger.get_count(is_exception=True) == 1
+    assert logger.get_count(model="gpt-4", is_exception=False) == 1
+    assert logger.get_count(model="unknown") == 0
+
+
+def test_ring_buffer_and_last_seconds():
+    logger = InMemoryLogger(max_len=5, keep_messages=False)
+    for latency in range(8):
+        logger.log(_get_message(latency))
+    assert len(logger.latest_messages) == 0
+    assert logger.get_count() == 5
+    assert logger.get_percentiles("latency", (0, 100)) == [3, 7]
+
+    time.sleep(0.05)
+    logger.log(_get_message(8))
+    logger.log(_get_message(9))
+    assert logger.get_count(last_seconds=0.04) == 2
+    assert logger.get_percentiles("latency", (0,), last_seconds=0.04) == [8]
+    assert logger.get_mean_by_model("latency", last_seconds=0.04) == {
+        "text-davinci-003": 8.5
+    }
+    assert logger.get_count(last_seconds=10) == 5
+
+
+def test_keeps_latest_messages():
+    logger = InMemoryLogger(max_len=2)
+    for latency in range(3):
+        logger.log(_get_message(latency), str(latency))
+    assert [x["context_id"] for x in logger.latest_messages] == ["1", "2"]
+    assert not math.isnan(logger.get_percentiles("latency", (50,))[0])
@@ -0,0 +1,62 @@
+from mona_openai.analysis.keywords import (
+    KeywordMatcher,
+    get_keyword_analyzers,
+    get_keyword_matcher,
+)
+
+_TERMS = {
+    "competitors": ["Acme", "Acme Cloud", "Globex"],
+    "codewords": ["project x", "c++", "globex"],
+}
+
+
+def test_find_all():
+    matches = KeywordMatcher(_TERMS).find_all(
+        "ACME and Acme Cloud beat Globex. Project X is in C++17."
+    )
+    assert matches["competitors"] == {"acme": 2, "acme cloud": 1, "globex": 1}
+    assert matches["codewords"] == {"project x": 1, "c++": 1, "globex": 1}
+
+
+def test_whole_words_only():
+    matches = KeywordMatcher({"x": ["ant", "he"]}).find_all(
+        "want the anthem, ant_farm, he"
+    )
+    assert matches["x"] == {"he": 1}
+
+
+def test_overlapping_terms():
+    matches = KeywordMatcher({"x": ["she", "he", "hers", "s he"]}).find_all(
+        "she he hers s he"
+    )
+    assert matches["x"] == {"she": 1, "he": 2, "hers": 1, "s he": 1}
+
+
+def test_no_terms():
+    assert KeywordMatcher({"x": [], "y": [""]}).find_all("some text") == {
+        "x": {},
+        "y": {},
+    }
+
+
+def test_matcher_cache():
+    assert get_keyword_matcher(_TERMS) is get_keyword_matcher(
+        {x: list(y) for x, y in _TERMS.items()}
+    )
+
+
+def test_previously_unseen_keywords():
+    matcher = get_keyword_matcher(_TERMS)
+    prompts = get_keyword_analyzers(("Compare Acme to others",), matcher)
+    answer = get_keyword_analyzers(
+        ("Acme is better than Globex, Globex and Acme Cloud",), matcher
+    )[0]
+    # "Acme" also matches inside "Acme Cloud".
+    assert answer.get_keywords_count("competitors") == 5
+    assert (
+        answer.get_previously_unseen_keywords_count("competitors", prompts)
+        == 2
+    )
+    assert (
+        answer.get_previously_unseen_keywords_count("codewords", prompts) == 1
+    )
@@ -0,0 +1,229 @@
+"""
+Tests for MonaLogger's retries and circuit breaker, using a stand-in Mona
+client that injects latency and errors.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mona_openai.exceptions import InvalidOpenCircuitPolicyException
+from mona_openai.loggers import MonaLogger
+from mona_openai.util.retry_util import CircuitBreaker, get_backoff_delays
+from .mocks.mock_mona_client import get_flaky_mona_clients_getter
+
+_ERROR = ConnectionError("Mona is down")
+
+
+def _get_logger(failures, latency_seconds=0, **kwargs):
+    return MonaLogger(
+        (),
+        "TEST_CLASS",
+        get_flaky_mona_clients_getter(failures, latency_seconds),
+        **{"base_delay_seconds": 0} | kwargs,
+    )
+
+
+def _log_messages(logger, messages):
+    for message in messages:
+        logger.log(message, None, None)
+
+
+def test_backoff_delays():
+    delays = get_backoff_delays(5, 0.1, 0.5)
+    assert len(delays) == 5
+    assert all(
+        0 <= delay <= min(0.5, 0.1 * 2**i) for i, delay in enumerate(delays)
+    )
+
+
+def test_circuit_breaker():
+    circuit_breaker = CircuitBreaker(
+        failure_threshold=2, cool_down_seconds=0.05
+    )
+    circuit_breaker.record_failure()
+    assert circuit_breaker.is_call_allowed()
+    circuit_breaker.record_failure()
+    assert not circuit_breaker.is_call_allowed()
+
+    time.sleep(0.05)
+    # Only a single probe is allowed.
+    assert circuit_breaker.is_call_allowed()
+    assert not circuit_breaker.is_call_allowed()
+    circuit_breaker.record_failure()
+    assert not circuit_breaker.is_call_allowed()
+
+    time.sleep(0.05)
+    assert circuit_breaker.is_call_allowed()
+    circuit_breaker.record_success()
+    assert circuit_breaker.is_call_allowed()
+    assert circuit_breaker.is_call_allowed()
+
+
+def test_invalid_policy():
+    with pytest.raises(InvalidOpenCircuitPolicyException):
+        _get_logger({}, open_circuit_policy="retry")
+
+
+def test_retries():
+    logger = _get_logger({0: _ERROR, 1: False}, max_retries=2)
+    assert logger.log("message", None, None)
+    assert logger.client.exported_messages == ["message"]
+    assert logger.dropped_count == 0
+
+
+def test_retries_exhausted():
+    logger = _get_logger({0: _ERROR, 1: _ERROR}, max_retries=1)
+    assert logger.log("message 1", None, None) is None
+    _log_messages(logger, ["message 2"])
+    assert logger.client.exported_messages == ["message 2"]
+    assert logger.dropped_count == 1
+
+
+def test_dropped_count_from_threads():
+    logger = _get_logger(
+        {0: _ERROR}, max_retries=0, failure_threshold=1, cool_down_seconds=60
+    )
+    # Opens the circuit, so all the threads' messages are dropped.
+    _log_messages(logger, ["message"])
+    threads = [
+        threading.Thread(
+            target=_log_messages, args=(logger, ["message"] * 1000)
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert logger.dropped_count == 8001
+
+
+def test_circuit_opens_and_drops():
+    logger = _get_logger(
+        {x: _ERROR for x in range(2)},
+        max_retries=0,
+        failure_threshold=2,
+        cool_down_seconds=60,
+    )
+    _log_messages(logger, ["message 1", "message 2", "message 3"])
+    assert logger.circuit_breaker.is_open
+    # The third message wasn't even tried.
+    assert logger.client._exports_count == [2]
+    assert logger.client.exported_messages == []
+    assert logger.dropped_count == 3
+
+
+def test_circuit_recovers_and_exports_spool():
+    logger = _get_logger(
+        {x: _ERROR for x in range(3)},
+        max_retries=0,
+        failure_threshold=2,
+        cool_down_seconds=0.05,
+        open_circuit_policy="spool",
+    )
+    _log_messages(logger, ["message 1", "message 2", "message 3"])
+    assert logger.circuit_breaker.is_open
+
+    time.sleep(0.05)
+    # The probe fails, so the circuit stays open.
+    _log_messages(logger, ["message 4", "message 5"])
+    assert logger.circuit_breaker.is_open
+
+    time.sleep(0.05)
+    _log_messages(logger, ["message 6"])
+    assert not logger.circuit_breaker.is_open
+    assert logger.client.exported_messages == [
+        "message 6",
+        "message 1",
+        "message 2",
+        "message 3",
+        "message 4",
+        "message 5",
+    ]
+    assert logger.dropped_count == 0
+
+
+def test_spool_size():
+    logger = _get_logger(
+        {x: _ERROR for x in range(3)},
+        max_retries=0,
+        open_circuit_policy="spool",
+        max_spool_size=2,
+    )
+    _log_messages(
+        logger, ["message 1", "message 2", "message 3", "message 4"]
+    )
+    assert logger.dropped_count == 1
+    assert logger.client.exported_messages == [
+        "message 4",
+        "message 2",
+        "message 3",
+    ]
+
+
+def test_latency_with_open_circuit():
+    logger = _get_logger(
+        {x: _ERROR for x in range(2)},
+        latency_seconds=0.05,
+        max_retries=0,
+        failure_threshold=2,
+        cool_down_seconds=60,
+    )
+    _log_messages(logger, ["message 1", "message 2"])
+
+    start_time = time.time()
+    _log_messages(logger, ["message 3"] * 10)
+    assert time.time() - start_time < 0.05
+
+
+def test_alog():
+    logger = _get_logger(
+        {0: _ERROR, 1: _ERROR},
+        max_retries=0,
+        failure_threshold=2,
+        cool_down_seconds=0.05,
+        open_circuit_policy="spool",
+    )
+
+    async def run():
+        await logger.alog("message 1", None, None)
+        await logger.alog("message 2", None, None)
+        assert logger.circuit_breaker.is_open
+        await asyncio.sleep(0.05)
+        assert await logger.alog("message 3", None, None)
+
+    asyncio.run(run())
+    assert logger.client.exported_messages == [
+        "message 3",
+        "message 1",
+        "message 2",
+    ]
+
+
+def test_spool_drains_gradually():
+    logger = _get_logger(
+        {x: _ERROR for x in range(20)},
+        max_retries=0,
+        failure_threshold=100,
+        open_circuit_policy="spool",
+        max_spooled_exports_per_log=5,
+    )
+    _log_messages(logger, [f"spooled {i}" for i in range(20)])
+    assert logger.client.exported_messages == []
+
+    # Each call exports its own message and only a few spooled ones.
+    _log_messages(logger, ["message 1"])
+    assert logger.client._exports_count == [26]
+    assert logger.client.exported_messages == ["message 1"] + [
+        f"spooled {i}" for i in range(5)
+    ]
+    _log_messages(logger, [f"message {i}" for i in range(2, 5)])
+    assert logger.client.exported_messages[-6:] == ["message 4"] + [
+        f"spooled {i}" for i in range(15, 20)
+    ]
+    _log_messages(logger, ["message 5"])
+    assert logger.client.exported_messages[-1] == "message 5"
+    assert len(logger.client.exported_messages) == 25
+    assert logger.dropped_count == 0
@@ -0,0 +1,73 @@
+import time
+
+from mona_openai.analysis.near_duplicate import (
+    NearDuplicateIndex,
+    get_simhash,
+    get_similarity,
+)
+
+_ANSWER = "The capital of France is Paris and it is a very nice city"
+
+
+def test_identical_texts_similarity():
+    assert get_similarity(get_simhash(_ANSWER), get_simhash(_ANSWER)) == 1
+
+
+def test_simhash_bits():
+    words = _ANSWER.lower().split()
+    features = words + [f"{x} {y}" for x, y in zip(words, words[1:])]
+    hashes = [hash(x) & (2**64 - 1) for x in features]
+    expected = sum(
+        1 << i
+        for i in range(64)
+        if 2 * sum(x >> i & 1 for x in hashes) > len(features)
+    )
+    assert get_simhash(_ANSWER) == expected
+
+
+def test_empty_text():
+    assert get_simhash("  ") is None
+
+
+def test_near_duplicate_of_other_prompt():
+    index = NearDuplicateIndex()
+    assert index.find_and_add((get_simhash(_ANSWER),), "prompt 1") == (
+        (0, 0.0),
+    )
+    assert index.find_and_add((get_simhash(_ANSWER),), "prompt 2") == (
+        (1, 1.0),
+    )
+
+
+def test_same_prompt_ignored():
+    index = NearDuplicateIndex()
+    index.find_and_add((get_simhash(_ANSWER),), "prompt 1")
+    assert index.find_and_add((get_simhash(_ANSWER),), "prompt 1") == (
+        (0, 0.0),
+    )
+
+
+def test_same_call_answers_not_compared():
+    index = NearDuplicateIndex()
+    fingerprint = get_simhash(_ANSWER)
+    assert index.find_and_add((fingerprint, fingerprint), "prompt 1") == (
+        (0, 0.0),
+        (0, 0.0),
+    )
+
+
+def test_eviction_by_size():
+    index = NearDuplicateIndex(max_size=2)
+    for i in range(5):
+        index.find_and_add((get_simhash(f"{_ANSWER} {i}"),), i)
+    assert len(index) == 2
+
+
+def test_eviction_by_age():
+    index = NearDuplicateIndex(max_age_seconds=0.01)
+    index.find_and_add((get_simhash(_ANSWER),), "prompt 1")
+    time.sleep(0.02)
+    assert index.find_and_add((get_simhash(_ANSWER),), "prompt 2") == (
+        (0, 0.0),
+    )
+    assert len(index) == 1
@@ -0,0 +1,40 @@
+from mona_openai.analysis.overlap import OverlapAnalyzer, get_prompt_sketch
+
+
+def test_unigram_novelty():
+    sketch = get_prompt_sketch(("this is a word", "and another one"))
+    assert (
+        OverlapAnalyzer("this is new word").get_novelty_ratio(sketch, 1)
+        == 1 / 4
+    )
+
+
+def test_trigram_novelty():
+    sketch = get_prompt_sketch(("the quick brown fox jumps",))
+    # "the quick brown" and "quick brown fox" appear in the prompt, while
+    # "brown fox runs" doesn't.
+    assert OverlapAnalyzer(
+        "the quick brown fox runs"
+    ).get_novelty_ratio(sketch, 3) == 1 / 3
+
+
+def test_ngrams_across_prompts_not_joined():
+    sketch = get_prompt_sketch(("first prompt", "second prompt"))
+    assert (
+        OverlapAnalyzer("prompt second").get_novelty_ratio(sketch, 2) == 1.0
+    )
+
+
+def test_too_short_answer():
+    sketch = get_prompt_sketch(("some prompt",))
+    assert OverlapAnalyzer("short").get_novelty_ratio(sketch, 2) == 0.0
+
+
+def test_false_positive_rate_of_long_prompt():
+    # ~100K prompt words make ~300K distinct n-grams of all sizes.
+    prompt = " ".join(f"word{i}" for i in range(100000))
+    answer = " ".join(f"novel{i}" for i in range(10000))
+    novelty_ratio = OverlapAnalyzer(answer).get_novelty_ratio(
+        get_prompt_sketch((prompt,)), 1
+    )
+    assert novelty_ratio > 0.99
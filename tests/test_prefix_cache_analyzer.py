@@ -0,0 +1,46 @@
+import time
+
+from mona_openai.analysis.prefix_cache import PrefixIndex, get_prefix_hashes
+
+_TEMPLATE = list(range(32))
+
+
+def test_prefix_hashes():
+    hashes = get_prefix_hashes(_TEMPLATE + [100], block_size=16)
+    assert len(hashes) == 2
+    assert get_prefix_hashes(_TEMPLATE[:16] + [100] * 16, 16)[0] == hashes[0]
+    assert get_prefix_hashes(_TEMPLATE[:16] + [100] * 16, 16)[1] != hashes[1]
+
+
+def test_short_prompt():
+    assert get_prefix_hashes(_TEMPLATE[:15], block_size=16) == ()
+
+
+def test_shared_prefix():
+    index = PrefixIndex(block_size=16)
+    assert index.find_and_add((_TEMPLATE + [1],)) == (0,)
+    assert index.find_and_add((_TEMPLATE + [2] * 20,)) == (32,)
+    assert index.find_and_add((_TEMPLATE[:16] + [3] * 16,)) == (16,)
+    assert index.find_and_add(([4] + _TEMPLATE,)) == (0,)
+
+
+def test_same_call_prompts_not_compared():
+    index = PrefixIndex(block_size=16)
+    assert index.find_and_add((_TEMPLATE, _TEMPLATE)) == (0, 0)
+    assert index.find_and_add((_TEMPLATE,)) == (32,)
+
+
+def test_eviction_by_size():
+    index = PrefixIndex(max_size=2, block_size=16)
+    index.find_and_add((_TEMPLATE,))
+    index.find_and_add(([1] * 16,))
+    index.find_and_add(([2] * 16,))
+    assert len(index) == 2
+    assert index.find_and_add((_TEMPLATE,)) == (0,)
+
+
+def test_eviction_by_age():
+    index = PrefixIndex(max_age_seconds=0.01, block_size=16)
+    index.find_and_add((_TEMPLATE,))
+    time.sleep(0.02)
+    assert index.find_and_add((_TEMPLATE,)) == (0,)
@@ -0,0 +1,100 @@
+import numpy as np
+import profanity_check
+import pytest
+
+from mona_openai.analysis.profanity import (
+    MMAP_ENGINE,
+    NUMPY_ENGINE,
+    get_profanity_model,
+)
+from mona_openai.exceptions import InvalidProfanityEngineException
+from mona_openai.analysis.profanity_model import (
+    MappedProfanityModel,
+    NumpyProfanityModel,
+    _read_model_file,
+    build_model_file,
+    write_model_file,
+)
+
+_TEXTS = (
+    "I want to go to the beach with my friends",
+    "You are a fucking idiot",
+    "what the hell is this shit",
+    "",
+    "!!! ???",
+    "Ünïcödé wörds and a veeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeery long one",
+    "damn damn damn, this is a damn good day",
+    "The the THE a an of",
+    "Shit happens.\nAnd then some more shit happens, you bastard!",
+)
+
+_MODEL_CLASSES = (MappedProfanityModel, NumpyProfanityModel)
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("profanity") / "model.bin"
+    build_model_file(path)
+    return path
+
+
+def test_model_file_round_trip(tmp_path):
+    arrays = {
+        "words": np.array([b"a", b"bc"]),
+        "values": np.arange(6, dtype=np.float64).reshape(2, 3),
+    }
+    write_model_file(arrays, tmp_path / "model.bin")
+
+    read_arrays = _read_model_file(tmp_path / "model.bin")
+    assert read_arrays.keys() == arrays.keys()
+    for name, array in arrays.items():
+        assert np.array_equal(read_arrays[name], array)
+        assert not read_arrays[name].flags.writeable
+
+
+def test_invalid_model_file(tmp_path):
+    (tmp_path / "model.bin").write_bytes(b"not a model file")
+    with pytest.raises(ValueError):
+        _read_model_file(tmp_path / "model.bin")
+
+
+@pytest.mark.parametrize("model_class", _MODEL_CLASSES)
+def test_parity_with_profanity_check(model_path, model_class):
+    model = model_class(model_path)
+    assert np.allclose(
+        model.predict_prob(_TEXTS), profanity_check.predict_prob(_TEXTS)
+    )
+    assert np.array_equal(
+        model.predict(_TEXTS), profanity_check.predict(_TEXTS)
+    )
+
+
+@pytest.mark.parametrize("model_class", _MODEL_CLASSES)
+def test_parity_single_texts(model_path, model_class):
+    model = model_class(model_path)
+    for text in _TEXTS:
+        assert np.allclose(
+            model.predict_prob((text,)), profanity_check.predict_prob((text,))
+        )
+
+
+@pytest.mark.parametrize("model_class", _MODEL_CLASSES)
+def test_no_texts(model_path, model_class):
+    model = model_class(model_path)
+    assert len(model.predict_prob(())) == 0
+    assert len(model.predict(())) == 0
+
+
+@pytest.mark.parametrize("engine", (MMAP_ENGINE, NUMPY_ENGINE))
+def test_builds_missing_model_file(tmp_path, engine):
+    path = tmp_path / "missing" / "model.bin"
+    model = get_profanity_model(engine, path)
+    assert path.exists()
+    assert np.allclose(
+        model.predict_prob(_TEXTS), profanity_check.predict_prob(_TEXTS)
+    )
+
+
+def test_unknown_engine():
+    with pytest.raises(InvalidProfanityEngineException):
+        get_profanity_model("unknown")
@@ -0,0 +1,73 @@
+from mona_openai.analysis.templates import PromptTemplate
+from mona_openai.analysis.textual import TextualAnalyzer, get_textual_analyzers
+
+
+def _assert_same_textual_analysis(template_text, values):
+    text = template_text.format(**values)
+    filled_text = PromptTemplate(template_text).match(text)
+    assert filled_text == text
+
+    (template_analyzer,) = get_textual_analyzers((filled_text,))
+    analyzer = TextualAnalyzer(text)
+    assert template_analyzer.get_length() == analyzer.get_length()
+    assert template_analyzer.get_word_count() == analyzer.get_word_count()
+    assert (
+        template_analyzer.get_preposition_count()
+        == analyzer.get_preposition_count()
+    )
+
+    answer_analyzer = TextualAnalyzer(f"{text} and some new words of {text}")
+    assert answer_analyzer.get_words_not_in_others_count(
+        (template_analyzer,)
+    ) == answer_analyzer.get_words_not_in_others_count((analyzer,))
+
+
+def test_no_match():
+    assert PromptTemplate("Tell me about {topic}.").match("Bla bla") is None
+
+
+def test_values():
+    assert PromptTemplate("Tell {who} about {topic}.").match(
+        "Tell me about cats and dogs."
+    )._values == ("me", "cats and dogs")
+
+
+def test_repeated_placeholder():
+    template = PromptTemplate("{x} and {x}")
+    assert template.match("a and a") is not None
+    assert template.match("a and b") is None
+
+
+def test_separated_values():
+    _assert_same_textual_analysis(
+        "Write a poem about {topic} for {audience}.",
+        {"topic": "the sea", "audience": "kids of all ages"},
+    )
+
+
+def test_values_joined_to_static_words():
+    _assert_same_textual_analysis(
+        "Write a poem about{topic}for {audience}",
+        {"topic": "in the sea ", "audience": "kids"},
+    )
+
+
+def test_adjacent_values():
+    _assert_same_textual_analysis(
+        "Words: {a}{b}{c} to",
+        {"a": "in", "b": "", "c": "to x"},
+    )
+
+
+def test_whitespace_value():
+    _assert_same_textual_analysis(
+        "Words:{a}about",
+        {"a": " \n "},
+    )
+
+
+def test_long_non_matching_text():
+    # A backtracking matcher would try every split of the separators here.
+    template = PromptTemplate("Q: {a}, {b}, {c}, {d}. A: {e}.")
+    assert template.match("Q: " + "x, " * 20000) is None
+    assert template.match("Q: " + "x, " * 20000 + "y. A: z.") is not None
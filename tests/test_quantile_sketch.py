@@ -0,0 +1,55 @@
+import random
+
+from mona_openai.util.quantiles_util import QuantileSketch
+
+_VALUES = list(range(10000))
+
+
+def _get_sketch(values):
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_empty():
+    assert QuantileSketch().get_quantiles((0.5, 0.9)) == (None, None)
+
+
+def test_exact_for_few_values():
+    sketch = _get_sketch((3, 1, 2))
+    assert sketch.get_quantiles((0, 0.5, 1)) == (1, 2, 3)
+
+
+def test_quantiles():
+    values = list(_VALUES)
+    random.shuffle(values)
+    sketch = _get_sketch(values)
+    assert sketch.count == len(values)
+    assert (sketch.min, sketch.max) == (0, 9999)
+    for quantile in (0.1, 0.5, 0.9, 0.99):
+        assert abs(sketch.get_quantile(quantile) - quantile * 10000) < 200
+
+
+def test_bounded_size():
+    sketch = _get_sketch(_VALUES * 10)
+    assert len(sketch.to_dict()["compactors"][0]) < 1000
+    assert sum(len(x) for x in sketch.to_dict()["compactors"]) < 2000
+
+
+def test_merge():
+    sketch = _get_sketch(_VALUES[:5000])
+    sketch.merge(_get_sketch(_VALUES[5000:]))
+    assert sketch.count == 10000
+    assert (sketch.min, sketch.max) == (0, 9999)
+    assert abs(sketch.get_quantile(0.5) - 5000) < 200
+
+
+def test_serialization():
+    sketch = _get_sketch(_VALUES)
+    loaded_sketch = QuantileSketch.from_dict(sketch.to_dict())
+    assert loaded_sketch.get_quantiles((0.1, 0.9)) == sketch.get_quantiles(
+        (0.1, 0.9)
+    )
+    loaded_sketch.add(10000)
+    assert loaded_sketch.max == 10000
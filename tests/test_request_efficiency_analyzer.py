@@ -0,0 +1,52 @@
+from mona_openai.analysis.request_efficiency import (
+    RequestEfficiencyTracker,
+    RequestParamsStats,
+)
+
+
+def _add_calls(stats, answer_token_counts, finish_reason="stop"):
+    for token_count in answer_token_counts:
+        stats.add(100, 1, (token_count,), (finish_reason,), ("answer",))
+
+
+def test_no_suggestions_before_min_samples():
+    stats = RequestParamsStats(min_samples=10)
+    _add_calls(stats, range(9))
+    assert stats.get_suggested_max_tokens() is None
+    assert stats.get_suggested_n() is None
+
+
+def test_suggested_max_tokens():
+    stats = RequestParamsStats(suggestion_quantile=0.9, min_samples=10)
+    _add_calls(stats, range(1, 101))
+    assert stats.get_suggested_max_tokens() == 90
+    summary = stats.to_dict()
+    assert summary["calls_count"] == 100
+    assert summary["truncated_answers_ratio"] == 0
+    assert summary["max_tokens_quantiles"] == {0.5: 100, 0.9: 100, 0.99: 100}
+
+
+def test_no_suggested_max_tokens_when_truncated():
+    stats = RequestParamsStats(suggestion_quantile=0.9, min_samples=10)
+    _add_calls(stats, range(1, 81))
+    _add_calls(stats, [100] * 20, "length")
+    assert stats.get_truncated_answers_ratio() == 0.2
+    assert stats.get_suggested_max_tokens() is None
+
+
+def test_suggested_n():
+    stats = RequestParamsStats(min_samples=2)
+    stats.add(100, 3, (5, 5, 5), ("stop",) * 3, ("a", "a", "a"))
+    stats.add(100, 3, (5, 5, 6), ("stop",) * 3, ("a", "a", "b"))
+    assert stats.get_suggested_n() == 2
+
+
+def test_tracker_keys():
+    tracker = RequestEfficiencyTracker(min_samples=1)
+    assert tracker.add(
+        ("model", "template"), 100, 1, (10,), ("stop",), ("a",)
+    ) == (10, 1)
+    tracker.add(("model", None), 100, 1, (20,), ("stop",), ("a",))
+    stats = tracker.get_stats()
+    assert set(stats) == {("model", "template"), ("model", None)}
+    assert stats[("model", None)]["suggested_max_tokens"] == 20
@@ -0,0 +1,149 @@
+"""
+Tests for the SQLite logger.
+"""
+import asyncio
+import sqlite3
+import time
+
+from mona_openai.loggers import SQLiteLogger
+
+
+def _get_message(model="text-davinci-003", latency=0.5, is_exception=False):
+    message = {
+        "input": {"model": model, "prompt": "prompt"},
+        "latency": latency,
+        "stream_start_latency": None,
+        "is_exception": is_exception,
+        "api_name": "Completion",
+        "is_async": False,
+    }
+    if not is_exception:
+        message["response"] = {
+            "model": model,
+            "usage": {
+                "prompt_tokens": 5,
+                "completion_tokens": 7,
+                "total_tokens": 12,
+            },
+        }
+    return message
+
+
+def test_scalar_columns_and_message(tmp_path):
+    database_path = str(tmp_path / "mona.db")
+    logger = SQLiteLogger(database_path)
+    message = _get_message()
+    logger.log(message, "context 1", 1234)
+    logger.close()
+
+    connection = sqlite3.connect(database_path)
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    row = connection.execute(
+        "SELECT export_timestamp, context_id, api_name, model, latency, "
+        "is_exception, prompt_tokens, completion_tokens, total_tokens "
+        "FROM mona_messages"
+    ).fetchone()
+    assert row == (
+        1234,
+        "context 1",
+        "Completion",
+        "text-davinci-003",
+        0.5,
+        0,
+        5,
+        7,
+        12,
+    )
+    connection.close()
+
+    (saved,) = SQLiteLogger(database_path).query()
+    assert saved["message"] == message
+    assert saved["context_id"] == "context 1"
+
+
+def test_query_filters(tmp_path):
+    logger = SQLiteLogger(str(tmp_path / "mona.db"))
+    logger.log(_get_message(latency=0.1), "a")
+    logger.log(_get_message(model="gpt-4", latency=2), "b")
+    logger.log(_get_message(is_exception=True), "c")
+    logger.log("not a monitoring message", "d")
+    logger.flush()
+
+    def get_context_ids(**kwargs):
+        return [x["context_id"] for x in logger.query(**kwargs)]
+
+    assert get_context_ids() == ["d", "c", "b", "a"]
+    assert get_context_ids(limit=2) == ["d", "c"]
+    assert get_context_ids(context_id="b") == ["b"]
+    assert get_context_ids(model="gpt-4") == ["b"]
+    assert get_context_ids(min_latency=1) == ["b"]
+    assert get_context_ids(is_exception=True) == ["c"]
+    assert get_context_ids(api_name="Completion", is_exception=False) == [
+        "b",
+        "a",
+    ]
+    assert get_context_ids(since=time.time()) == []
+    logger.close()
+
+
+def test_batching(tmp_path):
+    logger = SQLiteLogger(
+        str(tmp_path / "mona.db"), batch_size=10, flush_interval_seconds=60
+    )
+    for i in range(9):
+        logger.log(_get_message(), str(i))
+    time.sleep(0.1)
+    assert logger.query() == []
+    logger.log(_get_message(), "9")
+    # A full batch wakes the writer up.
+    for _ in range(50):
+        if logger.query():
+            break
+        time.sleep(0.01)
+    assert len(logger.query(limit=20)) == 10
+    logger.close()
+
+
+def test_full_queue_drops(tmp_path):
+    logger = SQLiteLogger(
+        str(tmp_path / "mona.db"),
+        max_queue_size=3,
+        flush_interval_seconds=60,
+    )
+    for _ in range(5):
+        logger.log(_get_message())
+    assert logger.dropped_count == 2
+    logger.close()
+    assert len(logger.query()) == 3
+
+
+def test_retention(tmp_path):
+    database_path = str(tmp_path / "mona.db")
+    logger = SQLiteLogger(database_path)
+    logger.log(_get_message(), "old")
+    logger.close()
+    connection = sqlite3.connect(database_path)
+    with connection:
+        connection.execute(
+            "UPDATE mona_messages SET logged_time = ?", (time.time() - 100,)
+        )
+    connection.close()
+
+    logger = SQLiteLogger(database_path, retention_seconds=50)
+    logger.log(_get_message(), "new")
+    logger.flush()
+    assert [x["context_id"] for x in logger.query()] == ["new"]
+    logger.close()
+
+
+def test_alog(tmp_path):
+    logger = SQLiteLogger(str(tmp_path / "mona.db"))
+
+    async def run():
+        await asyncio.gather(
+            *(logger.alog(_get_message(), str(i)) for i in range(10))
+        )
+
+    asyncio.run(run())
+    logger.close()
+    assert len(logger.query()) == 10
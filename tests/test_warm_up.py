@@ -0,0 +1,50 @@
+"""
+Tests for the warm up API.
+"""
+from mona_openai import warm_up
+
+
+def test_default_specs():
+    assert tuple(warm_up()) == ("profanity", "privacy")
+
+
+def test_disabled_analyses():
+    assert (
+        warm_up({"analysis": {"profanity": False, "privacy": False}}) == {}
+    )
+
+
+def test_keywords_and_registered_analyzers():
+    timings = warm_up(
+        {
+            "analysis": {"degeneration": True, "profanity": False},
+            "keywords": {"competitors": ["Acme"]},
+        }
+    )
+    assert tuple(timings) == ("privacy", "keywords", "analyzer:degeneration")
+    assert all(x >= 0 for x in timings.values())
+
+
+def test_tokenizers(monkeypatch):
+    loaded_models = []
+
+    class MockEncoding:
+        def encode(self, text):
+            return text.split()
+
+    def get_mock_encoding(model):
+        loaded_models.append(model)
+        return MockEncoding()
+
+    monkeypatch.setattr(
+        "mona_openai.util.tokens_util._get_encoding", get_mock_encoding
+    )
+    timings = warm_up(
+        {"analysis": {"profanity": False, "privacy": False}},
+        models=["gpt-3.5-turbo", "text-ada-001"],
+    )
+    assert tuple(timings) == (
+        "tokenizer:gpt-3.5-turbo",
+        "tokenizer:text-ada-001",
+    )
+    assert loaded_models == ["gpt-3.5-turbo", "text-ada-001"]